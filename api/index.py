@@ -1,100 +1,80 @@
 import os
+import sys
 import json
 import logging
-from flask import Flask, render_template, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, Date, text
-from datetime import datetime
+import itertools
+from flask import Flask, Response, render_template, request, jsonify
+from sqlalchemy import text
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-class Base(DeclarativeBase):
-    pass
+from database import db, database_url, engine_options, database_binds, configure_engines, read_engine
+from models import get_schema_info
+from gemini_service import GeminiService
+from jobs import JobStore, JobQueueFull, FINISHED_STATUSES
+import query_guard
+from query_guard import QueryRejected
 
-db = SQLAlchemy(model_class=Base)
+# Configure logging
+logging.basicConfig(level=logging.INFO)
 
 # Create Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "vercel-secret-key")
 
 # Database configuration
-database_url = os.environ.get("DATABASE_URL", "sqlite:///memory:")
-if database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-
-app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+app.config["SQLALCHEMY_DATABASE_URI"] = database_url("sqlite:///memory:")
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+app.config["SQLALCHEMY_BINDS"] = database_binds(app.config["SQLALCHEMY_DATABASE_URI"])
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-# Initialize database
+# Initialize database; the tables are the canonical models in models.py
 db.init_app(app)
+configure_engines(app)
 
-# Define models inline for serverless
-class ProductEligibility(db.Model):
-    __tablename__ = 'product_eligibility'
-    id = Column(Integer, primary_key=True)
-    item_id = Column(String(50), nullable=False)
-    eligibility_status = Column(String(20), nullable=False)
-    eligibility_datetime_utc = Column(DateTime, nullable=False)
-    reason = Column(Text)
-
-class AdSalesMetrics(db.Model):
-    __tablename__ = 'ad_sales_metrics'
-    id = Column(Integer, primary_key=True)
-    date = Column(Date, nullable=False)
-    item_id = Column(String(50), nullable=False)
-    ad_sales = Column(Float, default=0.0)
-    impressions = Column(Integer, default=0)
-    ad_spend = Column(Float, default=0.0)
-    clicks = Column(Integer, default=0)
-    units_sold_ad = Column(Integer, default=0)
-
-class TotalSalesMetrics(db.Model):
-    __tablename__ = 'total_sales_metrics'
-    id = Column(Integer, primary_key=True)
-    date = Column(Date, nullable=False)
-    item_id = Column(String(50), nullable=False)
-    total_sales = Column(Float, default=0.0)
-    total_units_ordered = Column(Integer, default=0)
-
-# Gemini service
-class GeminiService:
-    def __init__(self):
-        try:
-            from google import genai
-            self.client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-            self.model = "gemini-2.5-flash"
-            self.available = True
-        except Exception as e:
-            logging.error(f"Gemini service initialization failed: {e}")
-            self.available = False
-    
-    def generate_sql_query(self, question, schema_info):
-        if not self.available:
-            raise Exception("Gemini service not available")
-            
-        system_prompt = f"""Generate a SQL query for: {question}
-        
-Database Schema:
-- product_eligibility: item_id, eligibility_status, eligibility_datetime_utc, reason
-- ad_sales_metrics: date, item_id, ad_sales, impressions, ad_spend, clicks, units_sold_ad
-- total_sales_metrics: date, item_id, total_sales, total_units_ordered
-
-Return only the SQL query, no explanation."""
-
-        try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=system_prompt
-            )
-            return response.text.strip()
-        except Exception as e:
-            raise Exception(f"Failed to generate SQL: {e}")
+# Created on first use rather than at import, so cold starts that only
+# serve the page or /health skip the SDK import, client setup and DDL
+_gemini_service = None
+_database_ready = False
+_job_store = None
+
+# Rows returned per query before the result is marked truncated, read in batches
+MAX_RESULT_ROWS = int(os.environ.get('MAX_RESULT_ROWS', '5000'))
+FETCH_BATCH_SIZE = int(os.environ.get('FETCH_BATCH_SIZE', '1000'))
+
+# Jobs run on the instance that accepted them and are kept in JOB_STORE_PATH.
+# The default file under /tmp is private to one instance, so a poll routed to
+# another one would get a 404; async mode is only offered when JOB_STORE_PATH
+# is set, which should point at storage every instance shares
+ASYNC_JOBS_ENABLED = bool(os.environ.get('JOB_STORE_PATH'))
+
+# Longest a status request or one SSE wait blocks before answering
+JOB_MAX_WAIT_SECONDS = float(os.environ.get('JOB_MAX_WAIT_SECONDS', '20'))
+
+def get_gemini_service():
+    global _gemini_service
+    if _gemini_service is None:
+        _gemini_service = GeminiService()
+    return _gemini_service
+
+def get_job_store():
+    global _job_store
+    if _job_store is None:
+        _job_store = JobStore()
+    return _job_store
+
+def prepare_database():
+    """Bring the schema up to date and load snapshots once per process; call inside an app context."""
+    global _database_ready
+    if not _database_ready:
+        from migrations import ensure_schema
+        from snapshots import load_snapshots
+
+        ensure_schema()
+        if os.environ.get("SNAPSHOT_AUTOLOAD", "1") == "1":
+            load_snapshots()
+        _database_ready = True
 
 # Routes
 @app.route('/')
@@ -189,8 +169,68 @@ def health():
     
     return jsonify(status)
 
+def answer_query(question):
+    """Generate and run the SQL for a question; returns (payload, status code).
+
+    A translation whose query is rejected or fails is dropped from the
+    translation cache, so the next ask generates a new one.
+    """
+    sql_query = None
+    try:
+        # Generate SQL query from the same schema description as the full app
+        sql_query = get_gemini_service().generate_sql_query(question, get_schema_info())
+        if not sql_query:
+            return {'error': 'Failed to generate SQL', 'success': False}, 502
+        
+        # Execute SQL query on the read-only engine, under the same guard as the full app:
+        # a single SELECT with a LIMIT, an EXPLAIN cost check and a statement timeout
+        sql_query = query_guard.prepare_query(sql_query, MAX_RESULT_ROWS + 1)
+        with app.app_context():
+            prepare_database()
+            with read_engine().connect() as connection:
+                query_guard.preflight(connection, sql_query)
+                with query_guard.statement_timeout(connection):
+                    result = connection.execute(text(sql_query), execution_options={'yield_per': FETCH_BATCH_SIZE})
+                    try:
+                        columns = list(result.keys())
+                        rows = list(itertools.islice(result, MAX_RESULT_ROWS + 1))
+                    finally:
+                        result.close()
+            truncated = len(rows) > MAX_RESULT_ROWS
+            data_result = [dict(zip(columns, row)) for row in rows[:MAX_RESULT_ROWS]]
+        
+        return {
+            'question': question,
+            'sql_query': sql_query,
+            'data': data_result,
+            'truncated': truncated,
+            'response': f"Found {len(data_result)}{'+' if truncated else ''} results for your query.",
+            'success': True
+        }, 200
+        
+    except QueryRejected as e:
+        # Keeps the rejected translation from being served again
+        get_gemini_service().forget_sql_query(question)
+        logging.warning(f"Rejected query for {question!r}: {str(e)}")
+        return {'error': f'Query rejected: {e}', 'success': False}, 400
+    except Exception as e:
+        logging.error(f"Error processing query: {str(e)}")
+        if sql_query is not None:
+            get_gemini_service().forget_sql_query(question)
+        return {
+            'error': str(e),
+            'success': False
+        }, 500
+
 @app.route('/api/query', methods=['POST'])
 def api_query():
+    """Answer a question, or with "async": true queue it as a job and return its id.
+
+    Async mode needs JOB_STORE_PATH (see ASYNC_JOBS_ENABLED) and a host that
+    keeps the instance running after the 202: the job runs on this
+    instance's thread pool, and platforms that freeze functions between
+    requests pause it until the next request arrives.
+    """
     try:
         # Check environment variables
         if not os.environ.get('GEMINI_API_KEY'):
@@ -213,26 +253,28 @@ def api_query():
         if not question:
             return jsonify({'error': 'Empty question', 'success': False}), 400
         
-        # Initialize Gemini service
-        gemini_service = GeminiService()
-        
-        # Generate SQL query
-        sql_query = gemini_service.generate_sql_query(question, {})
-        
-        # Execute SQL query
-        with app.app_context():
-            result = db.session.execute(text(sql_query))
-            rows = result.fetchall()
-            columns = result.keys()
-            data_result = [dict(zip(columns, row)) for row in rows]
+        if data.get('async'):
+            if not ASYNC_JOBS_ENABLED:
+                return jsonify({
+                    'error': 'Async mode needs JOB_STORE_PATH set to storage shared by every instance',
+                    'success': False
+                }), 501
+            try:
+                job_id = get_job_store().submit(question, answer_query, question)
+            except JobQueueFull:
+                response = jsonify({'error': 'Too many queued questions, try again shortly', 'success': False})
+                response.headers['Retry-After'] = '5'
+                return response, 503
+            return jsonify({
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': f'/api/jobs/{job_id}',
+                'events_url': f'/api/jobs/{job_id}/events',
+                'success': True
+            }), 202
         
-        return jsonify({
-            'question': question,
-            'sql_query': sql_query,
-            'data': data_result,
-            'response': f"Found {len(data_result)} results for your query.",
-            'success': True
-        })
+        payload, status_code = answer_query(question)
+        return jsonify(payload), status_code
         
     except Exception as e:
         logging.error(f"Error processing query: {str(e)}")
@@ -241,9 +283,43 @@ def api_query():
             'success': False
         }), 500
 
-# Create tables
-with app.app_context():
-    db.create_all()
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    """Job status and, once finished, its result; ?wait= long-polls up to that many seconds for a change."""
+    wait_seconds = min(request.args.get('wait', 0, type=float), JOB_MAX_WAIT_SECONDS)
+    last_status = request.args.get('status')
+    if wait_seconds > 0:
+        job = get_job_store().wait(job_id, wait_seconds, last_status)
+    else:
+        job = get_job_store().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job id', 'success': False}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/events')
+def api_job_events(job_id):
+    """Stream a job's status changes as Server-Sent Events, ending with the finished job."""
+    store = get_job_store()
+    if store.get(job_id) is None:
+        return jsonify({'error': 'Unknown or expired job id', 'success': False}), 404
+
+    def generate():
+        last_status = None
+        while True:
+            job = store.wait(job_id, JOB_MAX_WAIT_SECONDS, last_status)
+            if job is None:
+                yield f"event: error\ndata: {json.dumps({'error': 'Unknown or expired job id'})}\n\n"
+                return
+            if job['status'] == last_status:
+                # Keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            last_status = job['status']
+            yield f"event: status\ndata: {json.dumps(job, default=str)}\n\n"
+            if job['status'] in FINISHED_STATUSES:
+                return
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
 
 # Export app for Vercel
 if __name__ == "__main__":
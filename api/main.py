@@ -1,41 +1,12 @@
 import os
 import sys
-import logging
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-class Base(DeclarativeBase):
-    pass
-
-db = SQLAlchemy(model_class=Base)
-
-# Create the Flask app for Vercel serverless
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///ecommerce_ai.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Initialize the database
-db.init_app(app)
-
-# Import models and create tables
-with app.app_context():
-    from models_serverless import ProductEligibility, AdSalesMetrics, TotalSalesMetrics
-    from routes_serverless import main_bp
-    
-    db.create_all()
-    app.register_blueprint(main_bp)
+# The full application with the same canonical models as api/index.py
+from main import app
 
 # Vercel handler
 def handler(request):
-    return app(request.environ, request.start_response)
\ No newline at end of file
+    return app(request.environ, request.start_response)
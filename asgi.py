@@ -0,0 +1,364 @@
+"""ASGI entry point with a non-blocking question pipeline.
+
+/api/ask (JSON or NDJSON) and /api/ask/stream are served natively on the
+event loop, using the async Gemini client and an async SQLAlchemy engine
+(aiosqlite or asyncpg), so one process can hold many in-flight questions.
+The stages themselves come from routes.question_steps, shared with the
+Flask app; this module only makes their Gemini and database calls with the
+async clients. Every other route is delegated to the Flask app from main.py.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import os
+import json
+import asyncio
+import logging
+from urllib.parse import parse_qs
+from sqlalchemy import text
+from sqlalchemy.exc import ResourceClosedError
+from sqlalchemy.ext.asyncio import create_async_engine
+from asgiref.wsgi import WsgiToAsgi
+from main import app as flask_app
+from database import read_database_url, configure_engine, monitor_pool
+import routes
+import data_stats
+import query_guard
+import telemetry
+from query_guard import QueryRejected
+
+_ASYNC_DRIVERS = [
+    ('sqlite:', 'sqlite+aiosqlite:'),
+    ('postgresql+psycopg2:', 'postgresql+asyncpg:'),
+    ('postgresql:', 'postgresql+asyncpg:'),
+]
+
+
+def async_database_url(database_url):
+    """Map a sync database URL onto the matching async driver."""
+    for prefix, async_prefix in _ASYNC_DRIVERS:
+        if database_url.startswith(prefix):
+            return async_prefix + database_url[len(prefix):]
+    return database_url
+
+
+class AsyncQuestionApp:
+    """ASGI app answering questions without blocking the event loop."""
+
+    def __init__(self, wsgi_app, database_url):
+        self.fallback = WsgiToAsgi(wsgi_app)
+        self.database_url = async_database_url(database_url)
+        self.engine = None
+
+    def _get_engine(self):
+        if self.engine is None:
+            options = {'pool_pre_ping': True}
+            if not self.database_url.startswith('sqlite'):
+                options['pool_size'] = int(os.environ.get('ASYNC_DB_POOL_SIZE', '20'))
+                options['max_overflow'] = int(os.environ.get('ASYNC_DB_MAX_OVERFLOW', '20'))
+            if self.database_url.startswith('postgresql'):
+                options['connect_args'] = {'server_settings': {'default_transaction_read_only': 'on'}}
+            self.engine = create_async_engine(self.database_url, **options)
+            # Only the question pipeline uses this engine, so it is read-only like the sync read bind
+            configure_engine(self.engine.sync_engine, read_only=True)
+            monitor_pool('async', self.engine.sync_engine)
+        return self.engine
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'http':
+            path, method = scope['path'], scope['method']
+            if path == '/api/ask' and method == 'POST':
+                await self._ask(scope, receive, send)
+                return
+            if path == '/api/ask/stream' and method in ('GET', 'POST'):
+                await self._ask_stream(scope, receive, send)
+                return
+        await self.fallback(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._get_engine()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.engine is not None:
+                    await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def execute_query(self, sql_query, params=None, max_rows=None, guarded=False, raise_errors=False):
+        """Async counterpart of routes.execute_query, sharing its result cache, row cap and guard."""
+        max_rows = max_rows or routes.MAX_RESULT_ROWS
+        try:
+            sql_query = routes.clean_sql(sql_query)
+            async with self._get_engine().connect() as connection:
+                data_version = await connection.run_sync(data_stats.read_version)
+            cache_key, cached = routes.cached_query_result(sql_query, params, max_rows, data_version)
+            if cached is not None:
+                return cached
+
+            query_result = await routes.query_flight.do_async(
+                routes._query_flight_key(sql_query, params, max_rows, guarded),
+                self._run_query, sql_query, params, max_rows, guarded)
+            routes.store_query_result(cache_key, query_result, max_rows)
+            return query_result
+
+        except QueryRejected:
+            raise
+        except Exception as e:
+            logging.error(f"Query execution error: {str(e)}")
+            if raise_errors:
+                raise
+            return None
+
+    async def _run_query(self, sql_query, params, max_rows, guarded):
+        with telemetry.span('execute_query') as span:
+            query_result = await self._execute(sql_query, params, max_rows, guarded, span)
+        telemetry.QUERY_ROWS.observe(len(query_result.rows), engine=span['engine'])
+        return query_result
+
+    async def _execute(self, sql_query, params, max_rows, guarded, span):
+        """Run a query on the columnar engine or a read-only connection, noting which on the span."""
+        async with self._get_engine().connect() as connection:
+            if guarded:
+                with telemetry.span('preflight'):
+                    await connection.run_sync(query_guard.preflight, sql_query, params)
+
+            columnar_engine = routes.columnar_engine
+            if columnar_engine is not None and columnar_engine.can_execute(sql_query, params):
+                await connection.run_sync(columnar_engine.refresh, sql_query)
+                query_result = await self._execute_columnar(sql_query, max_rows)
+                if query_result is not None:
+                    span['engine'] = 'columnar'
+                    span['rows'] = len(query_result.rows)
+                    return query_result
+            interrupt_timer = None
+            timeout = query_guard.timeout_statement(connection.dialect.name, query_guard.QUERY_TIMEOUT_SECONDS)
+            if timeout is not None:
+                await connection.execute(text(timeout))
+            else:
+                # SQLite has no statement timeout; interrupt aiosqlite's worker thread instead
+                driver_connection = (await connection.get_raw_connection()).driver_connection
+                if hasattr(driver_connection, 'interrupt'):
+                    interrupt_timer = asyncio.get_running_loop().call_later(
+                        query_guard.QUERY_TIMEOUT_SECONDS,
+                        lambda: asyncio.ensure_future(driver_connection.interrupt())
+                    )
+            try:
+                query_result = await self._fetch(connection, sql_query, params, max_rows)
+            finally:
+                if interrupt_timer is not None:
+                    interrupt_timer.cancel()
+        span['engine'] = 'database'
+        span['rows'] = len(query_result.rows)
+        return query_result
+
+    async def _execute_columnar(self, sql_query, max_rows):
+        """Run a query on the columnar engine in a worker thread; None to fall back to the database."""
+        columnar_engine = routes.columnar_engine
+        try:
+            return routes.QueryResult(*await asyncio.to_thread(
+                columnar_engine.execute, sql_query, max_rows, query_guard.QUERY_TIMEOUT_SECONDS))
+        except TimeoutError:
+            raise
+        except Exception as e:
+            columnar_engine.fallbacks += 1
+            logging.warning(f"Columnar engine could not run the query, using the database: {str(e)}")
+            return None
+
+    async def _fetch(self, connection, sql_query, params, max_rows):
+        result = await connection.stream(
+            text(sql_query), params or {},
+            execution_options={'yield_per': routes.FETCH_BATCH_SIZE}
+        )
+        try:
+            columns = list(result.keys())
+        except ResourceClosedError:
+            # Statements without a result set close the cursor immediately
+            return routes.QueryResult([{'message': 'Query executed successfully'}], False)
+        try:
+            rows = []
+            async for row in result:
+                if len(rows) == max_rows:
+                    return routes.QueryResult(rows, True)
+                rows.append(dict(zip(columns, row)))
+            return routes.QueryResult(rows, False)
+        finally:
+            await result.close()
+
+    async def run_question_pipeline(self, question, response_mode, stream_answer=False, defer_narrative=False):
+        """Drive routes.question_steps with the async Gemini client and database engine.
+
+        Yields the same (stage, payload) tuples as routes.run_question_pipeline.
+        """
+        gemini_service = routes.gemini_service
+        steps = routes.question_steps(question, response_mode, stream_answer, defer_narrative)
+        reply, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(reply)
+            except StopIteration:
+                return
+            reply, error = None, None
+            if not isinstance(step, routes.PipelineCall):
+                yield step
+            elif step.operation == 'format_response_stream':
+                async for text_chunk in gemini_service.format_response_stream_async(*step.args):
+                    yield 'answer', {'text': text_chunk}
+            else:
+                try:
+                    reply = await self._pipeline_call(step)
+                except Exception as e:
+                    error = e
+
+    async def _pipeline_call(self, step):
+        gemini_service = routes.gemini_service
+        operations = {
+            'execute_query': self.execute_query,
+            'generate_sql': gemini_service.generate_sql_query_async,
+            'repair_sql': gemini_service.repair_sql_query_async,
+            'format_response': gemini_service.format_response_async,
+        }
+        return await operations[step.operation](*step.args)
+
+    async def process_question(self, question, response_mode, defer_narrative=False):
+        """Async counterpart of routes._process_question; coalesced by the caller."""
+        try:
+            logging.info(f"Processing question: {question}")
+            stages = [stage async for stage in self.run_question_pipeline(
+                question, response_mode, defer_narrative=defer_narrative)]
+            return routes.collect_result(question, stages)
+        except Exception as e:
+            logging.error(f"Error processing question: {str(e)}")
+            return {'error': f'Error processing question: {str(e)}'}
+
+    async def _ask(self, scope, receive, send):
+        try:
+            data = json.loads(await _read_body(receive) or b'null')
+        except ValueError:
+            data = None
+        error, question, response_mode = routes.parse_ask_request(data)
+        if error:
+            await _send_json(send, 400, {'error': error})
+            return
+
+        defer_narrative = bool(data.get('defer_narrative'))
+        if routes.wants_ndjson(data, _header(scope, b'accept')):
+            await self._ask_ndjson(send, question, response_mode, defer_narrative)
+            return
+
+        with telemetry.trace_request('api_ask') as trace:
+            result = await routes.question_flight.do_async(
+                (routes.normalize_question(question), response_mode, defer_narrative),
+                self.process_question, question, response_mode, defer_narrative)
+            if 'question' in result:
+                result = dict(result, question=question)
+
+            with telemetry.span('serialize'):
+                body = json.dumps(result, default=str).encode('utf-8')
+        await _send_body(send, 200, body, [(b'server-timing', trace.server_timing().encode('ascii'))])
+
+    async def _ask_ndjson(self, send, question, response_mode, defer_narrative):
+        """Stream /api/ask as newline-delimited JSON, like routes._ndjson_response."""
+        async def chunks():
+            answer_parts = []
+            try:
+                logging.info(f"Processing question (ndjson): {question}")
+                with telemetry.trace_request('api_ask_ndjson'):
+                    async for stage, payload in self.run_question_pipeline(
+                            question, response_mode, defer_narrative=defer_narrative):
+                        if stage == 'answer':
+                            answer_parts.append(payload['text'])
+                        for chunk in routes.ndjson_stage(stage, payload):
+                            yield chunk
+                        if stage == 'error':
+                            return
+                yield routes._ndjson_line('done', routes.done_payload(answer_parts))
+            except Exception as e:
+                logging.error(f"NDJSON streaming error: {str(e)}")
+                yield routes._ndjson_line('error', {'error': f'Error processing question: {str(e)}'})
+
+        await _send_stream(send, b'application/x-ndjson', chunks())
+
+    async def _ask_stream(self, scope, receive, send):
+        if scope['method'] == 'POST':
+            try:
+                data = json.loads(await _read_body(receive) or b'null')
+            except ValueError:
+                data = None
+            data = data if isinstance(data, dict) else {}
+        else:
+            query = parse_qs(scope.get('query_string', b'').decode('utf-8'))
+            data = {key: values[0] for key, values in query.items()}
+
+        error, question, response_mode = routes.parse_ask_request(data, streaming=True)
+        if error:
+            await _send_json(send, 400, {'error': error})
+            return
+
+        async def events():
+            answer_parts = []
+            try:
+                logging.info(f"Streaming question: {question}")
+                with telemetry.trace_request('api_ask_stream'):
+                    async for stage, payload in self.run_question_pipeline(question, response_mode, stream_answer=True):
+                        if stage == 'answer':
+                            answer_parts.append(payload['text'])
+                        yield routes.sse_stage(stage, payload)
+                        if stage == 'error':
+                            return
+                yield routes._sse_event('done', routes.done_payload(answer_parts))
+            except Exception as e:
+                logging.error(f"Streaming error: {str(e)}")
+                yield routes._sse_event('error', {'error': f'Error processing question: {str(e)}'})
+
+        await _send_stream(send, b'text/event-stream; charset=utf-8', events(),
+                           [(b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')])
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def _send_json(send, status, payload):
+    await _send_body(send, status, json.dumps(payload, default=str).encode('utf-8'))
+
+
+async def _send_stream(send, content_type, chunks, headers=()):
+    """Send a 200 response whose body is each string from an async iterator, as it arrives."""
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', content_type),
+        *headers,
+    ]})
+    async for chunk in chunks:
+        await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+def _header(scope, name):
+    """A request header's value as a string, or None."""
+    for key, value in scope.get('headers', []):
+        if key.lower() == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def _send_body(send, status, body, headers=()):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('ascii')),
+        *headers,
+    ]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+app = AsyncQuestionApp(flask_app, read_database_url(flask_app.config['SQLALCHEMY_DATABASE_URI']))
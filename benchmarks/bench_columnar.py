@@ -0,0 +1,98 @@
+"""Compare aggregate query latency on SQLite against the DuckDB columnar engine.
+
+Requires the optional duckdb package.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_columnar --rows 1000000
+    python -m benchmarks.bench_columnar --rows 10000000 --repeats 1
+"""
+import os
+import time
+import argparse
+import tempfile
+
+QUERIES = {
+    'total_roas': (
+        "SELECT SUM(ad_sales) / SUM(ad_spend) AS roas FROM ad_sales_metrics"
+    ),
+    'group_by_item': (
+        "SELECT item_id, SUM(ad_sales) AS ad_sales, SUM(ad_spend) AS ad_spend "
+        "FROM ad_sales_metrics GROUP BY item_id"
+    ),
+    'top_cpc': (
+        "SELECT item_id, SUM(ad_spend) / SUM(clicks) AS cpc FROM ad_sales_metrics "
+        "GROUP BY item_id HAVING SUM(clicks) > 0 ORDER BY cpc DESC LIMIT 10"
+    ),
+    'daily_totals': (
+        "SELECT date, SUM(total_sales) AS total_sales, SUM(total_units_ordered) AS units "
+        "FROM total_sales_metrics GROUP BY date ORDER BY date"
+    ),
+    'join_ad_share': (
+        "SELECT a.item_id, SUM(a.ad_sales) / SUM(t.total_sales) AS ad_share "
+        "FROM ad_sales_metrics a JOIN total_sales_metrics t "
+        "ON a.item_id = t.item_id AND a.date = t.date GROUP BY a.item_id"
+    ),
+}
+
+
+def best_of(repeats, run):
+    """Return the best-of-N latency of run() in milliseconds."""
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows per metric table')
+    parser.add_argument('--items', type=int, default=1000, help='distinct item ids')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_columnar.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    # The synthetic rows go into an empty database, not on top of the bundled snapshots
+    os.environ['SNAPSHOT_AUTOLOAD'] = '0'
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+
+    from sqlalchemy import text
+    from main import app, db
+    from models import AdSalesMetrics, TotalSalesMetrics
+    from columnar_engine import ColumnarEngine, import_duckdb
+    from benchmarks import synthetic
+
+    if import_duckdb() is None:
+        parser.error('the duckdb package is not installed')
+
+    with app.app_context(), db.engine.begin() as connection:
+        print(f"Generating {args.rows:,} rows per table in {db_path} ...")
+        synthetic.insert_rows(connection, AdSalesMetrics.__table__, synthetic.ad_sales_rows(args.rows, args.items))
+        synthetic.insert_rows(connection, TotalSalesMetrics.__table__, synthetic.total_sales_rows(args.rows, args.items))
+        connection.execute(text("ANALYZE"))
+
+        engine = ColumnarEngine()
+        started = time.perf_counter()
+        for sql in QUERIES.values():
+            engine.refresh(connection, sql)
+        print(f"Columnar load: {(time.perf_counter() - started):.2f}s")
+
+        row_store = {
+            name: best_of(args.repeats, lambda: connection.execute(text(sql)).fetchall())
+            for name, sql in QUERIES.items()
+        }
+        columnar = {
+            name: best_of(args.repeats, lambda: engine.execute(sql, args.rows, timeout_seconds=600))
+            for name, sql in QUERIES.items()
+        }
+
+    print(f"\n{'query':<20}{'sqlite (ms)':>14}{'duckdb (ms)':>14}{'speedup':>10}")
+    for name in QUERIES:
+        speedup = row_store[name] / columnar[name] if columnar[name] else float('inf')
+        print(f"{name:<20}{row_store[name]:>14.2f}{columnar[name]:>14.2f}{speedup:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Measure GROUP BY / JOIN latency on the metric tables with and without indexes.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_indexes --rows 1000000
+"""
+import os
+import time
+import argparse
+import tempfile
+
+QUERIES = {
+    'group_by_item': (
+        "SELECT item_id, SUM(ad_sales) AS ad_sales, SUM(ad_spend) AS ad_spend "
+        "FROM ad_sales_metrics GROUP BY item_id"
+    ),
+    'filter_item_by_date': (
+        "SELECT date, SUM(ad_sales) AS ad_sales FROM ad_sales_metrics "
+        "WHERE item_id = 42 GROUP BY date"
+    ),
+    'date_range': (
+        "SELECT SUM(total_sales) AS total_sales FROM total_sales_metrics "
+        "WHERE date BETWEEN '2025-07-01' AND '2025-07-07'"
+    ),
+    'join_on_item_and_date': (
+        "SELECT a.item_id, SUM(a.ad_sales) / SUM(t.total_sales) AS ad_share "
+        "FROM ad_sales_metrics a JOIN total_sales_metrics t "
+        "ON a.item_id = t.item_id AND a.date = t.date "
+        "WHERE a.item_id < 10 GROUP BY a.item_id"
+    ),
+    'latest_eligibility': (
+        "SELECT eligibility FROM product_eligibility WHERE item_id = 42 "
+        "ORDER BY eligibility_datetime_utc DESC LIMIT 1"
+    ),
+}
+
+
+def time_queries(connection, repeats):
+    """Return the best-of-N latency in milliseconds for each benchmark query."""
+    from sqlalchemy import text
+
+    timings = {}
+    for name, sql in QUERIES.items():
+        best = float('inf')
+        for _ in range(repeats):
+            started = time.perf_counter()
+            connection.execute(text(sql)).fetchall()
+            best = min(best, time.perf_counter() - started)
+        timings[name] = best * 1000
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows per metric table')
+    parser.add_argument('--items', type=int, default=1000, help='distinct item ids')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_indexes.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    # The synthetic rows go into an empty database, not on top of the bundled snapshots
+    os.environ['SNAPSHOT_AUTOLOAD'] = '0'
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+
+    from sqlalchemy import text
+    from main import app, db
+    from models import ProductEligibility, AdSalesMetrics, TotalSalesMetrics
+    from benchmarks import synthetic
+
+    with app.app_context(), db.engine.begin() as connection:
+        models = (ProductEligibility, AdSalesMetrics, TotalSalesMetrics)
+        for model in models:
+            for index in model.__table__.indexes:
+                index.drop(bind=connection)
+
+        print(f"Generating {args.rows:,} rows per table in {db_path} ...")
+        synthetic.insert_rows(connection, AdSalesMetrics.__table__, synthetic.ad_sales_rows(args.rows, args.items))
+        synthetic.insert_rows(connection, TotalSalesMetrics.__table__, synthetic.total_sales_rows(args.rows, args.items))
+        synthetic.insert_rows(connection, ProductEligibility.__table__, synthetic.eligibility_rows(args.rows, args.items))
+        connection.execute(text("ANALYZE"))
+
+        before = time_queries(connection, args.repeats)
+
+        started = time.perf_counter()
+        for model in models:
+            for index in model.__table__.indexes:
+                index.create(bind=connection)
+        connection.execute(text("ANALYZE"))
+        print(f"Index build: {(time.perf_counter() - started):.2f}s")
+
+        after = time_queries(connection, args.repeats)
+
+    print(f"\n{'query':<24}{'no index (ms)':>16}{'indexed (ms)':>16}{'speedup':>10}")
+    for name in QUERIES:
+        speedup = before[name] / after[name] if after[name] else float('inf')
+        print(f"{name:<24}{before[name]:>16.2f}{after[name]:>16.2f}{speedup:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Measure CSV ingestion throughput (rows/sec) of incremental_loader.load_file.
+
+The first load fills an empty table; with --redeliver a copy of the same
+file is loaded again, so every row goes through the upsert's conflict path.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_ingest --rows 1000000 --compare-orm --redeliver
+"""
+import os
+import csv
+import time
+import shutil
+import argparse
+import tempfile
+
+
+def write_csv(path, rows):
+    """Write generated ad_sales_metrics rows to a CSV file."""
+    from benchmarks import synthetic
+
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = None
+        for row in synthetic.ad_sales_rows(rows):
+            if writer is None:
+                writer = csv.DictWriter(file, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+
+
+def orm_load(csv_path):
+    """Per-row ORM load, as data_loader worked before the chunked upserts."""
+    from datetime import datetime
+    from main import db
+    from models import AdSalesMetrics
+
+    with open(csv_path, 'r', encoding='utf-8') as file:
+        records = []
+        for row in csv.DictReader(file):
+            records.append(AdSalesMetrics(
+                date=datetime.strptime(row['date'], '%Y-%m-%d').date(),
+                item_id=int(row['item_id']),
+                ad_sales=float(row['ad_sales']),
+                impressions=int(row['impressions']),
+                ad_spend=float(row['ad_spend']),
+                clicks=int(row['clicks']),
+                units_sold=int(row['units_sold']),
+            ))
+            if len(records) >= 1000:
+                db.session.bulk_save_objects(records)
+                db.session.commit()
+                records = []
+        if records:
+            db.session.bulk_save_objects(records)
+            db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--compare-orm', action='store_true', help='also time the per-row ORM path')
+    parser.add_argument('--redeliver', action='store_true', help='also time reloading rows that already exist')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    csv_path = os.path.join(workdir, 'ad_sales.csv')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench_ingest.db')}"
+    # The synthetic rows go into an empty database, not on top of the bundled snapshots
+    os.environ['SNAPSHOT_AUTOLOAD'] = '0'
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from main import app, db
+    from models import AdSalesMetrics
+    import incremental_loader
+
+    print(f"Writing {args.rows:,} rows to {csv_path} ...")
+    write_csv(csv_path, args.rows)
+
+    results = {}
+    with app.app_context():
+        if args.compare_orm:
+            started = time.perf_counter()
+            orm_load(csv_path)
+            results['orm (bulk_save_objects)'] = time.perf_counter() - started
+            db.session.query(AdSalesMetrics).delete()
+            db.session.commit()
+
+        started = time.perf_counter()
+        loaded = incremental_loader.load_file(csv_path, 'ad_sales_metrics', chunk_size=args.chunk_size)
+        results[f'upsert (chunk={args.chunk_size})'] = time.perf_counter() - started
+        assert loaded == args.rows, f"loaded {loaded} of {args.rows} rows"
+
+        if args.redeliver:
+            # A new path has no watermark, so the whole file is read again
+            redelivered_path = os.path.join(workdir, 'ad_sales_redelivered.csv')
+            shutil.copyfile(csv_path, redelivered_path)
+            started = time.perf_counter()
+            loaded = incremental_loader.load_file(redelivered_path, 'ad_sales_metrics', chunk_size=args.chunk_size)
+            results['upsert, rows exist'] = time.perf_counter() - started
+            assert loaded == args.rows, f"reloaded {loaded} of {args.rows} rows"
+
+    print(f"\n{'path':<28}{'seconds':>10}{'rows/sec':>14}")
+    for name, seconds in results.items():
+        print(f"{name:<28}{seconds:>10.2f}{args.rows / seconds:>14,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Compare index size and join latency for integer and string item_id keys.
+
+Builds the ad and total sales tables twice in SQLite, once with the
+canonical INTEGER item_id and once with the VARCHAR(50) item_id the old
+serverless models used, each with its unique (item_id, date) index.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_keys --rows 1000000
+    python -m benchmarks.bench_keys --rows 1000000 --string-format 'SKU-{:08d}'
+"""
+import os
+import time
+import argparse
+import tempfile
+
+QUERIES = {
+    'join_on_item_and_date': (
+        "SELECT a.item_id, SUM(a.ad_sales) / SUM(t.total_sales) AS ad_share "
+        "FROM {ad} a JOIN {total} t ON a.item_id = t.item_id AND a.date = t.date "
+        "GROUP BY a.item_id"
+    ),
+    'group_by_item': (
+        "SELECT item_id, SUM(ad_sales) AS ad_sales FROM {ad} GROUP BY item_id"
+    ),
+    'filter_item_by_date': (
+        "SELECT date, ad_sales FROM {ad} WHERE item_id = :item_id ORDER BY date"
+    ),
+}
+
+
+def metric_tables(metadata, suffix, item_id_type):
+    """Copies of the ad and total sales tables with the given item_id type."""
+    from sqlalchemy import Table, Column, Index
+    from models import AdSalesMetrics, TotalSalesMetrics
+
+    tables = []
+    for model in (AdSalesMetrics, TotalSalesMetrics):
+        source = model.__table__
+        table = Table(f'{source.name}_{suffix}', metadata, *[
+            Column(column.name, item_id_type if column.name == 'item_id' else column.type,
+                   primary_key=column.primary_key, nullable=column.nullable)
+            for column in source.columns
+        ])
+        Index(f'uq_{table.name}_item_id_date', table.c.item_id, table.c.date, unique=True)
+        tables.append(table)
+    return tables
+
+
+def storage_bytes(connection, name):
+    """Bytes used by a table or index, from SQLite's dbstat virtual table."""
+    from sqlalchemy import text
+
+    return connection.execute(text("SELECT SUM(pgsize) FROM dbstat WHERE name = :name"), {'name': name}).scalar() or 0
+
+
+def best_of(repeats, run):
+    """Return the best-of-N latency of run() in milliseconds."""
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows per metric table')
+    parser.add_argument('--items', type=int, default=1000, help='distinct item ids')
+    parser.add_argument('--string-format', default='{}', help="format of the string ids, e.g. 'SKU-{:08d}'")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_keys.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from sqlalchemy import MetaData, Integer, String, text
+    from sqlalchemy import create_engine
+    from benchmarks import synthetic
+
+    engine = create_engine(os.environ['DATABASE_URL'])
+    metadata = MetaData()
+    variants = {
+        'integer': (metric_tables(metadata, 'int', Integer()), lambda item_id: item_id),
+        'string': (metric_tables(metadata, 'str', String(50)), lambda item_id: args.string_format.format(item_id)),
+    }
+
+    results = {}
+    with engine.begin() as connection:
+        metadata.create_all(connection)
+        print(f"Generating {args.rows:,} rows per table in {db_path} ...")
+        for name, ((ad_table, total_table), make_id) in variants.items():
+            for table, rows in ((ad_table, synthetic.ad_sales_rows(args.rows, args.items)),
+                                (total_table, synthetic.total_sales_rows(args.rows, args.items))):
+                synthetic.insert_rows(connection, table, ({**row, 'item_id': make_id(row['item_id'])} for row in rows))
+        connection.execute(text("ANALYZE"))
+
+        for name, ((ad_table, total_table), make_id) in variants.items():
+            sizes = {
+                'table_mb': sum(storage_bytes(connection, table.name) for table in (ad_table, total_table)),
+                'index_mb': sum(storage_bytes(connection, index.name)
+                                for table in (ad_table, total_table) for index in table.indexes),
+            }
+            timings = {
+                query: best_of(args.repeats, lambda: connection.execute(
+                    text(sql.format(ad=ad_table.name, total=total_table.name)), {'item_id': make_id(42)}
+                ).fetchall())
+                for query, sql in QUERIES.items()
+            }
+            results[name] = ({key: value / 1024 / 1024 for key, value in sizes.items()}, timings)
+
+    integer_sizes, integer_timings = results['integer']
+    string_sizes, string_timings = results['string']
+    print(f"\n{'measure':<28}{'integer':>12}{'string':>12}{'ratio':>9}")
+    for key in integer_sizes:
+        print(f"{key:<28}{integer_sizes[key]:>12.1f}{string_sizes[key]:>12.1f}{string_sizes[key] / integer_sizes[key]:>8.2f}x")
+    for query in QUERIES:
+        label = f"{query} (ms)"
+        print(f"{label:<28}{integer_timings[query]:>12.2f}{string_timings[query]:>12.2f}"
+              f"{string_timings[query] / integer_timings[query]:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
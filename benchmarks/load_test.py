@@ -0,0 +1,203 @@
+"""Load test /api/ask and /api/stats against the local LLM stub.
+
+Builds a synthetic dataset of --rows rows per metric table in a temporary
+SQLite database, starts the app in-process with LLM_BACKEND=stub and sends
+--requests requests from --concurrency threads. Reports p50/p95/p99 latency
+and throughput per endpoint, and per pipeline stage from the Server-Timing
+headers of /api/ask. With --url, drives a running server instead; start it
+with LLM_BACKEND=stub to keep the run off the Gemini quota.
+
+Usage (from the repository root):
+    python -m benchmarks.load_test --rows 1000000 --concurrency 16
+    python -m benchmarks.load_test --stub-latency-ms 800 --stub-jitter-ms 400 --requests 2000
+    python -m benchmarks.load_test --url http://localhost:5000 --concurrency 64 --unique-questions
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+# A mix of fast-path KPI questions and questions that go to the LLM
+QUESTIONS = [
+    'total sales',
+    'total ad spend',
+    'total sales by week',
+    'What is the RoAS for each product?',
+    'Which products have the highest CPC?',
+    'How many products are eligible for ads?',
+    'Which products get the most clicks?',
+    'Show total sales per day',
+    'What share of each product\'s sales comes from ads?',
+    'Which products sold the most units?',
+]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def parse_server_timing(header):
+    """Stage durations in seconds from a Server-Timing header, summed per stage."""
+    stages = {}
+    for entry in filter(None, (part.strip() for part in (header or '').split(','))):
+        name, _, duration = entry.partition(';dur=')
+        if duration:
+            stages[name] = stages.get(name, 0.0) + float(duration) / 1000
+    return stages
+
+
+def build_dataset(rows, items):
+    """Fill the app's (empty) database with synthetic metric rows, their rollups and the stats row."""
+    from main import app, db
+    from models import ProductEligibility, AdSalesMetrics, TotalSalesMetrics
+    from rollups import rebuild_rollups
+    from data_stats import rebuild_stats
+    from benchmarks import synthetic
+
+    with app.app_context(), db.engine.begin() as connection:
+        synthetic.insert_rows(connection, AdSalesMetrics.__table__, synthetic.ad_sales_rows(rows, items))
+        synthetic.insert_rows(connection, TotalSalesMetrics.__table__, synthetic.total_sales_rows(rows, items))
+        synthetic.insert_rows(connection, ProductEligibility.__table__, synthetic.eligibility_rows(items, items))
+        rebuild_rollups(connection)
+        rebuild_stats(connection)
+
+
+class InProcessClient:
+    """Sends requests through the Flask test client, one per thread."""
+
+    def __init__(self):
+        from main import app
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code, response.headers.get('Server-Timing')
+
+
+class HttpClient:
+    """Sends requests to a running server."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                response.read()
+                return response.status, response.headers.get('Server-Timing')
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+def run_load(client, args):
+    """Send the requests and return (endpoint, seconds, ok, stages) samples and the wall time."""
+    rng = random.Random(args.seed)
+    plan = []
+    for index in range(args.requests):
+        if rng.random() < args.stats_ratio:
+            plan.append(('api_stats', 'GET', '/api/stats', None))
+        else:
+            question = rng.choice(QUESTIONS)
+            if args.unique_questions:
+                question = f"{question} (run {index})"
+            plan.append(('api_ask', 'POST', '/api/ask', {'question': question, 'response_mode': args.response_mode}))
+
+    def send(step):
+        endpoint, method, path, body = step
+        started = time.perf_counter()
+        try:
+            status, server_timing = client.request(method, path, body)
+        except Exception:
+            status, server_timing = None, None
+        return endpoint, time.perf_counter() - started, status == 200, parse_server_timing(server_timing)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        samples = list(executor.map(send, plan))
+    return samples, time.perf_counter() - started
+
+
+def report(samples, wall):
+    print(f"\n{'':<22}{'count':>8}{'errors':>8}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}{'req/s':>9}")
+
+    def line(label, durations, errors=0):
+        durations = sorted(durations)
+        print(f"{label:<22}{len(durations):>8}{errors:>8}"
+              f"{percentile(durations, 0.50) * 1000:>11.1f}{percentile(durations, 0.95) * 1000:>11.1f}"
+              f"{percentile(durations, 0.99) * 1000:>11.1f}{len(durations) / wall:>9.1f}")
+
+    for endpoint in sorted({sample[0] for sample in samples}):
+        endpoint_samples = [sample for sample in samples if sample[0] == endpoint]
+        line(endpoint, [sample[1] for sample in endpoint_samples],
+             sum(1 for sample in endpoint_samples if not sample[2]))
+    line('total', [sample[1] for sample in samples], sum(1 for sample in samples if not sample[2]))
+
+    stage_durations = {}
+    for _, _, _, stages in samples:
+        for stage, seconds in stages.items():
+            stage_durations.setdefault(stage, []).append(seconds)
+    if stage_durations:
+        print("\nper stage (requests that ran the stage)")
+        for stage, durations in sorted(stage_durations.items()):
+            line(f"  {stage}", durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='base URL of a running server; default runs the app in-process')
+    parser.add_argument('--rows', type=int, default=100_000, help='rows per metric table (in-process only)')
+    parser.add_argument('--items', type=int, default=1000, help='distinct item ids (in-process only)')
+    parser.add_argument('--requests', type=int, default=500, help='requests to send')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once')
+    parser.add_argument('--stats-ratio', type=float, default=0.2, help='fraction of requests sent to /api/stats')
+    parser.add_argument('--response-mode', default='auto', choices=['auto', 'raw', 'template', 'llm'])
+    parser.add_argument('--unique-questions', action='store_true',
+                        help='make every question distinct so the translation and result caches miss')
+    parser.add_argument('--stub-latency-ms', type=float, default=500, help='artificial LLM latency (in-process only)')
+    parser.add_argument('--stub-jitter-ms', type=float, default=250, help='extra random LLM latency (in-process only)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.url:
+        client = HttpClient(args.url)
+    else:
+        db_path = os.path.join(tempfile.mkdtemp(), 'load_test.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+        os.environ['SNAPSHOT_AUTOLOAD'] = '0'
+        os.environ['LLM_BACKEND'] = 'stub'
+        os.environ['LLM_STUB_LATENCY_MS'] = str(args.stub_latency_ms)
+        os.environ['LLM_STUB_JITTER_MS'] = str(args.stub_jitter_ms)
+        os.environ.setdefault('GEMINI_API_KEY', 'load-test')
+        import logging
+        logging.disable(logging.INFO)
+
+        print(f"Generating {args.rows:,} rows per table in {db_path} ...")
+        build_dataset(args.rows, args.items)
+        client = InProcessClient()
+
+    print(f"Sending {args.requests} requests at concurrency {args.concurrency} ...")
+    samples, wall = run_load(client, args)
+    report(samples, wall)
+    print(f"\nwall time {wall:.2f}s, throughput {len(samples) / wall:.1f} req/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Report where cold start time goes for an entry point.
+
+Imports the entry point in a fresh interpreter under ``python -X importtime``
+and prints the total import time and the slowest modules, cumulative and
+self. Run it on each release and append the record to a file to track cold
+starts over time.
+
+Usage (from the repository root):
+    python -m benchmarks.profile_cold_start
+    python -m benchmarks.profile_cold_start --entry api.index --top 30
+    python -m benchmarks.profile_cold_start --runs 5 --output cold_start.jsonl
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+
+def parse_importtime(stderr):
+    """Parse -X importtime output into (module, self_us, cumulative_us) tuples."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def profile_import(entry, env):
+    """Import entry in a fresh interpreter; returns (wall seconds, modules)."""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {entry}'],
+        env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {entry} failed:\n{completed.stderr[-2000:]}")
+    return wall, parse_importtime(completed.stderr)
+
+
+def release_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'],
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entry', default='main', help='module to import, e.g. main, asgi or api.index')
+    parser.add_argument('--top', type=int, default=20, help='slowest modules to list')
+    parser.add_argument('--runs', type=int, default=3, help='imports to run; the fastest is reported')
+    parser.add_argument('--output', help='append the report as a JSON line to this file')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'cold_start.db')}")
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.getcwd(), env.get('PYTHONPATH')]))
+
+    # The first run may create and load the database; later runs are warm-database cold starts
+    runs = [profile_import(args.entry, env) for _ in range(args.runs)]
+    first_wall = runs[0][0]
+    wall, modules = min(runs[1:] or runs, key=lambda run: run[0])
+    top_level = [module for module in modules if module[0] == args.entry]
+    import_us = top_level[0][2] if top_level else sum(module[1] for module in modules)
+
+    print(f"{args.entry}: {import_us / 1000:.1f} ms import, {wall * 1000:.1f} ms process wall "
+          f"(first run, which may create the database: {first_wall * 1000:.1f} ms)")
+    print(f"\n{'cumulative (ms)':>16}{'self (ms)':>12}  module")
+    slowest = sorted(modules, key=lambda module: module[2], reverse=True)[:args.top]
+    for name, self_us, cumulative_us in slowest:
+        print(f"{cumulative_us / 1000:>16.1f}{self_us / 1000:>12.1f}  {name}")
+
+    if args.output:
+        record = {
+            'entry': args.entry,
+            'version': release_version(),
+            'recorded_at': datetime.utcnow().isoformat(),
+            'python': sys.version.split()[0],
+            'import_ms': round(import_us / 1000, 1),
+            'wall_ms': round(wall * 1000, 1),
+            'first_run_wall_ms': round(first_wall * 1000, 1),
+            'slowest': [{'module': name, 'cumulative_ms': round(cumulative_us / 1000, 1),
+                         'self_ms': round(self_us / 1000, 1)} for name, self_us, cumulative_us in slowest],
+        }
+        with open(args.output, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(record) + '\n')
+        print(f"\nAppended report to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Synthetic data generators shaped like the attached_assets CSV files."""
+import random
+from datetime import date, datetime, timedelta
+
+START_DATE = date(2025, 6, 1)
+
+
+def _item_days(rows, items):
+    """Yield (item_id, date) pairs covering one row per item per day."""
+    for index in range(rows):
+        yield index % items, START_DATE + timedelta(days=index // items)
+
+
+def ad_sales_rows(rows, items=1000, seed=1):
+    """Yield ad_sales_metrics row dicts."""
+    rng = random.Random(seed)
+    for item_id, day in _item_days(rows, items):
+        clicks = rng.randint(0, 40)
+        yield {
+            'date': day,
+            'item_id': item_id,
+            'ad_sales': round(rng.uniform(0, 500), 2),
+            'impressions': rng.randint(0, 5000),
+            'ad_spend': round(rng.uniform(0, 50), 2),
+            'clicks': clicks,
+            'units_sold': rng.randint(0, clicks),
+        }
+
+
+def total_sales_rows(rows, items=1000, seed=2):
+    """Yield total_sales_metrics row dicts."""
+    rng = random.Random(seed)
+    for item_id, day in _item_days(rows, items):
+        yield {
+            'date': day,
+            'item_id': item_id,
+            'total_sales': round(rng.uniform(0, 800), 2),
+            'total_units_ordered': rng.randint(0, 10),
+        }
+
+
+def eligibility_rows(rows, items=1000, seed=3):
+    """Yield product_eligibility row dicts."""
+    rng = random.Random(seed)
+    for item_id, day in _item_days(rows, items):
+        eligible = rng.random() > 0.2
+        yield {
+            'eligibility_datetime_utc': datetime.combine(day, datetime.min.time()) + timedelta(hours=8),
+            'item_id': item_id,
+            'eligibility': eligible,
+            'message': None if eligible else 'Product is out of stock.',
+        }
+
+
+def insert_rows(connection, table, rows, chunk_size=10000):
+    """Insert generated rows into a table in executemany chunks."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            connection.execute(table.insert(), chunk)
+            chunk = []
+    if chunk:
+        connection.execute(table.insert(), chunk)
@@ -0,0 +1,159 @@
+"""Optional DuckDB backend for analytical queries over the metric tables.
+
+The ad and total sales fact tables are narrow and numeric, which suits a
+columnar engine far better than SQLite's row store. When COLUMNAR_ENGINE is
+set to ``duckdb`` (and the duckdb package is installed), generated SELECTs
+that read only these tables are run against an in-memory DuckDB copy.
+A table is copied from the database on first use and again whenever the
+data_stats version stored in the database has moved on, so loads made by
+other workers or by ``incremental_loader --watch`` are picked up too.
+Queries DuckDB cannot run fall back to the database.
+"""
+import os
+import csv
+import logging
+import tempfile
+import threading
+from datetime import date, datetime
+from sqlalchemy import select, Integer, BigInteger, Float, Numeric, Date, DateTime, Boolean
+from result_cache import referenced_tables
+from data_stats import read_version
+from models import AdSalesMetrics, TotalSalesMetrics
+
+COLUMNAR_MODELS = [AdSalesMetrics, TotalSalesMetrics]
+
+# Rows copied per round trip when loading a table, and fetched per batch from DuckDB
+_LOAD_BATCH_SIZE = 50000
+_FETCH_BATCH_SIZE = 10000
+
+
+def import_duckdb():
+    """Import duckdb on first use, or return None if it is not installed."""
+    try:
+        import duckdb
+    except ImportError:
+        return None
+    return duckdb
+
+
+def _duckdb_type(column):
+    column_type = column.type
+    if isinstance(column_type, (Integer, BigInteger)):
+        return 'BIGINT'
+    if isinstance(column_type, (Float, Numeric)):
+        return 'DOUBLE'
+    if isinstance(column_type, DateTime):
+        return 'TIMESTAMP'
+    if isinstance(column_type, Date):
+        return 'DATE'
+    if isinstance(column_type, Boolean):
+        return 'BOOLEAN'
+    return 'VARCHAR'
+
+
+def _plain_value(value):
+    # Raw SQL on SQLite returns dates as ISO strings; keep results identical
+    if isinstance(value, (date, datetime)):
+        return str(value)
+    return value
+
+
+class ColumnarEngine:
+    """In-memory DuckDB copy of the metric tables, refreshed by the data_stats version."""
+
+    def __init__(self, models=None):
+        self.tables = {model.__tablename__: model.__table__ for model in (models or COLUMNAR_MODELS)}
+        self.duckdb = import_duckdb()
+        self.connection = self.duckdb.connect(':memory:')
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.fallbacks = 0
+        self.loads = 0
+
+    def can_execute(self, sql_query, params=None):
+        """True if the query is unparameterized and reads only columnar tables."""
+        if params:
+            return False
+        tables = referenced_tables(sql_query)
+        return bool(tables) and all(table in self.tables for table in tables)
+
+    def refresh(self, source_connection, sql_query):
+        """(Re)load the tables the query reads that were copied before the latest load."""
+        with self._lock:
+            version = read_version(source_connection)
+            for table_name in referenced_tables(sql_query):
+                if self._versions.get(table_name) != version:
+                    self._load_table(source_connection, self.tables[table_name])
+                    self._versions[table_name] = version
+
+    def execute(self, sql_query, max_rows, timeout_seconds):
+        """Run a query on the loaded tables; returns (rows, truncated).
+
+        Raises TimeoutError if the query runs longer than timeout_seconds.
+        """
+        cursor = self.connection.cursor()
+        timer = threading.Timer(timeout_seconds, cursor.interrupt)
+        timer.start()
+        try:
+            # Match SQLite and PostgreSQL, where int / int truncates; settings are per cursor
+            cursor.execute("SET integer_division = true")
+            cursor.execute(sql_query)
+            columns = [description[0] for description in cursor.description]
+            rows = []
+            while len(rows) <= max_rows:
+                batch = cursor.fetchmany(_FETCH_BATCH_SIZE)
+                if not batch:
+                    break
+                rows.extend(dict(zip(columns, map(_plain_value, row))) for row in batch)
+            self.queries += 1
+            return rows[:max_rows], len(rows) > max_rows
+        except self.duckdb.InterruptException:
+            raise TimeoutError(f"Query exceeded {timeout_seconds} seconds")
+        finally:
+            timer.cancel()
+            cursor.close()
+
+    def stats(self):
+        """Return query, fallback and load counts."""
+        return {
+            'tables': {name: self._versions.get(name) for name in self.tables},
+            'queries': self.queries,
+            'fallbacks': self.fallbacks,
+            'loads': self.loads,
+        }
+
+    def _load_table(self, source_connection, table):
+        columns = ', '.join(f"'{column.name}': '{_duckdb_type(column)}'" for column in table.columns)
+        with tempfile.NamedTemporaryFile('w', newline='', suffix='.csv', delete=False) as csv_file:
+            path = csv_file.name
+            writer = csv.writer(csv_file)
+            writer.writerow([column.name for column in table.columns])
+            result = source_connection.execute(select(table), execution_options={'yield_per': _LOAD_BATCH_SIZE})
+            row_count = 0
+            for row in result:
+                writer.writerow(['' if value is None else value for value in row])
+                row_count += 1
+        try:
+            self.connection.execute(
+                f"CREATE OR REPLACE TABLE {table.name} AS "
+                f"SELECT * FROM read_csv('{path}', header = true, nullstr = '', columns = {{{columns}}})"
+            )
+        finally:
+            os.unlink(path)
+        self.loads += 1
+        logging.info(f"Loaded {row_count} rows of {table.name} into the columnar engine")
+
+
+def create_columnar_engine():
+    """Build the engine selected by COLUMNAR_ENGINE, or None if disabled or unavailable."""
+    backend = os.environ.get('COLUMNAR_ENGINE', 'none').lower()
+    if backend in ('', 'none'):
+        return None
+    if backend != 'duckdb':
+        logging.warning(f"Unknown COLUMNAR_ENGINE {backend!r}; using the database only")
+        return None
+    if import_duckdb() is None:
+        logging.warning("COLUMNAR_ENGINE=duckdb but the duckdb package is not installed; using the database only")
+        return None
+    return ColumnarEngine()
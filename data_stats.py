@@ -0,0 +1,77 @@
+"""Row counts and totals behind /api/stats, maintained at ingest time.
+
+The ``data_stats`` table holds one row with the record count of each fact
+table and the all-time revenue and ad spend. Loaders call ``record_load`` in
+the same transaction as their inserts, after ``refresh_rollups``, so
+/api/stats reads a single row instead of counting and summing the fact
+tables on every page load. Counts are adjusted by the number of new rows;
+the totals are copied from the all-time rollup, which the load has just
+recomputed.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import select, delete, func
+from models import (ProductEligibility, AdSalesMetrics, TotalSalesMetrics, AllTimeMetricsRollup,
+                    DataStats)
+from rollups import SOURCE_TABLES
+
+# Fact table -> its data_stats count column
+COUNT_COLUMNS = {
+    'product_eligibility': 'eligibility_records',
+    'ad_sales_metrics': 'ad_records',
+    'total_sales_metrics': 'sales_records',
+}
+
+
+def _totals(connection):
+    all_time = AllTimeMetricsRollup.__table__
+    row = connection.execute(select(all_time.c.total_sales, all_time.c.ad_spend)).first()
+    if row is None:
+        return {'total_revenue': 0.0, 'total_ad_spend': 0.0}
+    return {'total_revenue': row.total_sales, 'total_ad_spend': row.ad_spend}
+
+
+def record_load(connection, table_name, new_rows):
+    """Count new_rows more rows in table_name and refresh the totals it feeds."""
+    column = COUNT_COLUMNS.get(table_name)
+    if column is None:
+        return
+    stats = DataStats.__table__
+    values = {column: stats.c[column] + new_rows, 'version': stats.c.version + 1, 'updated_at': datetime.utcnow()}
+    if table_name in SOURCE_TABLES:
+        values.update(_totals(connection))
+    result = connection.execute(stats.update().where(stats.c.id == 1).values(**values))
+    if result.rowcount == 0:
+        # No row yet, e.g. data loaded before the table existed
+        rebuild_stats(connection)
+
+
+def read_version(connection):
+    """The stats row's version, or 0 before it has been built.
+
+    Every load bumps it in its own transaction, whichever process runs it.
+    """
+    stats = DataStats.__table__
+    return connection.execute(select(stats.c.version).where(stats.c.id == 1)).scalar() or 0
+
+
+def rebuild_stats(connection):
+    """Recompute the stats row from the fact tables and the all-time rollup."""
+    stats = DataStats.__table__
+    version = read_version(connection)
+    counts = {
+        column: connection.execute(select(func.count()).select_from(model.__table__)).scalar()
+        for column, model in [('eligibility_records', ProductEligibility), ('ad_records', AdSalesMetrics),
+                              ('sales_records', TotalSalesMetrics)]
+    }
+    connection.execute(delete(stats))
+    connection.execute(stats.insert().values(id=1, version=version + 1, updated_at=datetime.utcnow(),
+                                             **counts, **_totals(connection)))
+    logging.info(f"Rebuilt data stats: {counts}")
+
+
+def read_stats(connection):
+    """The stats row as a dict, or None before it has been built."""
+    stats = DataStats.__table__
+    row = connection.execute(select(stats).where(stats.c.id == 1)).first()
+    return dict(row._mapping) if row is not None else None
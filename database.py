@@ -0,0 +1,177 @@
+"""The SQLAlchemy extension shared by the full app (main.py) and the serverless app (api/index.py).
+
+Kept apart from main so models, migrations and loaders can be imported
+without building the full application.
+
+Two engines are configured: the default one, used by the loaders and
+migrations to write, and a read-only ``read`` bind that the question
+pipeline runs queries on, so generated SQL can never write and readers
+and the loader draw from separate pools. On SQLite both use WAL
+journaling, so readers do not block on a load, and memory-mapped I/O.
+"""
+import os
+import threading
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm import DeclarativeBase
+
+READ_BIND = 'read'
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '300'))
+SQLITE_WAL = os.environ.get('SQLITE_WAL', '1') == '1'
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+def _normalize_url(url):
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def database_url(default="sqlite:///ecommerce_ai.db"):
+    """DATABASE_URL with Heroku-style postgres:// URLs normalized for SQLAlchemy."""
+    return _normalize_url(os.environ.get("DATABASE_URL", default))
+
+
+def read_database_url(url):
+    """DATABASE_READ_URL (e.g. a replica) if set, otherwise the primary URL."""
+    return _normalize_url(os.environ.get("DATABASE_READ_URL") or url)
+
+
+def _is_memory_sqlite(url):
+    return url.startswith('sqlite') and (url.rstrip('/') in ('sqlite:', 'sqlite+pysqlite:') or ':memory:' in url)
+
+
+def engine_options(url):
+    """Pool settings for an engine on url."""
+    options = {
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    # In-memory SQLite uses a single-connection pool
+    if not _is_memory_sqlite(url):
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+
+def database_binds(url):
+    """SQLALCHEMY_BINDS with the read-only engine, or {} if it would not see the same data."""
+    if _is_memory_sqlite(url):
+        # A second engine would open a second, empty in-memory database
+        return {}
+    read_url = read_database_url(url)
+    options = engine_options(read_url)
+    if read_url.startswith('postgresql'):
+        options['connect_args'] = {'options': '-c default_transaction_read_only=on'}
+    return {READ_BIND: {'url': read_url, **options}}
+
+
+def sqlite_pragmas(read_only=False):
+    """PRAGMA statements run on every new SQLite connection."""
+    pragmas = [f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}", f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}"]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    elif SQLITE_WAL:
+        # WAL persists in the database file; NORMAL sync is safe with it
+        pragmas += ["PRAGMA journal_mode = WAL", "PRAGMA synchronous = NORMAL"]
+    return pragmas
+
+
+def configure_engine(engine, read_only=False):
+    """Apply connection settings to a sync engine (or an async engine's sync_engine)."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(read_only)
+
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def configure_engines(app):
+    """Apply connection settings to the app's engines and monitor their pools."""
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            configure_engine(engine, read_only=bind_key == READ_BIND)
+            monitor_pool('write' if bind_key is None else bind_key, engine)
+
+
+def read_engine():
+    """The engine for read-only queries; the default engine if there is no read bind."""
+    return db.engines.get(READ_BIND, db.engine)
+
+
+class PoolMonitor:
+    """Checkout counts and utilization of an engine's connection pool."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.checkouts = 0
+        self.peak_checked_out = 0
+        self._lock = threading.Lock()
+        event.listen(engine, 'checkout', self._on_checkout)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        checked_out = self._checked_out()
+        with self._lock:
+            self.checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, checked_out or 0)
+
+    def _checked_out(self):
+        return self.engine.pool.checkedout() if isinstance(self.engine.pool, QueuePool) else None
+
+    def stats(self):
+        pool = self.engine.pool
+        stats = {
+            'pool': type(pool).__name__,
+            'checkouts': self.checkouts,
+            'peak_checked_out': self.peak_checked_out,
+        }
+        if isinstance(pool, QueuePool):
+            # overflow() counts up from -pool_size as connections are opened
+            capacity = pool.size() + pool._max_overflow
+            checked_out = pool.checkedout()
+            stats.update({
+                'size': pool.size(),
+                'max_overflow': pool._max_overflow,
+                'checked_out': checked_out,
+                'checked_in': pool.checkedin(),
+                'overflow': max(pool.overflow(), 0),
+                'utilization': round(checked_out / capacity, 3) if capacity > 0 else None,
+            })
+        return stats
+
+
+_pool_monitors = {}
+_pool_monitors_lock = threading.Lock()
+
+
+def monitor_pool(name, engine):
+    """Track an engine's pool under name for pool_stats()."""
+    with _pool_monitors_lock:
+        if name not in _pool_monitors or _pool_monitors[name].engine is not engine:
+            _pool_monitors[name] = PoolMonitor(engine)
+
+
+def pool_stats():
+    """Pool statistics of every monitored engine, by name."""
+    with _pool_monitors_lock:
+        monitors = dict(_pool_monitors)
+    return {name: monitor.stats() for name, monitor in monitors.items()}
@@ -0,0 +1,305 @@
+"""Deterministic answers for common KPI questions, without calling Gemini.
+
+``FastPathMatcher.match`` recognises a small template grammar:
+
+    [filler] <metric> [by day|by week] [for item N] [between D1 and D2 | on D]
+    [filler] top|highest|lowest [N] products by <metric> [date range]
+
+and returns parameterized SQL plus an answer template. Questions containing
+any word outside the grammar are left to the LLM, so a hit is always a
+question we can answer exactly.
+"""
+import re
+import threading
+from datetime import date
+
+# name -> (label, rollup expression, raw table, raw expression, value format)
+METRICS = {
+    'total_sales': ('total sales', 'SUM(total_sales)', 'total_sales_metrics', 'SUM(total_sales)', 'currency'),
+    'total_units_ordered': ('units ordered', 'SUM(total_units_ordered)', 'total_sales_metrics',
+                            'SUM(total_units_ordered)', 'count'),
+    'ad_sales': ('ad sales', 'SUM(ad_sales)', 'ad_sales_metrics', 'SUM(ad_sales)', 'currency'),
+    'ad_spend': ('ad spend', 'SUM(ad_spend)', 'ad_sales_metrics', 'SUM(ad_spend)', 'currency'),
+    'clicks': ('clicks', 'SUM(clicks)', 'ad_sales_metrics', 'SUM(clicks)', 'count'),
+    'impressions': ('impressions', 'SUM(impressions)', 'ad_sales_metrics', 'SUM(impressions)', 'count'),
+    'ad_units_sold': ('units sold through ads', 'SUM(ad_units_sold)', 'ad_sales_metrics',
+                      'SUM(units_sold)', 'count'),
+    'roas': ('RoAS', 'SUM(ad_sales) / NULLIF(SUM(ad_spend), 0)', 'ad_sales_metrics',
+             'SUM(ad_sales) / NULLIF(SUM(ad_spend), 0)', 'ratio'),
+    'cpc': ('CPC', 'SUM(ad_spend) / NULLIF(SUM(clicks), 0)', 'ad_sales_metrics',
+            'SUM(ad_spend) / NULLIF(SUM(clicks), 0)', 'currency'),
+    'ctr': ('click-through rate', 'SUM(clicks) * 1.0 / NULLIF(SUM(impressions), 0)', 'ad_sales_metrics',
+            'SUM(clicks) * 1.0 / NULLIF(SUM(impressions), 0)', 'percent'),
+}
+
+# Metrics whose product rankings use each product's highest (or lowest) single
+# row rather than the ratio of its sums, as in sql_prompt's "Highest CPC" example
+ROW_RANKED_METRICS = {
+    'cpc': 'ad_spend / NULLIF(clicks, 0)',
+}
+
+# Phrases are tried longest first so "ad sales" wins over "sales".
+METRIC_PHRASES = sorted([
+    ('return on ad spend', 'roas'), ('roas', 'roas'),
+    ('cost per click', 'cpc'), ('cpc', 'cpc'),
+    ('click through rate', 'ctr'), ('ctr', 'ctr'),
+    ('ad sales', 'ad_sales'), ('advertising sales', 'ad_sales'), ('ad revenue', 'ad_sales'),
+    ('ad spend', 'ad_spend'), ('advertising spend', 'ad_spend'), ('spend', 'ad_spend'),
+    ('total sales', 'total_sales'), ('sales', 'total_sales'), ('revenue', 'total_sales'),
+    ('units ordered', 'total_units_ordered'),
+    ('units sold through ads', 'ad_units_sold'), ('ad units sold', 'ad_units_sold'),
+    ('clicks', 'clicks'), ('impressions', 'impressions'),
+], key=lambda phrase: -len(phrase[0]))
+
+FILLER_WORDS = {
+    'what', 'whats', 's', 'is', 'are', 'was', 'my', 'our', 'the', 'a', 'an', 'calculate',
+    'compute', 'show', 'me', 'give', 'tell', 'get', 'find', 'list', 'total', 'overall',
+    'all', 'time', 'of', 'for', 'in', 'which', 'has', 'had', 'have', 'with', 'value',
+    'current', 'please', 'how', 'much', 'many', 'did', 'do', 'we', 'i', 'and', 'to', 'date',
+    'product', 'products', 'item', 'items', 'by', 'per', 'each', 'on', 'performing',
+}
+
+_DATE = r'(\d{4}-\d{2}-\d{2})'
+_DATE_RANGE = re.compile(rf'\b(?:between|from) {_DATE} (?:and|to) {_DATE}\b')
+_SINGLE_DATE = re.compile(rf'\b(?:on|for) {_DATE}\b')
+_ITEM = re.compile(r'\b(?:for |of )?(?:item|product)(?: id| item_id)? (\d+)\b|\bitem_id (\d+)\b')
+_TOP_N = re.compile(r'\b(top|bottom) (\d+)\b')
+_DESCENDING = re.compile(r'\b(top|highest|most|best|largest|biggest)\b')
+_ASCENDING = re.compile(r'\b(bottom|lowest|least|worst|smallest)\b')
+_BY_DAY = re.compile(r'\b(by day|per day|each day|daily)\b')
+_BY_WEEK = re.compile(r'\b(by week|per week|each week|weekly)\b')
+_BY_ITEM = re.compile(r'\b(by product|per product|by item|per item|each product|each item)\b')
+
+_NON_DATE_HYPHEN = re.compile(r'(?<!\d)-|-(?!\d)')
+_PUNCTUATION = re.compile(r'[^\w\s-]')
+
+MAX_TOP_N = 100
+DEFAULT_TOP_N = 10
+MAX_LISTED_ROWS = 10
+
+
+def normalize(question):
+    """Lowercase and strip punctuation, keeping the hyphens inside ISO dates."""
+    text = _PUNCTUATION.sub(' ', question.lower())
+    text = _NON_DATE_HYPHEN.sub(' ', text)
+    return ' '.join(text.split())
+
+
+def format_value(value, value_format):
+    """Render a metric value for an answer sentence."""
+    if value is None:
+        return 'not available'
+    if value_format == 'currency':
+        return f"${value:,.2f}"
+    if value_format == 'percent':
+        return f"{value * 100:.2f}%"
+    if value_format == 'ratio':
+        return f"{value:,.2f}"
+    return f"{int(value):,}"
+
+
+class FastPathMatch:
+    """A recognised question: SQL, bound parameters and an answer template."""
+
+    def __init__(self, intent, metric, sql_query, params, scope, limit=None, descending=True):
+        self.intent = intent
+        self.metric = metric
+        self.sql_query = sql_query
+        self.params = params
+        self.scope = scope
+        self.limit = limit
+        self.descending = descending
+
+    def format_answer(self, rows):
+        """Turn query rows into the answer sentence."""
+        label, value_format = METRICS[self.metric][0], METRICS[self.metric][4]
+
+        if self.intent == 'scalar':
+            value = rows[0][self.metric] if rows else None
+            return f"Your {label}{self.scope} is {format_value(value, value_format)}."
+
+        if not rows:
+            return f"No data found for {label}{self.scope}."
+
+        if self.intent == 'top':
+            direction = 'highest' if self.descending else 'lowest'
+            if self.limit == 1:
+                row = rows[0]
+                return (f"Item {row['item_id']} has the {direction} {label}{self.scope} "
+                        f"at {format_value(row[self.metric], value_format)}.")
+            entries = ', '.join(f"item {row['item_id']} ({format_value(row[self.metric], value_format)})"
+                                for row in rows)
+            return f"Products with the {direction} {label}{self.scope}: {entries}."
+
+        period_column = 'date' if self.intent == 'by_day' else 'week_start'
+        period = 'day' if self.intent == 'by_day' else 'week'
+        lines = [f"- {row[period_column]}: {format_value(row[self.metric], value_format)}"
+                 for row in rows[:MAX_LISTED_ROWS]]
+        if len(rows) > MAX_LISTED_ROWS:
+            lines.append(f"- ... and {len(rows) - MAX_LISTED_ROWS} more")
+        return f"Your {label} by {period}{self.scope}:\n" + '\n'.join(lines)
+
+
+class FastPathMatcher:
+    """Matches canned KPI questions and counts hits and misses per intent."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = 0
+
+    def match(self, question):
+        """Return a FastPathMatch for the question, or None to use the LLM."""
+        result = self._match(normalize(question))
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits[result.intent] = self.hits.get(result.intent, 0) + 1
+        return result
+
+    def stats(self):
+        """Return hit counts per intent, misses and the overall hit rate."""
+        with self._lock:
+            total_hits = sum(self.hits.values())
+            lookups = total_hits + self.misses
+            return {
+                'hits': dict(self.hits),
+                'misses': self.misses,
+                'hit_rate': round(total_hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _match(self, text):
+        params = {}
+        scope = ''
+
+        found = _DATE_RANGE.search(text)
+        if found:
+            params['start_date'], params['end_date'] = found.group(1), found.group(2)
+            scope += f" between {found.group(1)} and {found.group(2)}"
+            text = _DATE_RANGE.sub(' ', text)
+        else:
+            found = _SINGLE_DATE.search(text)
+            if found:
+                params['start_date'] = params['end_date'] = found.group(1)
+                scope += f" on {found.group(1)}"
+                text = _SINGLE_DATE.sub(' ', text)
+        try:
+            for key in ('start_date', 'end_date'):
+                if key in params:
+                    date.fromisoformat(params[key])
+        except ValueError:
+            return None
+
+        found = _ITEM.search(text)
+        if found:
+            params['item_id'] = int(found.group(1) or found.group(2))
+            scope = f" for item {params['item_id']}" + scope
+            text = _ITEM.sub(' ', text)
+
+        limit = None
+        found = _TOP_N.search(text)
+        if found:
+            limit = int(found.group(2))
+            if not 0 < limit <= MAX_TOP_N:
+                return None
+            text = _TOP_N.sub(r' \1 ', text)
+
+        descending = bool(_DESCENDING.search(text))
+        ascending = bool(_ASCENDING.search(text))
+        if descending and ascending:
+            return None
+        text = _ASCENDING.sub(' ', _DESCENDING.sub(' ', text))
+
+        ranked = descending or ascending
+        if ranked and limit is None:
+            limit = DEFAULT_TOP_N if re.search(r'\b(products|items)\b', text) else 1
+
+        by_day = bool(_BY_DAY.search(text))
+        by_week = bool(_BY_WEEK.search(text))
+        by_item = bool(_BY_ITEM.search(text)) or ranked
+        text = _BY_ITEM.sub(' ', _BY_WEEK.sub(' ', _BY_DAY.sub(' ', text)))
+
+        metrics = []
+        for phrase, metric in METRIC_PHRASES:
+            pattern = rf'\b{phrase}\b'
+            if re.search(pattern, text):
+                metrics.append(metric)
+                text = re.sub(pattern, ' ', text)
+        if len(set(metrics)) != 1:
+            return None
+        metric = metrics[0]
+
+        # Anything left that is not filler means the question says more than we understand
+        if any(word not in FILLER_WORDS for word in text.split()):
+            return None
+
+        if by_day + by_week + by_item > 1:
+            return None
+        if by_item:
+            # An unranked per-product breakdown is left to the LLM
+            if 'item_id' in params or not ranked:
+                return None
+            return self._top_match(metric, params, scope, limit, not ascending)
+        if limit is not None:
+            return None
+        if by_day:
+            return self._period_match('by_day', metric, params, scope)
+        if by_week:
+            return self._period_match('by_week', metric, params, scope)
+        return self._scalar_match(metric, params, scope)
+
+    def _source(self, metric, params):
+        """Pick the cheapest table that can answer, and its metric expression."""
+        _, rollup_expr, raw_table, raw_expr, _ = METRICS[metric]
+        has_dates = 'start_date' in params
+        has_item = 'item_id' in params
+        if has_dates and has_item:
+            return raw_table, raw_expr
+        if has_item:
+            return 'rollup_item_metrics', rollup_expr
+        if has_dates:
+            return 'rollup_daily_metrics', rollup_expr
+        return 'rollup_all_time_metrics', rollup_expr
+
+    def _where(self, params):
+        conditions = []
+        if 'item_id' in params:
+            conditions.append('item_id = :item_id')
+        if 'start_date' in params:
+            conditions.append('date BETWEEN :start_date AND :end_date')
+        return f" WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    def _scalar_match(self, metric, params, scope):
+        table, expr = self._source(metric, params)
+        sql_query = f"SELECT {expr} AS {metric} FROM {table}{self._where(params)}"
+        return FastPathMatch('scalar', metric, sql_query, params, scope)
+
+    def _top_match(self, metric, params, scope, limit, descending):
+        _, rollup_expr, raw_table, raw_expr, _ = METRICS[metric]
+        if metric in ROW_RANKED_METRICS:
+            table, expr = raw_table, f"{'MAX' if descending else 'MIN'}({ROW_RANKED_METRICS[metric]})"
+        elif 'start_date' in params:
+            table, expr = raw_table, raw_expr
+        else:
+            table, expr = 'rollup_item_metrics', rollup_expr
+        params = dict(params, limit=limit)
+        order = 'DESC' if descending else 'ASC'
+        sql_query = (f"SELECT item_id, {expr} AS {metric} FROM {table}{self._where(params)} "
+                     f"GROUP BY item_id HAVING {expr} IS NOT NULL "
+                     f"ORDER BY {metric} {order} LIMIT :limit")
+        return FastPathMatch('top', metric, sql_query, params, scope, limit, descending)
+
+    def _period_match(self, intent, metric, params, scope):
+        _, rollup_expr, raw_table, raw_expr, _ = METRICS[metric]
+        if intent == 'by_week':
+            # Weekly buckets only exist pre-aggregated across all products
+            if params:
+                return None
+            sql_query = (f"SELECT week_start, {rollup_expr} AS {metric} FROM rollup_weekly_metrics "
+                         f"GROUP BY week_start ORDER BY week_start")
+            return FastPathMatch(intent, metric, sql_query, params, scope)
+
+        table, expr = (raw_table, raw_expr) if 'item_id' in params else ('rollup_daily_metrics', rollup_expr)
+        sql_query = f"SELECT date, {expr} AS {metric} FROM {table}{self._where(params)} GROUP BY date ORDER BY date"
+        return FastPathMatch(intent, metric, sql_query, params, scope)
@@ -1,81 +1,244 @@
 import os
 import json
 import logging
-from google import genai
-from google.genai import types
+import threading
+from translation_cache import TranslationCache, schema_fingerprint
+from response_formatter import summarize_for_llm
+from llm_backend import create_llm_backend
+from sql_prompt import SqlPrompt
+import telemetry
 
 class GeminiService:
-    def __init__(self):
-        self.client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-        self.model = "gemini-2.5-flash"
+    def __init__(self, translation_cache=None, backend=None):
+        self.backend = backend or create_llm_backend()
+        self.translation_cache = translation_cache or TranslationCache(
+            max_entries=int(os.environ.get("SQL_CACHE_MAX_ENTRIES", "512")),
+            ttl_seconds=float(os.environ.get("SQL_CACHE_TTL_SECONDS", "3600")),
+            similarity_threshold=float(os.environ.get("SQL_CACHE_SIMILARITY_THRESHOLD", "0")),
+        )
+        self.prune_schema = os.environ.get("SQL_PROMPT_PRUNING", "1") == "1"
+        # Prompts pre-rendered per schema fingerprint
+        self._sql_prompts = {}
+        self._sql_prompts_lock = threading.Lock()
     
     def generate_sql_query(self, question, schema_info):
         """Convert natural language question to SQL query."""
+        schema_hash = schema_fingerprint(schema_info)
+        cached_sql = self.translation_cache.get(question, schema_hash)
+        telemetry.record_cache_lookup('translation', bool(cached_sql))
+        if cached_sql:
+            logging.info(f"Translation cache hit for question: {question}")
+            return cached_sql
+        
+        sql_query = self._generate_sql_query(question, schema_info)
+        self.translation_cache.put(question, schema_hash, sql_query)
+        return sql_query
+    
+    async def generate_sql_query_async(self, question, schema_info):
+        """Async variant of generate_sql_query using the non-blocking Gemini client."""
+        schema_hash = schema_fingerprint(schema_info)
+        cached_sql = self.translation_cache.get(question, schema_hash)
+        telemetry.record_cache_lookup('translation', bool(cached_sql))
+        if cached_sql:
+            logging.info(f"Translation cache hit for question: {question}")
+            return cached_sql
+        
+        try:
+            with telemetry.span('generate_sql') as span:
+                response = await self.backend.generate_async(self._sql_request(question, schema_info))
+                telemetry.record_llm_usage('generate_sql', response.usage_metadata, span)
+            sql_query = self._clean_sql(response.text)
+        except Exception as e:
+            logging.error(f"Error generating SQL query: {str(e)}")
+            return None
+        
+        self.translation_cache.put(question, schema_hash, sql_query)
+        return sql_query
+    
+    def repair_sql_query(self, question, schema_info, failed_sql, error):
+        """Ask Gemini to correct a query that failed, given the database error."""
         try:
-            # Create schema description for the prompt
-            schema_description = self._format_schema_for_prompt(schema_info)
+            with telemetry.span('repair_sql') as span:
+                response = self.backend.generate(self._repair_request(question, schema_info, failed_sql, error))
+                telemetry.record_llm_usage('repair_sql', response.usage_metadata, span)
             
-            system_prompt = f"""
-You are an expert SQL query generator for an e-commerce database. Given a natural language question, generate a precise SQL query.
-
-Database Schema:
-{schema_description}
-
-Important Guidelines:
-1. Only generate SELECT queries for data retrieval
-2. Use proper JOIN statements when querying multiple tables using item_id as the join key
-3. Use aggregate functions (SUM, AVG, COUNT, MAX, MIN) appropriately
-4. For RoAS (Return on Ad Spend) calculation: SUM(ad_sales) / SUM(ad_spend)
-5. For CPC (Cost Per Click) calculation: ad_spend / clicks (when clicks > 0)
-6. Always use proper WHERE clauses when filtering is needed
-7. Return only the SQL query without any explanation or formatting
-8. Do not include semicolons at the end
-9. Use proper column aliases for calculated fields
-10. Use item_id to identify products across tables
-
-Example queries for reference:
-- Total sales: SELECT SUM(total_sales) as total_sales FROM total_sales_metrics
-- RoAS calculation: SELECT (SUM(ad_sales) / SUM(ad_spend)) as roas FROM ad_sales_metrics WHERE ad_spend > 0
-- Highest CPC: SELECT item_id, MAX(ad_spend / NULLIF(clicks, 0)) as highest_cpc FROM ad_sales_metrics WHERE clicks > 0 GROUP BY item_id ORDER BY highest_cpc DESC LIMIT 1
-- Products with most ad spend: SELECT item_id, SUM(ad_spend) as total_spend FROM ad_sales_metrics GROUP BY item_id ORDER BY total_spend DESC LIMIT 10
-"""
-
-            user_prompt = f"Convert this question to SQL: {question}"
+            return self._clean_sql(response.text)
             
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=user_prompt)])
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    temperature=0.1,
-                    max_output_tokens=500
-                )
-            )
+        except Exception as e:
+            logging.error(f"Error repairing SQL query: {str(e)}")
+            return None
+    
+    async def repair_sql_query_async(self, question, schema_info, failed_sql, error):
+        """Async variant of repair_sql_query."""
+        try:
+            with telemetry.span('repair_sql') as span:
+                response = await self.backend.generate_async(self._repair_request(question, schema_info, failed_sql, error))
+                telemetry.record_llm_usage('repair_sql', response.usage_metadata, span)
             
-            if response.text:
-                sql_query = response.text.strip()
-                # Remove code block formatting if present
-                if sql_query.startswith('```sql'):
-                    sql_query = sql_query[6:]
-                if sql_query.startswith('```'):
-                    sql_query = sql_query[3:]
-                if sql_query.endswith('```'):
-                    sql_query = sql_query[:-3]
-                
-                return sql_query.strip()
+            return self._clean_sql(response.text)
             
+        except Exception as e:
+            logging.error(f"Error repairing SQL query: {str(e)}")
             return None
+    
+    def remember_sql_query(self, question, schema_info, sql_query):
+        """Cache a query known to work (e.g. a repaired one) as the translation of question."""
+        self.translation_cache.put(question, schema_fingerprint(schema_info), sql_query)
+    
+    def forget_sql_query(self, question):
+        """Drop a cached translation that turned out not to run."""
+        self.translation_cache.invalidate(question)
+    
+    def _generate_sql_query(self, question, schema_info):
+        """Ask Gemini to translate a question into SQL."""
+        try:
+            with telemetry.span('generate_sql') as span:
+                response = self.backend.generate(self._sql_request(question, schema_info))
+                telemetry.record_llm_usage('generate_sql', response.usage_metadata, span)
+            
+            return self._clean_sql(response.text)
             
         except Exception as e:
             logging.error(f"Error generating SQL query: {str(e)}")
             return None
     
-    def format_response(self, question, sql_query, query_result):
+    def sql_prompt(self, schema_info):
+        """The pre-rendered SQL prompt for a schema, built once per schema version."""
+        fingerprint = schema_fingerprint(schema_info)
+        prompt = self._sql_prompts.get(fingerprint)
+        if prompt is None:
+            prompt = SqlPrompt(schema_info)
+            with self._sql_prompts_lock:
+                # Old versions are only needed until every worker has the new schema
+                if len(self._sql_prompts) >= 4:
+                    self._sql_prompts.clear()
+                self._sql_prompts[fingerprint] = prompt
+        return prompt
+    
+    def _sql_request(self, question, schema_info):
+        """Build the backend-neutral prompt for the SQL generation call.
+        
+        The system instruction only describes the tables relevant to the
+        question; the full instruction is passed along as the prefix a
+        backend may cache (cache_key identifies the schema version).
+        """
+        prompt = self.sql_prompt(schema_info)
+        user_prompt = f"Convert this question to SQL: {question}"
+        
+        return {
+            'operation': 'generate_sql',
+            'question': question,
+            'system_instruction': prompt.for_question(question) if self.prune_schema else prompt.full_instruction,
+            'cached_instruction': prompt.full_instruction,
+            'cache_key': prompt.fingerprint,
+            'turns': [("user", user_prompt)],
+            'temperature': 0.1,
+            'max_output_tokens': 500
+        }
+    
+    def _repair_request(self, question, schema_info, failed_sql, error):
+        """Continue the SQL generation conversation with the failed query and its error."""
+        request = self._sql_request(question, schema_info)
+        request['operation'] = 'repair_sql'
+        request['turns'] += [
+            ("model", failed_sql),
+            ("user", (
+                f"That query failed with this error:\n{error}\n\n"
+                "Return a corrected SQL query for the same question."
+            ))
+        ]
+        return request
+    
+    def _clean_sql(self, response_text):
+        """Strip code fences from a model response; None if it is empty."""
+        if not response_text:
+            return None
+        
+        sql_query = response_text.strip()
+        # Remove code block formatting if present
+        if sql_query.startswith('```sql'):
+            sql_query = sql_query[6:]
+        if sql_query.startswith('```'):
+            sql_query = sql_query[3:]
+        if sql_query.endswith('```'):
+            sql_query = sql_query[:-3]
+        
+        return sql_query.strip()
+    
+    def format_response(self, question, sql_query, query_result, truncated=False):
         """Format query results into human-readable response."""
         try:
-            system_prompt = """
+            with telemetry.span('format_response') as span:
+                response = self.backend.generate(self._format_request(question, sql_query, query_result, truncated))
+                telemetry.record_llm_usage('format_response', response.usage_metadata, span)
+            
+            return response.text if response.text else "Unable to format response."
+            
+        except Exception as e:
+            logging.error(f"Error formatting response: {str(e)}")
+            return f"Query executed successfully. Raw result: {summarize_for_llm(query_result, truncated)}"
+    
+    def format_response_stream(self, question, sql_query, query_result, truncated=False):
+        """Format query results into a human-readable response, yielding text as it is generated."""
+        produced = False
+        try:
+            with telemetry.span('format_response') as span:
+                usage_metadata = None
+                for chunk in self.backend.generate_stream(
+                        self._format_request(question, sql_query, query_result, truncated)):
+                    # The final chunk carries the usage totals
+                    usage_metadata = chunk.usage_metadata or usage_metadata
+                    if chunk.text:
+                        produced = True
+                        yield chunk.text
+                telemetry.record_llm_usage('format_response', usage_metadata, span)
+            
+            if not produced:
+                yield "Unable to format response."
+            
+        except Exception as e:
+            logging.error(f"Error streaming response: {str(e)}")
+            if not produced:
+                yield f"Query executed successfully. Raw result: {summarize_for_llm(query_result, truncated)}"
+    
+    async def format_response_async(self, question, sql_query, query_result, truncated=False):
+        """Async variant of format_response."""
+        try:
+            with telemetry.span('format_response') as span:
+                response = await self.backend.generate_async(self._format_request(question, sql_query, query_result, truncated))
+                telemetry.record_llm_usage('format_response', response.usage_metadata, span)
+            
+            return response.text if response.text else "Unable to format response."
+            
+        except Exception as e:
+            logging.error(f"Error formatting response: {str(e)}")
+            return f"Query executed successfully. Raw result: {summarize_for_llm(query_result, truncated)}"
+    
+    async def format_response_stream_async(self, question, sql_query, query_result, truncated=False):
+        """Async variant of format_response_stream."""
+        produced = False
+        try:
+            with telemetry.span('format_response') as span:
+                usage_metadata = None
+                async for chunk in self.backend.generate_stream_async(
+                        self._format_request(question, sql_query, query_result, truncated)):
+                    usage_metadata = chunk.usage_metadata or usage_metadata
+                    if chunk.text:
+                        produced = True
+                        yield chunk.text
+                telemetry.record_llm_usage('format_response', usage_metadata, span)
+            
+            if not produced:
+                yield "Unable to format response."
+            
+        except Exception as e:
+            logging.error(f"Error streaming response: {str(e)}")
+            if not produced:
+                yield f"Query executed successfully. Raw result: {summarize_for_llm(query_result, truncated)}"
+    
+    def _format_request(self, question, sql_query, query_result, truncated=False):
+        """Build the backend-neutral prompt for the response formatting call."""
+        system_prompt = """
 You are an expert data analyst. Given a question, SQL query, and query results, provide a clear, human-readable answer.
 
 Guidelines:
@@ -85,42 +248,22 @@ Guidelines:
 4. Explain any calculations performed
 5. Keep the response concise but informative
 6. If the result contains multiple rows, summarize appropriately
+7. If the results are a sample with column_stats, use the stats for totals and do not claim to have seen every row
 """
 
-            user_prompt = f"""
+        user_prompt = f"""
 Question: {question}
 SQL Query: {sql_query}
-Query Results: {json.dumps(query_result, default=str)}
+Query Results: {json.dumps(summarize_for_llm(query_result, truncated), default=str)}
 
 Please provide a human-readable answer to the question based on the query results.
 """
 
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=user_prompt)])
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    temperature=0.3,
-                    max_output_tokens=300
-                )
-            )
-            
-            return response.text if response.text else "Unable to format response."
-            
-        except Exception as e:
-            logging.error(f"Error formatting response: {str(e)}")
-            return f"Query executed successfully. Raw result: {query_result}"
-    
-    def _format_schema_for_prompt(self, schema_info):
-        """Format schema information for the LLM prompt."""
-        schema_text = ""
-        for table_name, table_info in schema_info.items():
-            schema_text += f"\nTable: {table_name}\n"
-            schema_text += f"Description: {table_info['description']}\n"
-            schema_text += "Columns:\n"
-            for col_name, col_desc in table_info['columns'].items():
-                schema_text += f"  - {col_name}: {col_desc}\n"
-        
-        return schema_text
+        return {
+            'operation': 'format_response',
+            'question': question,
+            'system_instruction': system_prompt,
+            'turns': [("user", user_prompt)],
+            'temperature': 0.3,
+            'max_output_tokens': 300
+        }
@@ -0,0 +1,241 @@
+"""Incremental, idempotent CSV loading.
+
+Each loaded file gets a row in ``load_watermarks`` recording how far into it
+we have read (byte offset), a hash of its leading bytes to detect rewrites,
+and the latest date seen. Re-running a load only reads bytes appended since
+the last run; rewritten files are re-read from the start. Rows are upserted
+on each table's natural key, so re-delivered rows replace rather than
+duplicate existing ones.
+
+Usage (from the repository root):
+    python -m incremental_loader path/to/file.csv [...]
+    python -m incremental_loader --watch path/to/drop_dir --interval 60
+"""
+import os
+import csv
+import glob
+import time
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from sqlalchemy import select, func, tuple_
+from database import db
+from models import ProductEligibility, AdSalesMetrics, TotalSalesMetrics, LoadWatermark
+from result_cache import bump_data_version
+from rollups import SOURCE_TABLES, refresh_rollups, bump_rollup_versions
+from data_stats import record_load
+import data_loader
+
+# Leading bytes hashed to recognise a file that was rewritten rather than appended to.
+HEAD_BYTES = 1024 * 1024
+
+FEEDS = {
+    'product_eligibility': (ProductEligibility.__table__, data_loader.ELIGIBILITY_COLUMNS),
+    'ad_sales_metrics': (AdSalesMetrics.__table__, data_loader.AD_SALES_COLUMNS),
+    'total_sales_metrics': (TotalSalesMetrics.__table__, data_loader.TOTAL_SALES_COLUMNS),
+}
+
+
+def detect_table(header):
+    """Pick the target table from a CSV header, or None if it matches none."""
+    header = set(header)
+    for table_name, (_, columns) in FEEDS.items():
+        if all(name in header for name, _ in columns):
+            return table_name
+    return None
+
+
+def _head_hash(path, length):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        digest.update(file.read(min(length, HEAD_BYTES)))
+    return digest.hexdigest()
+
+
+def _row_date(row):
+    value = row.get('date') or row.get('eligibility_datetime_utc')
+    return value.date() if isinstance(value, datetime) else value
+
+
+# Keeps the key lists of existing-row lookups under SQLite's bound-parameter limit
+_KEY_BATCH_SIZE = 400
+
+
+def _count_existing(connection, table, key_columns, keys):
+    """How many of the natural keys already have a row, looked up through the unique index."""
+    key = tuple_(*[table.c[name] for name in key_columns])
+    existing = 0
+    for start in range(0, len(keys), _KEY_BATCH_SIZE):
+        batch = keys[start:start + _KEY_BATCH_SIZE]
+        existing += connection.execute(select(func.count()).select_from(table).where(key.in_(batch))).scalar()
+    return existing
+
+
+def _upsert_chunk(connection, table, rows):
+    """Insert rows, updating existing ones that share the natural key.
+
+    Returns the number of rows that were new rather than updates.
+    """
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    key_columns = data_loader.NATURAL_KEYS[table.name]
+    # A multi-row upsert may not touch the same key twice; the last row wins
+    rows_by_key = {tuple(row[name] for name in key_columns): row for row in rows}
+    rows = list(rows_by_key.values())
+    new_rows = len(rows) - _count_existing(connection, table, key_columns, list(rows_by_key))
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={name: statement.excluded[name] for name in rows[0] if name not in key_columns}
+    )
+    connection.execute(statement, rows)
+    return new_rows
+
+
+def load_file(csv_path, table_name=None, chunk_size=None):
+    """Load whatever part of a CSV file has not been loaded yet.
+
+    Returns the number of rows upserted (0 when the file is unchanged).
+    """
+    csv_path = os.path.abspath(csv_path)
+    if not os.path.exists(csv_path):
+        logging.warning(f"CSV file not found: {csv_path}")
+        return 0
+
+    chunk_size = chunk_size or data_loader.DEFAULT_CHUNK_SIZE
+    file_size = os.path.getsize(csv_path)
+    watermarks = LoadWatermark.__table__
+
+    with db.engine.begin() as connection, open(csv_path, 'rb') as file:
+        watermark = connection.execute(
+            select(watermarks).where(watermarks.c.file_path == csv_path)
+        ).first()
+
+        header_line = file.readline()
+        if not header_line.endswith(b'\n'):
+            # The header itself is still being written
+            return 0
+        header = next(csv.reader([header_line.decode('utf-8-sig')]), None)
+        if not header:
+            return 0
+        table_name = table_name or detect_table(header)
+        if table_name is None:
+            logging.warning(f"Unrecognised CSV header in {csv_path}: {header}")
+            return 0
+        table, columns = FEEDS[table_name]
+
+        start = len(header_line)
+        if watermark is not None:
+            unchanged_head = _head_hash(csv_path, watermark.byte_offset) == watermark.head_hash
+            if unchanged_head and file_size == watermark.byte_offset:
+                logging.info(f"No new data in {csv_path}")
+                return 0
+            if unchanged_head and file_size > watermark.byte_offset:
+                start = watermark.byte_offset
+            else:
+                logging.info(f"{csv_path} was rewritten, reloading from the start")
+
+        position = start
+        file.seek(start)
+
+        def new_lines():
+            nonlocal position
+            for line in file:
+                if not line.endswith(b'\n'):
+                    # A row the writer is still appending; it is read whole on a later run
+                    break
+                position += len(line)
+                yield line.decode('utf-8')
+
+        loaded = 0
+        new_rows = 0
+        max_date = watermark.max_date if watermark is not None else None
+        track_rollups = table_name in SOURCE_TABLES
+        dates, item_ids = set(), set()
+        chunk = []
+        for row in data_loader.iter_csv_rows(new_lines(), columns, header=header):
+            chunk.append(row)
+            if track_rollups:
+                dates.add(row['date'])
+                item_ids.add(row['item_id'])
+            row_date = _row_date(row)
+            if row_date is not None and (max_date is None or row_date > max_date):
+                max_date = row_date
+            if len(chunk) >= chunk_size:
+                new_rows += _upsert_chunk(connection, table, chunk)
+                loaded += len(chunk)
+                chunk = []
+        if chunk:
+            new_rows += _upsert_chunk(connection, table, chunk)
+            loaded += len(chunk)
+
+        if track_rollups:
+            refresh_rollups(connection, dates, item_ids)
+        if loaded:
+            record_load(connection, table_name, new_rows)
+
+        values = {
+            'table_name': table_name,
+            'head_hash': _head_hash(csv_path, position),
+            'byte_offset': position,
+            'max_date': max_date,
+            'rows_loaded': (watermark.rows_loaded if watermark is not None else 0) + loaded,
+            'updated_at': datetime.utcnow(),
+        }
+        if watermark is None:
+            connection.execute(watermarks.insert().values(file_path=csv_path, **values))
+        else:
+            connection.execute(watermarks.update().where(watermarks.c.id == watermark.id).values(**values))
+
+    logging.info(f"Upserted {loaded} {table_name} records from {csv_path} (max date {max_date})")
+    if loaded:
+        bump_data_version(table_name)
+        if track_rollups:
+            bump_rollup_versions()
+    return loaded
+
+
+def load_directory(directory, pattern='*.csv', chunk_size=None):
+    """Load new data from every matching file in a directory, oldest first."""
+    paths = sorted(glob.glob(os.path.join(directory, pattern)), key=os.path.getmtime)
+    return sum(load_file(path, chunk_size=chunk_size) for path in paths)
+
+
+def watch_directory(directory, pattern='*.csv', interval=60, chunk_size=None):
+    """Poll a directory forever, loading new files and appended rows."""
+    logging.info(f"Watching {directory} for {pattern} every {interval}s")
+    while True:
+        try:
+            load_directory(directory, pattern, chunk_size)
+        except Exception as e:
+            logging.error(f"Error loading from {directory}: {str(e)}")
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incrementally load CSV feeds into the database.')
+    parser.add_argument('paths', nargs='*', help='CSV files or directories to load')
+    parser.add_argument('--watch', metavar='DIR', help='poll a directory for new data')
+    parser.add_argument('--pattern', default='*.csv')
+    parser.add_argument('--interval', type=float, default=60)
+    parser.add_argument('--chunk-size', type=int)
+    args = parser.parse_args()
+
+    from main import app
+
+    with app.app_context():
+        for path in args.paths:
+            if os.path.isdir(path):
+                load_directory(path, args.pattern, args.chunk_size)
+            else:
+                load_file(path, chunk_size=args.chunk_size)
+        if args.watch:
+            watch_directory(args.watch, args.pattern, args.interval, args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
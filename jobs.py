@@ -0,0 +1,168 @@
+"""Background jobs for questions that outlive a request.
+
+``/api/query`` with ``"async": true`` returns a job id straight away and
+runs the question on a small thread pool instead of holding the request
+(and, on serverless hosts, the function) open until the answer is ready.
+Clients poll ``/api/jobs/<id>`` or follow ``/api/jobs/<id>/events``.
+
+Jobs are kept in a local SQLite file (JOB_STORE_PATH) rather than the app
+database, which may be a read-only replica or a remote PostgreSQL server.
+Processes on the same host share it, so any worker can report a job's
+status; a job only runs in the process that accepted it. Finished jobs are
+kept for JOB_RESULT_TTL_SECONDS and removed on later submissions.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH', os.path.join(tempfile.gettempdir(), 'question_jobs.db'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', '32'))
+JOB_RESULT_TTL_SECONDS = int(os.environ.get('JOB_RESULT_TTL_SECONDS', '3600'))
+
+FINISHED_STATUSES = ('succeeded', 'failed')
+
+# How often waiters re-read the store for jobs run by another process
+_POLL_SECONDS = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    question TEXT NOT NULL,
+    result TEXT,
+    status_code INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+class JobQueueFull(Exception):
+    """Raised by JobStore.submit when JOB_QUEUE_SIZE jobs are already queued or running."""
+
+
+class JobStore:
+    """Runs jobs on a bounded thread pool and records their status and results in SQLite."""
+
+    def __init__(self, path=JOB_STORE_PATH, max_workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE,
+                 ttl_seconds=JOB_RESULT_TTL_SECONDS):
+        self.path = path
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._pending = 0
+        self._changed = threading.Condition()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(_SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def submit(self, question, function, *args):
+        """Queue function(*args) and return the new job's id.
+
+        function returns (payload, status_code), which the job keeps as its
+        result. Raises JobQueueFull instead of queueing past max_pending.
+        """
+        with self._changed:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} jobs are already queued or running")
+            self._pending += 1
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        try:
+            with self._connect() as connection:
+                connection.execute('DELETE FROM jobs WHERE expires_at < ?', (now,))
+                connection.execute(
+                    'INSERT INTO jobs (id, status, question, created_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                    (job_id, 'queued', question, now, now + self.ttl_seconds)
+                )
+            self._executor.submit(self._run, job_id, function, args)
+        except Exception:
+            with self._changed:
+                self._pending -= 1
+            raise
+        return job_id
+
+    def _run(self, job_id, function, args):
+        try:
+            self._update(job_id, status='running', started_at=time.time())
+            try:
+                payload, status_code = function(*args)
+                status = 'succeeded' if status_code < 400 else 'failed'
+            except Exception as e:
+                logging.error(f"Job {job_id} failed: {str(e)}")
+                payload, status_code, status = {'error': str(e), 'success': False}, 500, 'failed'
+            finished_at = time.time()
+            self._update(job_id, status=status, result=json.dumps(payload, default=str), status_code=status_code,
+                         finished_at=finished_at, expires_at=finished_at + self.ttl_seconds)
+        finally:
+            with self._changed:
+                self._pending -= 1
+                self._changed.notify_all()
+
+    def _update(self, job_id, **fields):
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._connect() as connection:
+            connection.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+        with self._changed:
+            self._changed.notify_all()
+
+    def get(self, job_id):
+        """The job's status (and result once finished), or None for unknown or expired ids."""
+        with self._connect() as connection:
+            row = connection.execute('SELECT * FROM jobs WHERE id = ? AND expires_at >= ?',
+                                     (job_id, time.time())).fetchone()
+        if row is None:
+            return None
+        job = {
+            'job_id': row['id'],
+            'status': row['status'],
+            'question': row['question'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+        }
+        if row['status'] in FINISHED_STATUSES:
+            job['status_code'] = row['status_code']
+            job['result'] = json.loads(row['result'])
+        return job
+
+    def wait(self, job_id, timeout, last_status=None):
+        """Return the job once its status differs from last_status or it finishes, or after timeout seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] != last_status or job['status'] in FINISHED_STATUSES:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(remaining, _POLL_SECONDS))
+
+    def stats(self):
+        """Jobs queued or running in this process and the store's job counts by status."""
+        with self._connect() as connection:
+            counts = dict(connection.execute(
+                'SELECT status, COUNT(*) FROM jobs WHERE expires_at >= ? GROUP BY status', (time.time(),)
+            ).fetchall())
+        with self._changed:
+            pending = self._pending
+        return {'pending_in_process': pending, 'max_pending': self.max_pending, 'by_status': counts}
@@ -0,0 +1,257 @@
+"""Pluggable LLM backends for GeminiService.
+
+GeminiService builds backend-neutral prompts (a dict with the operation,
+question, system instruction, conversation turns and sampling settings)
+and hands them to a backend, which returns responses with ``text`` and
+``usage_metadata`` attributes. LLM_BACKEND selects the backend:
+
+- ``gemini`` (default): the Google Gemini API. With LLM_CONTEXT_CACHE=1 the
+  static prefix of prompts that carry a ``cache_key`` (the full SQL
+  generation instruction) is registered once per key with Gemini context
+  caching and referenced by name instead of being resent.
+- ``stub``: a deterministic local stand-in that answers with canned SQL per
+  question after an artificial latency, so the pipeline can be benchmarked
+  and load tested without API quota.
+"""
+import os
+import json
+import time
+import zlib
+import random
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+
+LLMResponse = namedtuple('LLMResponse', ['text', 'usage_metadata'])
+# Mirrors the token count fields of Gemini's usage_metadata
+Usage = namedtuple('Usage', ['prompt_token_count', 'candidates_token_count'])
+
+
+class GeminiBackend:
+    """Sends prompts to the Gemini API."""
+    name = 'gemini'
+
+    def __init__(self, model='gemini-2.5-flash', context_cache=False, context_cache_ttl_seconds=3600):
+        self.model = model
+        self.context_cache = context_cache
+        self.context_cache_ttl_seconds = context_cache_ttl_seconds
+        self._client = None
+        # cache_key -> (cached content name or None if creating it failed, monotonic expiry)
+        self._cached_contents = {}
+        self._cache_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The Gemini client, created on first use.
+
+        google-genai takes longer to import than the rest of the app put
+        together, so serverless cold starts and fast-path or cached answers
+        never pay for it.
+        """
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+        return self._client
+
+    def _fresh_cached_content(self, prompt):
+        """(found, name) for the prompt's cached prefix without creating it."""
+        if not self.context_cache or prompt.get('cache_key') is None:
+            return True, None
+        entry = self._cached_contents.get(prompt['cache_key'])
+        if entry is not None and time.monotonic() < entry[1]:
+            return True, entry[0]
+        return False, None
+
+    def cached_content(self, prompt):
+        """Name of the Gemini cached content holding the prompt's static prefix, or None.
+
+        Created on first use per cache_key and renewed shortly before its TTL
+        runs out. When creation fails (e.g. the prefix is below the model's
+        minimum cacheable size) the full prompt is sent instead, and creation
+        is retried after a TTL.
+        """
+        found, name = self._fresh_cached_content(prompt)
+        if found:
+            return name
+        with self._cache_lock:
+            found, name = self._fresh_cached_content(prompt)
+            if found:
+                return name
+            from google.genai import types
+
+            key = prompt['cache_key']
+            try:
+                cache = self.client.caches.create(model=self.model, config=types.CreateCachedContentConfig(
+                    system_instruction=prompt['cached_instruction'],
+                    ttl=f'{self.context_cache_ttl_seconds}s',
+                    display_name=f'sql-prompt-{key[:16]}'
+                ))
+                name = cache.name
+                logging.info(f"Created Gemini context cache {name} for SQL prompt {key[:16]}")
+                # Renewed a minute early so no call references an expired cache
+                expires = time.monotonic() + max(self.context_cache_ttl_seconds - 60, 60)
+            except Exception as e:
+                logging.warning(f"Gemini context caching unavailable, sending full prompts: {str(e)}")
+                name = None
+                expires = time.monotonic() + self.context_cache_ttl_seconds
+            self._cached_contents[key] = (name, expires)
+            return name
+
+    def _request(self, prompt, cached_content=None):
+        from google.genai import types
+
+        if cached_content is not None:
+            # The cached instruction replaces the per-question one
+            config = types.GenerateContentConfig(
+                cached_content=cached_content,
+                temperature=prompt['temperature'],
+                max_output_tokens=prompt['max_output_tokens']
+            )
+        else:
+            config = types.GenerateContentConfig(
+                system_instruction=prompt['system_instruction'],
+                temperature=prompt['temperature'],
+                max_output_tokens=prompt['max_output_tokens']
+            )
+        return {
+            'model': self.model,
+            'contents': [
+                types.Content(role=role, parts=[types.Part(text=text)]) for role, text in prompt['turns']
+            ],
+            'config': config
+        }
+
+    async def _cached_content_async(self, prompt):
+        found, name = self._fresh_cached_content(prompt)
+        if found:
+            return name
+        return await asyncio.to_thread(self.cached_content, prompt)
+
+    def generate(self, prompt):
+        return self.client.models.generate_content(**self._request(prompt, self.cached_content(prompt)))
+
+    def generate_stream(self, prompt):
+        return self.client.models.generate_content_stream(**self._request(prompt, self.cached_content(prompt)))
+
+    async def generate_async(self, prompt):
+        request = self._request(prompt, await self._cached_content_async(prompt))
+        return await self.client.aio.models.generate_content(**request)
+
+    async def generate_stream_async(self, prompt):
+        request = self._request(prompt, await self._cached_content_async(prompt))
+        async for chunk in await self.client.aio.models.generate_content_stream(**request):
+            yield chunk
+
+
+# Keyword rules for the stub, checked in order; the first rule whose
+# keywords all appear in the question supplies the SQL
+STUB_SQL_RULES = [
+    (('roas',), "SELECT item_id, SUM(ad_sales) / NULLIF(SUM(ad_spend), 0) AS roas FROM ad_sales_metrics "
+                "GROUP BY item_id ORDER BY roas DESC LIMIT 10"),
+    (('cpc',), "SELECT item_id, MAX(ad_spend / NULLIF(clicks, 0)) AS cpc FROM ad_sales_metrics "
+               "GROUP BY item_id ORDER BY cpc DESC LIMIT 10"),
+    (('eligib',), "SELECT eligibility, COUNT(*) AS products FROM product_eligibility GROUP BY eligibility"),
+    (('ad', 'share'), "SELECT a.item_id, SUM(a.ad_sales) / NULLIF(SUM(t.total_sales), 0) AS ad_share "
+                      "FROM ad_sales_metrics a JOIN total_sales_metrics t "
+                      "ON a.item_id = t.item_id AND a.date = t.date GROUP BY a.item_id ORDER BY ad_share DESC LIMIT 10"),
+    (('click',), "SELECT item_id, SUM(clicks) AS clicks FROM ad_sales_metrics GROUP BY item_id "
+                 "ORDER BY clicks DESC LIMIT 10"),
+    (('day',), "SELECT date, SUM(total_sales) AS total_sales FROM total_sales_metrics GROUP BY date ORDER BY date"),
+    (('unit',), "SELECT item_id, SUM(total_units_ordered) AS units FROM total_sales_metrics GROUP BY item_id "
+                "ORDER BY units DESC LIMIT 10"),
+]
+STUB_DEFAULT_SQL = ("SELECT item_id, SUM(total_sales) AS total_sales FROM total_sales_metrics "
+                    "GROUP BY item_id ORDER BY total_sales DESC LIMIT 10")
+
+
+class StubBackend:
+    """Deterministic local stand-in for Gemini.
+
+    SQL prompts are answered from ``canned_sql`` (exact, case-insensitive
+    question matches, e.g. loaded from LLM_STUB_SQL_FILE), then from
+    STUB_SQL_RULES, then with STUB_DEFAULT_SQL. Narrative prompts get a fixed
+    sentence. Every call sleeps for latency_ms plus up to jitter_ms, derived
+    from the prompt so runs are repeatable; streams spread the delay over
+    their chunks.
+    """
+    name = 'stub'
+    model = 'stub'
+
+    def __init__(self, canned_sql=None, latency_ms=0, jitter_ms=0):
+        self.canned_sql = {question.strip().lower(): sql for question, sql in (canned_sql or {}).items()}
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def sql_for(self, question):
+        normalized = question.strip().lower()
+        if normalized in self.canned_sql:
+            return self.canned_sql[normalized]
+        for keywords, sql in STUB_SQL_RULES:
+            if all(keyword in normalized for keyword in keywords):
+                return sql
+        return STUB_DEFAULT_SQL
+
+    def _respond(self, prompt):
+        if prompt['operation'] in ('generate_sql', 'repair_sql'):
+            text = self.sql_for(prompt['question'])
+        else:
+            text = f"Here is what the data shows for \"{prompt['question']}\", based on the query results."
+        prompt_tokens = sum(len(part) for _, part in prompt['turns']) + len(prompt['system_instruction'])
+        # Roughly four characters per token, like Gemini's English text
+        return LLMResponse(text, Usage(prompt_tokens // 4, len(text) // 4 + 1))
+
+    def _delay(self, prompt):
+        seed = zlib.crc32(f"{prompt['operation']}:{prompt['question']}".encode('utf-8'))
+        return (self.latency_ms + random.Random(seed).uniform(0, self.jitter_ms)) / 1000
+
+    def _chunks(self, response):
+        words = response.text.split(' ')
+        for index, word in enumerate(words):
+            last = index == len(words) - 1
+            yield LLMResponse(word if last else word + ' ', response.usage_metadata if last else None)
+
+    def generate(self, prompt):
+        time.sleep(self._delay(prompt))
+        return self._respond(prompt)
+
+    def generate_stream(self, prompt):
+        response = self._respond(prompt)
+        chunks = list(self._chunks(response))
+        for chunk in chunks:
+            time.sleep(self._delay(prompt) / len(chunks))
+            yield chunk
+
+    async def generate_async(self, prompt):
+        await asyncio.sleep(self._delay(prompt))
+        return self._respond(prompt)
+
+    async def generate_stream_async(self, prompt):
+        response = self._respond(prompt)
+        chunks = list(self._chunks(response))
+        for chunk in chunks:
+            await asyncio.sleep(self._delay(prompt) / len(chunks))
+            yield chunk
+
+
+def create_llm_backend():
+    """Build the backend selected by LLM_BACKEND (gemini or stub)."""
+    backend = os.environ.get('LLM_BACKEND', 'gemini').lower()
+    if backend == 'stub':
+        canned_sql = {}
+        sql_file = os.environ.get('LLM_STUB_SQL_FILE')
+        if sql_file:
+            with open(sql_file, 'r', encoding='utf-8') as file:
+                canned_sql = json.load(file)
+        logging.info("Using the local LLM stub instead of Gemini")
+        return StubBackend(
+            canned_sql,
+            latency_ms=float(os.environ.get('LLM_STUB_LATENCY_MS', '0')),
+            jitter_ms=float(os.environ.get('LLM_STUB_JITTER_MS', '0')),
+        )
+    if backend != 'gemini':
+        logging.warning(f"Unknown LLM_BACKEND {backend!r}; using Gemini")
+    return GeminiBackend(
+        context_cache=os.environ.get('LLM_CONTEXT_CACHE', '0') == '1',
+        context_cache_ttl_seconds=int(os.environ.get('LLM_CONTEXT_CACHE_TTL_SECONDS', '3600')),
+    )
@@ -1,44 +1,41 @@
 import os
 import logging
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
+from database import db, database_url, engine_options, database_binds, configure_engines
 
 # Configure logging for serverless
 logging.basicConfig(level=logging.INFO)
 
-class Base(DeclarativeBase):
-    pass
-
-db = SQLAlchemy(model_class=Base)
-
 def create_app():
     """Application factory for serverless deployment"""
     app = Flask(__name__)
     app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 
     # Configure the database
-    database_url = os.environ.get("DATABASE_URL", "sqlite:///ecommerce_ai.db")
-    if database_url.startswith("postgres://"):
-        database_url = database_url.replace("postgres://", "postgresql://", 1)
-    
-    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-        "pool_recycle": 300,
-        "pool_pre_ping": True,
-    }
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url()
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+    # Read-only engine for the question pipeline, apart from the loaders' write engine
+    app.config["SQLALCHEMY_BINDS"] = database_binds(app.config["SQLALCHEMY_DATABASE_URI"])
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
     # Initialize the database
     db.init_app(app)
+    configure_engines(app)
 
     with app.app_context():
         # Import models
         from models import ProductEligibility, AdSalesMetrics, TotalSalesMetrics
         from routes import main_bp
+        from migrations import ensure_schema
+        from snapshots import load_snapshots
+        
+        # Create tables and bring existing databases up to date; databases
+        # already at the latest schema version skip the DDL entirely
+        ensure_schema()
         
-        # Create tables
-        db.create_all()
+        # Fill an empty database from the bundled columnar snapshots
+        if os.environ.get("SNAPSHOT_AUTOLOAD", "1") == "1":
+            load_snapshots()
         
         # Register blueprints
         app.register_blueprint(main_bp)
@@ -0,0 +1,196 @@
+import logging
+from datetime import datetime
+from sqlalchemy import text, inspect, Integer
+from sqlalchemy.exc import DBAPIError
+from database import db
+
+
+def create_metric_indexes(connection):
+    """Create the non-unique indexes declared on the metric models if missing.
+
+    Unique indexes are left to ``make_natural_keys_unique``, which removes
+    duplicate rows first.
+    """
+    from models import ProductEligibility, AdSalesMetrics, TotalSalesMetrics
+
+    for model in (ProductEligibility, AdSalesMetrics, TotalSalesMetrics):
+        for index in model.__table__.indexes:
+            if not index.unique:
+                index.create(bind=connection, checkfirst=True)
+
+
+def make_natural_keys_unique(connection):
+    """Replace the (item_id, date) indexes with unique ones so loads can upsert.
+
+    Duplicate rows left by earlier repeated loads are dropped first, keeping
+    the most recently inserted copy.
+    """
+    from models import ProductEligibility, AdSalesMetrics, TotalSalesMetrics
+
+    natural_keys = [
+        (ProductEligibility, 'ix_product_eligibility_item_id_datetime', 'item_id, eligibility_datetime_utc'),
+        (AdSalesMetrics, 'ix_ad_sales_metrics_item_id_date', 'item_id, date'),
+        (TotalSalesMetrics, 'ix_total_sales_metrics_item_id_date', 'item_id, date'),
+    ]
+    for model, old_index, key_columns in natural_keys:
+        table_name = model.__tablename__
+        connection.execute(text(
+            f"DELETE FROM {table_name} WHERE id NOT IN "
+            f"(SELECT MAX(id) FROM {table_name} GROUP BY {key_columns})"
+        ))
+        connection.execute(text(f"DROP INDEX IF EXISTS {old_index}"))
+        for index in model.__table__.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+
+def build_rollups(connection):
+    """Populate the KPI rollup tables from existing fact rows."""
+    from rollups import rebuild_rollups
+
+    rebuild_rollups(connection)
+
+
+def create_compat_views(connection):
+    """Create the views exposing the old serverless column names."""
+    from models import COMPAT_VIEWS
+
+    for view_name, select_sql in COMPAT_VIEWS.items():
+        connection.execute(text(f"DROP VIEW IF EXISTS {view_name}"))
+        connection.execute(text(f"CREATE VIEW {view_name} AS {select_sql}"))
+
+
+def build_data_stats(connection):
+    """Populate the /api/stats counters from existing rows."""
+    from data_stats import rebuild_stats
+
+    rebuild_stats(connection)
+
+
+# Ordered list of (version, description, migration function). Append new
+# entries at the end; never renumber or edit an applied migration. New
+# tables need an entry too: databases already at the latest version skip
+# db.create_all() on startup.
+MIGRATIONS = [
+    (1, 'Composite indexes on metric tables', create_metric_indexes),
+    (2, 'Unique natural keys on metric tables', make_natural_keys_unique),
+    (3, 'Build KPI rollup tables', build_rollups),
+    (4, 'Compatibility views for the old serverless column names', create_compat_views),
+    (5, 'Build the /api/stats counters', build_data_stats),
+]
+
+# Tables created by the old serverless models, with the conversion of each
+# canonical column from the old columns
+SERVERLESS_TABLES = {
+    'product_eligibility': ('eligibility_status', {
+        'eligibility_datetime_utc': 'eligibility_datetime_utc',
+        'item_id': 'CAST(item_id AS INTEGER)',
+        'eligibility': "UPPER(eligibility_status) IN ('ELIGIBLE', 'TRUE')",
+        'message': 'reason',
+    }),
+    'ad_sales_metrics': ('units_sold_ad', {
+        'date': 'date',
+        'item_id': 'CAST(item_id AS INTEGER)',
+        'ad_sales': 'COALESCE(ad_sales, 0)',
+        'impressions': 'COALESCE(impressions, 0)',
+        'ad_spend': 'COALESCE(ad_spend, 0)',
+        'clicks': 'COALESCE(clicks, 0)',
+        'units_sold': 'COALESCE(units_sold_ad, 0)',
+    }),
+    'total_sales_metrics': (None, {
+        'date': 'date',
+        'item_id': 'CAST(item_id AS INTEGER)',
+        'total_sales': 'COALESCE(total_sales, 0)',
+        'total_units_ordered': 'COALESCE(total_units_ordered, 0)',
+    }),
+}
+
+
+def _ensure_version_table(connection):
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR(200) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def get_schema_version(connection):
+    """Return the highest applied migration version (0 if none)."""
+    _ensure_version_table(connection)
+    version = connection.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar()
+    return version or 0
+
+
+def schema_is_current():
+    """True if every migration has been applied, checked without issuing any DDL."""
+    try:
+        with db.engine.connect() as connection:
+            version = connection.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar()
+    except DBAPIError:
+        # No schema_migrations table yet
+        return False
+    return (version or 0) >= MIGRATIONS[-1][0]
+
+
+def upgrade_serverless_tables(connection):
+    """Convert tables created by the old serverless models to the canonical schema.
+
+    Those tables had string item_ids and different column names, and were
+    never versioned, so they are detected by their columns and rebuilt with
+    their rows converted.
+    """
+    from models import ProductEligibility, AdSalesMetrics, TotalSalesMetrics
+    from data_loader import NATURAL_KEYS
+
+    inspector = inspect(connection)
+    tables = {model.__tablename__: model.__table__ for model in (ProductEligibility, AdSalesMetrics, TotalSalesMetrics)}
+    for table_name, (legacy_column, conversions) in SERVERLESS_TABLES.items():
+        if not inspector.has_table(table_name):
+            continue
+        columns = {column['name']: column for column in inspector.get_columns(table_name)}
+        is_legacy = (legacy_column in columns if legacy_column
+                     else not isinstance(columns['item_id']['type'].as_generic(), Integer))
+        if not is_legacy:
+            continue
+
+        logging.info(f"Converting {table_name} from the old serverless schema")
+        # Copy out first: renaming would keep the old primary key and sequence names
+        connection.execute(text(f"CREATE TABLE {table_name}_serverless AS SELECT * FROM {table_name}"))
+        connection.execute(text(f"DROP TABLE {table_name}"))
+        tables[table_name].create(bind=connection)
+        # The canonical table has a unique natural key; keep the latest duplicate
+        connection.execute(text(
+            f"INSERT INTO {table_name} ({', '.join(conversions)}) "
+            f"SELECT {', '.join(conversions.values())} FROM {table_name}_serverless "
+            f"WHERE id IN (SELECT MAX(id) FROM {table_name}_serverless GROUP BY {', '.join(NATURAL_KEYS[table_name])})"
+        ))
+        connection.execute(text(f"DROP TABLE {table_name}_serverless"))
+
+
+def ensure_schema():
+    """Bring the database up to the current schema; cheap when it already is.
+
+    Databases at the latest version skip the DDL entirely.
+    """
+    if schema_is_current():
+        return
+    with db.engine.begin() as connection:
+        upgrade_serverless_tables(connection)
+    db.create_all()
+    run_migrations()
+
+
+def run_migrations():
+    """Apply any pending migrations. Safe to call on every startup."""
+    with db.engine.begin() as connection:
+        current_version = get_schema_version(connection)
+        for version, description, migrate in MIGRATIONS:
+            if version <= current_version:
+                continue
+            logging.info(f"Applying migration {version}: {description}")
+            migrate(connection)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) "
+                     "VALUES (:version, :description, :applied_at)"),
+                {'version': version, 'description': description, 'applied_at': datetime.utcnow()}
+            )
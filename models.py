@@ -1,9 +1,12 @@
-from main import db
+from database import db
 from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, Date
 from datetime import datetime
 
 class ProductEligibility(db.Model):
     __tablename__ = 'product_eligibility'
+    __table_args__ = (
+        db.Index('uq_product_eligibility_item_id_datetime', 'item_id', 'eligibility_datetime_utc', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     eligibility_datetime_utc = db.Column(db.DateTime, nullable=False)
@@ -16,6 +19,10 @@ class ProductEligibility(db.Model):
 
 class AdSalesMetrics(db.Model):
     __tablename__ = 'ad_sales_metrics'
+    __table_args__ = (
+        db.Index('uq_ad_sales_metrics_item_id_date', 'item_id', 'date', unique=True),
+        db.Index('ix_ad_sales_metrics_date', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
@@ -31,6 +38,10 @@ class AdSalesMetrics(db.Model):
 
 class TotalSalesMetrics(db.Model):
     __tablename__ = 'total_sales_metrics'
+    __table_args__ = (
+        db.Index('uq_total_sales_metrics_item_id_date', 'item_id', 'date', unique=True),
+        db.Index('ix_total_sales_metrics_date', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
@@ -40,3 +51,185 @@ class TotalSalesMetrics(db.Model):
     
     def __repr__(self):
         return f'<TotalSalesMetrics {self.item_id} - {self.date}>'
+
+class LoadWatermark(db.Model):
+    __tablename__ = 'load_watermarks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    file_path = db.Column(db.String(500), nullable=False, unique=True)
+    table_name = db.Column(db.String(100), nullable=False)
+    head_hash = db.Column(db.String(64), nullable=False)
+    byte_offset = db.Column(db.BigInteger, nullable=False, default=0)
+    max_date = db.Column(db.Date)
+    rows_loaded = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<LoadWatermark {self.file_path} @ {self.byte_offset}>'
+
+class RollupMetricsMixin:
+    """Summed ad and total sales metrics shared by the rollup tables."""
+    ad_sales = db.Column(db.Float, nullable=False, default=0.0)
+    ad_spend = db.Column(db.Float, nullable=False, default=0.0)
+    clicks = db.Column(db.Integer, nullable=False, default=0)
+    impressions = db.Column(db.Integer, nullable=False, default=0)
+    ad_units_sold = db.Column(db.Integer, nullable=False, default=0)
+    total_sales = db.Column(db.Float, nullable=False, default=0.0)
+    total_units_ordered = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyMetricsRollup(RollupMetricsMixin, db.Model):
+    __tablename__ = 'rollup_daily_metrics'
+    
+    date = db.Column(db.Date, primary_key=True)
+    
+    def __repr__(self):
+        return f'<DailyMetricsRollup {self.date}>'
+
+class WeeklyMetricsRollup(RollupMetricsMixin, db.Model):
+    __tablename__ = 'rollup_weekly_metrics'
+    
+    week_start = db.Column(db.Date, primary_key=True)
+    
+    def __repr__(self):
+        return f'<WeeklyMetricsRollup {self.week_start}>'
+
+class ItemMetricsRollup(RollupMetricsMixin, db.Model):
+    __tablename__ = 'rollup_item_metrics'
+    
+    item_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    
+    def __repr__(self):
+        return f'<ItemMetricsRollup {self.item_id}>'
+
+class AllTimeMetricsRollup(RollupMetricsMixin, db.Model):
+    __tablename__ = 'rollup_all_time_metrics'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    
+    def __repr__(self):
+        return '<AllTimeMetricsRollup>'
+
+class DataStats(db.Model):
+    __tablename__ = 'data_stats'
+    
+    # A single row (id 1), updated by the loaders in the same transaction as their inserts
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    eligibility_records = db.Column(db.BigInteger, nullable=False, default=0)
+    ad_records = db.Column(db.BigInteger, nullable=False, default=0)
+    sales_records = db.Column(db.BigInteger, nullable=False, default=0)
+    total_revenue = db.Column(db.Float, nullable=False, default=0.0)
+    total_ad_spend = db.Column(db.Float, nullable=False, default=0.0)
+    # Incremented on every change
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<DataStats v{self.version}>'
+
+# Views with the column names of the old serverless models (eligibility_status,
+# reason, units_sold_ad) over the canonical tables, for SQL written against
+# them. item_id stays an integer; the old string ids were the same numbers.
+COMPAT_VIEWS = {
+    'serverless_product_eligibility': (
+        "SELECT id, item_id, "
+        "CASE WHEN eligibility THEN 'ELIGIBLE' ELSE 'NOT_ELIGIBLE' END AS eligibility_status, "
+        "eligibility_datetime_utc, message AS reason "
+        "FROM product_eligibility"
+    ),
+    'serverless_ad_sales_metrics': (
+        "SELECT id, date, item_id, ad_sales, impressions, ad_spend, clicks, "
+        "units_sold AS units_sold_ad "
+        "FROM ad_sales_metrics"
+    ),
+}
+
+def get_schema_info():
+    """Describe the canonical schema for the LLM prompts.
+
+    The single source for both the full app and the serverless app, so both
+    generate SQL against the same tables and columns.
+    """
+    schema_info = {
+        'product_eligibility': {
+            'description': 'Product eligibility for advertising with reasons',
+            'columns': {
+                'eligibility_datetime_utc': 'Date and time when eligibility was checked',
+                'item_id': 'Product item identifier',
+                'eligibility': 'Boolean indicating if product is eligible for ads (TRUE/FALSE)',
+                'message': 'Message explaining why product is not eligible (if applicable)'
+            }
+        },
+        'ad_sales_metrics': {
+            'description': 'Daily advertising performance metrics by product',
+            'columns': {
+                'date': 'Date of the metrics',
+                'item_id': 'Product item identifier',
+                'ad_sales': 'Revenue generated from advertising',
+                'impressions': 'Number of ad impressions shown',
+                'ad_spend': 'Amount spent on advertising',
+                'clicks': 'Number of clicks on ads',
+                'units_sold': 'Number of units sold through ads'
+            }
+        },
+        'total_sales_metrics': {
+            'description': 'Daily total sales performance by product',
+            'columns': {
+                'date': 'Date of the metrics',
+                'item_id': 'Product item identifier',
+                'total_sales': 'Total sales revenue for the product',
+                'total_units_ordered': 'Total number of units ordered'
+            }
+        },
+        'rollup_daily_metrics': {
+            'description': 'Pre-aggregated ad and total sales metrics per day across all products (one row per date)',
+            'columns': {
+                'date': 'Date of the metrics',
+                'ad_sales': 'Sum of ad_sales',
+                'ad_spend': 'Sum of ad_spend',
+                'clicks': 'Sum of clicks',
+                'impressions': 'Sum of impressions',
+                'ad_units_sold': 'Sum of units_sold from ad_sales_metrics',
+                'total_sales': 'Sum of total_sales',
+                'total_units_ordered': 'Sum of total_units_ordered'
+            }
+        },
+        'rollup_weekly_metrics': {
+            'description': 'Pre-aggregated ad and total sales metrics per week across all products (one row per week)',
+            'columns': {
+                'week_start': 'Monday the week starts on',
+                'ad_sales': 'Sum of ad_sales',
+                'ad_spend': 'Sum of ad_spend',
+                'clicks': 'Sum of clicks',
+                'impressions': 'Sum of impressions',
+                'ad_units_sold': 'Sum of units_sold from ad_sales_metrics',
+                'total_sales': 'Sum of total_sales',
+                'total_units_ordered': 'Sum of total_units_ordered'
+            }
+        },
+        'rollup_item_metrics': {
+            'description': 'Pre-aggregated all-time ad and total sales metrics per product (one row per item_id)',
+            'columns': {
+                'item_id': 'Product item identifier',
+                'ad_sales': 'Sum of ad_sales',
+                'ad_spend': 'Sum of ad_spend',
+                'clicks': 'Sum of clicks',
+                'impressions': 'Sum of impressions',
+                'ad_units_sold': 'Sum of units_sold from ad_sales_metrics',
+                'total_sales': 'Sum of total_sales',
+                'total_units_ordered': 'Sum of total_units_ordered'
+            }
+        },
+        'rollup_all_time_metrics': {
+            'description': 'Pre-aggregated all-time ad and total sales metrics across all products (a single row)',
+            'columns': {
+                'ad_sales': 'Sum of ad_sales',
+                'ad_spend': 'Sum of ad_spend',
+                'clicks': 'Sum of clicks',
+                'impressions': 'Sum of impressions',
+                'ad_units_sold': 'Sum of units_sold from ad_sales_metrics',
+                'total_sales': 'Sum of total_sales',
+                'total_units_ordered': 'Sum of total_units_ordered'
+            }
+        }
+    }
+    return schema_info
@@ -0,0 +1,67 @@
+"""Background computation of LLM narratives for already-returned results.
+
+``/api/ask`` with ``defer_narrative`` returns the raw result straight away
+and hands the Gemini formatting call to this store; clients fetch the text
+later from ``/api/narrative/<id>``.
+"""
+import uuid
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class NarrativeStore:
+    """Runs narrative jobs on a thread pool and keeps recent results by id."""
+
+    def __init__(self, max_workers=4, max_entries=1000, ttl_seconds=600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='narrative')
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, function, *args):
+        """Start computing a narrative and return its id."""
+        narrative_id = uuid.uuid4().hex
+        future = self._executor.submit(function, *args)
+        with self._lock:
+            self._futures[narrative_id] = (future, time.monotonic())
+            self._evict()
+        return narrative_id
+
+    def get(self, narrative_id, wait_seconds=0):
+        """Return the narrative status, waiting up to ``wait_seconds`` for it to finish.
+
+        Returns None for unknown or expired ids.
+        """
+        with self._lock:
+            entry = self._futures.get(narrative_id)
+        if entry is None:
+            return None
+
+        future = entry[0]
+        if wait_seconds > 0:
+            try:
+                future.result(timeout=wait_seconds)
+            except Exception:
+                # Timeouts leave the job pending; failures are reported below
+                pass
+
+        if not future.done():
+            return {'narrative_id': narrative_id, 'narrative_status': 'pending'}
+        if future.exception() is not None:
+            logging.error(f"Narrative {narrative_id} failed: {future.exception()}")
+            return {'narrative_id': narrative_id, 'narrative_status': 'failed',
+                    'error': 'Could not generate the narrative'}
+        return {'narrative_id': narrative_id, 'narrative_status': 'ready',
+                'formatted_response': future.result()}
+
+    def _evict(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._futures:
+            created_at = next(iter(self._futures.values()))[1]
+            if len(self._futures) <= self.max_entries and created_at >= cutoff:
+                break
+            self._futures.popitem(last=False)
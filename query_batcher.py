@@ -0,0 +1,144 @@
+"""Merging of single-row aggregate queries over the same table.
+
+A batch of questions often asks for several totals over one table (total ad
+spend, total clicks, overall CPC, ...), which Gemini writes as separate
+aggregate queries. ``merge_aggregates`` combines the queries that read the
+same table with the same WHERE clause into one SELECT computing every
+aggregate in a single scan, and ``split_row`` maps the merged row back to
+each query's own columns.
+
+Only simple queries are merged: a single table without joins, subqueries,
+GROUP BY, HAVING, ORDER BY, OFFSET, LIMIT 0 or set operations, and every
+select item an expression over aggregate functions with an explicit alias. Anything else is
+left to run on its own.
+"""
+import re
+from collections import namedtuple
+from query_guard import _strip_literals
+
+# members: (key, [(merged column, original column), ...]) for each merged query
+AggregateGroup = namedtuple('AggregateGroup', ['sql_query', 'members'])
+
+_SIMPLE_AGGREGATE = re.compile(
+    r'^\s*select\s+(?P<items>.+?)\s+from\s+"?(?P<table>[a-z_]\w*)"?'
+    r'(?:\s+where\s+(?P<where>.+?))?(?:\s+limit\s+(?P<limit>\d+))?\s*$',
+    re.IGNORECASE | re.DOTALL
+)
+_ALIASED_ITEM = re.compile(r'^(?P<expression>.+)\s+as\s+"?(?P<alias>[a-z_]\w*)"?$', re.IGNORECASE | re.DOTALL)
+_AGGREGATE_CALL = re.compile(r'\b(sum|avg|count|min|max|total)\s*\(')
+_UNMERGEABLE = re.compile(r'\b(join|group|having|order|union|intersect|except|over|offset|select)\b')
+_STRUCTURE_KEYWORDS = re.compile(r'\b(from|where|limit|as)\b')
+# Words that may appear outside the aggregate calls of a select item
+_SCALAR_WORDS = {'nullif', 'coalesce', 'round', 'abs', 'cast', 'as', 'real', 'float', 'numeric', 'decimal',
+                 'integer', 'double', 'precision', 'null'}
+
+
+def _split_items(items):
+    """Split a select list on top-level commas."""
+    parts, depth, start, quoted = [], 0, 0, False
+    for index, char in enumerate(items):
+        if char == "'":
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(items[start:index].strip())
+            start = index + 1
+    parts.append(items[start:].strip())
+    return parts
+
+
+def _without_aggregate_calls(expression):
+    """The expression with each aggregate call replaced by 0, or None if it has none."""
+    found = False
+    while True:
+        match = _AGGREGATE_CALL.search(expression)
+        if match is None:
+            return expression if found else None
+        depth = 0
+        for index in range(match.end() - 1, len(expression)):
+            if expression[index] == '(':
+                depth += 1
+            elif expression[index] == ')':
+                depth -= 1
+                if depth == 0:
+                    break
+        else:
+            return None
+        expression = expression[:match.start()] + '0' + expression[index + 1:]
+        found = True
+
+
+def parse_aggregate(sql_query):
+    """Split a mergeable query into (table, where, [(expression, alias), ...]), or None."""
+    code = _strip_literals(sql_query).strip()
+    if not code.startswith('select') or _UNMERGEABLE.search(code[len('select'):]):
+        return None
+    # Keywords inside string literals or comments would throw off the parse below
+    if len(_STRUCTURE_KEYWORDS.findall(code)) != len(_STRUCTURE_KEYWORDS.findall(sql_query.lower())):
+        return None
+    match = _SIMPLE_AGGREGATE.match(sql_query)
+    if match is None:
+        return None
+    # Any other LIMIT keeps the single aggregate row; LIMIT 0 returns no rows at all
+    if match.group('limit') is not None and int(match.group('limit')) == 0:
+        return None
+
+    items = []
+    for item in _split_items(match.group('items')):
+        aliased = _ALIASED_ITEM.match(item)
+        if aliased is None:
+            return None
+        remainder = _without_aggregate_calls(aliased.group('expression').lower())
+        if remainder is None or not set(re.findall(r'[a-z_]\w*', remainder)) <= _SCALAR_WORDS:
+            return None
+        items.append((aliased.group('expression').strip(), aliased.group('alias')))
+    where = match.group('where').strip() if match.group('where') else None
+    return match.group('table').lower(), where, items
+
+
+def merge_aggregates(queries):
+    """Group mergeable queries by table and WHERE clause.
+
+    queries maps a caller's key to its SQL. Returns (groups, unmerged keys),
+    with an AggregateGroup for every table and filter read by more than one
+    query.
+    """
+    by_scan = {}
+    unmerged = []
+    for key, sql_query in queries.items():
+        parsed = parse_aggregate(sql_query)
+        if parsed is None:
+            unmerged.append(key)
+            continue
+        table, where, items = parsed
+        by_scan.setdefault((table, where), []).append((key, items))
+
+    groups = []
+    for (table, where), members in by_scan.items():
+        if len(members) < 2:
+            unmerged.extend(key for key, _ in members)
+            continue
+        select_items = []
+        group_members = []
+        for key, items in members:
+            columns = []
+            for expression, alias in items:
+                merged_alias = f'agg_{len(select_items)}'
+                select_items.append(f'{expression} AS {merged_alias}')
+                columns.append((merged_alias, alias))
+            group_members.append((key, columns))
+        sql_query = f"SELECT {', '.join(select_items)} FROM {table}"
+        if where:
+            sql_query += f" WHERE {where}"
+        groups.append(AggregateGroup(sql_query, group_members))
+    return groups, unmerged
+
+
+def split_row(row, columns):
+    """One query's row from the merged row, under its own column names."""
+    return {alias: row[merged_alias] for merged_alias, alias in columns}
@@ -0,0 +1,284 @@
+"""Pre-flight checks for LLM-generated SQL.
+
+Gemini's SQL is run against the live database, so before executing it the
+pipeline checks that it is a single read-only SELECT, appends a LIMIT when
+it has none, and asks the planner (EXPLAIN / EXPLAIN QUERY PLAN) what the
+query will cost. Plans over QUERY_MAX_COST are rejected, and every statement
+runs under a timeout on both SQLite and PostgreSQL.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+# Planner cost units on PostgreSQL; estimated rows visited on SQLite
+QUERY_MAX_COST = float(os.environ.get('QUERY_MAX_COST', '10000000'))
+QUERY_TIMEOUT_SECONDS = float(os.environ.get('QUERY_TIMEOUT_SECONDS', '10'))
+
+# SQLite virtual machine steps between timeout checks
+_SQLITE_PROGRESS_STEPS = 10000
+
+_STRING_OR_COMMENT = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_WRITE_KEYWORDS = re.compile(
+    r'\b(insert|update|delete|drop|alter|create|truncate|attach|detach|pragma|vacuum|'
+    r'reindex|grant|revoke|copy|merge|call|do|set|lock)\b'
+)
+_TRAILING_LIMIT = re.compile(r'\blimit\s+(\d+|:\w+|\?)(\s*(offset|,)\s*(\d+|:\w+|\?))?\s*$')
+# Also matches comma-separated select items; names that are not tables are ignored later
+_TABLE_REFERENCE = re.compile(r'(?:\bfrom\s+|\bjoin\s+|,\s*)"?([a-z_]\w*)"?(?:\s+(?:as\s+)?([a-z_]\w*))?')
+_SQLITE_PLAN_STEP = re.compile(r'^(SCAN|SEARCH) (\w+)')
+_SQLITE_SEARCH_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+_SQLITE_SEARCH_CONSTRAINTS = re.compile(r'\(([^()]*)\)\s*$')
+_SQLITE_CONSTRAINT = re.compile(r'^(\w+)([=<>]+)')
+_NOT_ALIASES = {'where', 'join', 'inner', 'left', 'right', 'full', 'cross', 'outer', 'on', 'using',
+                'group', 'order', 'limit', 'having', 'union', 'natural', 'window', 'offset'}
+_INDEX_SCANS = {'Index Scan', 'Index Only Scan', 'Bitmap Heap Scan'}
+
+QueryPlan = namedtuple('QueryPlan', ['cost', 'full_scans', 'cartesian'])
+
+
+class QueryRejected(ValueError):
+    """Raised when a generated query is not allowed to run."""
+
+
+def _strip_literals(sql_query):
+    """Lowercased SQL with string literals and comments blanked out."""
+    return _STRING_OR_COMMENT.sub(lambda match: "''" if match.group(0).startswith("'") else ' ',
+                                  sql_query).lower()
+
+
+def prepare_query(sql_query, row_limit):
+    """Validate a generated query and return it with a LIMIT of row_limit if it had none.
+
+    Raises QueryRejected for anything but a single read-only SELECT/WITH statement.
+    """
+    sql_query = sql_query.strip().rstrip(';').strip()
+    code = _strip_literals(sql_query).strip()
+
+    if ';' in code:
+        raise QueryRejected('Only a single SQL statement is allowed.')
+    if not code.startswith(('select', 'with')):
+        raise QueryRejected('Only SELECT queries are allowed.')
+    keyword = _WRITE_KEYWORDS.search(code)
+    if keyword:
+        raise QueryRejected(f"Queries may not use {keyword.group(1).upper()}.")
+
+    if not _TRAILING_LIMIT.search(code):
+        sql_query = f"{sql_query}\nLIMIT {row_limit}"
+    return sql_query
+
+
+def _table_aliases(sql_query):
+    aliases = {}
+    for table, alias in _TABLE_REFERENCE.findall(_strip_literals(sql_query)):
+        aliases[table] = table
+        if alias and alias not in _NOT_ALIASES:
+            aliases[alias] = table
+    return aliases
+
+
+def _sqlite_table_rows(connection, table, cache):
+    if table not in cache:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': table}
+        ).first()
+        # MAX(rowid) is an index lookup, unlike COUNT(*)
+        cache[table] = (connection.execute(text(f'SELECT MAX(rowid) FROM "{table}"')).scalar() or 0) if exists else None
+    return cache[table]
+
+
+# Rows read to estimate a table's distinct keys when ANALYZE has not run; the
+# preflight must stay cheap however large the table is
+_DISTINCT_SAMPLE_ROWS = 10000
+
+# (table, key columns) -> (table rows when sampled, distinct keys in the sample); resampled when the table grows
+_distinct_keys = {}
+
+
+def _sqlite_unique_keys(connection, table):
+    """Column sets of the table's unique indexes."""
+    keys = []
+    for index in connection.execute(text(f'PRAGMA index_list("{table}")')).all():
+        if index[2]:
+            keys.append({column[2] for column in connection.execute(text(f'PRAGMA index_info("{index[1]}")')).all()})
+    return keys
+
+
+def _sqlite_stat_fanout(connection, index_name, prefix_length):
+    """Average rows per distinct value of the index's first prefix_length columns, from ANALYZE."""
+    try:
+        stat = connection.execute(text("SELECT stat FROM sqlite_stat1 WHERE idx = :name"), {'name': index_name}).scalar()
+    except Exception:
+        # No sqlite_stat1 until ANALYZE has run
+        return None
+    values = (stat or '').split()
+    if len(values) <= prefix_length:
+        return None
+    return int(values[prefix_length])
+
+
+def _search_fanout(connection, table, rows, detail):
+    """Estimated rows one probe of a SEARCH plan step visits."""
+    constraints = _SQLITE_SEARCH_CONSTRAINTS.search(detail)
+    if constraints is None:
+        return rows
+    equal_columns, has_range = [], False
+    for constraint in constraints.group(1).split(' AND '):
+        match = _SQLITE_CONSTRAINT.match(constraint.strip())
+        if match is not None and match.group(2) == '=':
+            equal_columns.append(match.group(1))
+        else:
+            has_range = True
+
+    if 'rowid' in equal_columns or any(key <= set(equal_columns) for key in _sqlite_unique_keys(connection, table)):
+        fanout = 1
+    elif not equal_columns:
+        fanout = rows
+    else:
+        index = _SQLITE_SEARCH_INDEX.search(detail)
+        fanout = _sqlite_stat_fanout(connection, index.group(1), len(equal_columns)) if index else None
+        if fanout is None:
+            # A sample holds at most as many distinct keys as the table, so this overestimates the fan-out
+            cache_key = (table, tuple(equal_columns))
+            counted = _distinct_keys.get(cache_key)
+            if counted is None or counted[0] != rows:
+                columns = ', '.join(f'"{column}"' for column in equal_columns)
+                distinct = connection.execute(
+                    text(f'SELECT COUNT(*) FROM (SELECT DISTINCT {columns} FROM '
+                         f'(SELECT {columns} FROM "{table}" LIMIT {_DISTINCT_SAMPLE_ROWS}))')
+                ).scalar()
+                counted = _distinct_keys[cache_key] = (rows, distinct)
+            fanout = rows / max(counted[1], 1)
+    # SQLite's own planner assumes a range bound keeps about a quarter of the rows
+    return max(fanout / 4 if has_range else fanout, 1)
+
+
+def _explain_sqlite(connection, sql_query, params):
+    steps = connection.execute(text(f'EXPLAIN QUERY PLAN {sql_query}'), params).all()
+    aliases = _table_aliases(sql_query)
+    row_counts = {}
+
+    # Sibling steps under the same parent are nested loops, outermost first:
+    # each SCAN visits the whole table per outer row, each SEARCH its fan-out
+    loops = {}
+    full_scans = []
+    cost = 0
+    for step_id, parent_id, _, detail in steps:
+        match = _SQLITE_PLAN_STEP.match(detail)
+        if not match or match.group(2).lower() not in aliases:
+            continue
+        table = aliases[match.group(2).lower()]
+        rows = _sqlite_table_rows(connection, table, row_counts)
+        if rows is None:
+            continue
+        if 'AUTOMATIC' in detail:
+            # SQLite builds a temporary index over the whole table first
+            cost += rows
+        if match.group(1) == 'SCAN':
+            full_scans.append(table)
+            loops.setdefault(parent_id, []).append(('SCAN', rows))
+        else:
+            loops.setdefault(parent_id, []).append(('SEARCH', _search_fanout(connection, table, rows, detail)))
+
+    cartesian = any(sum(1 for kind, _ in nested if kind == 'SCAN') > 1 for nested in loops.values())
+    for nested in loops.values():
+        visited = 1
+        for _, rows in nested:
+            visited *= max(rows, 1)
+            cost += visited
+    return QueryPlan(cost, full_scans, cartesian)
+
+
+def _walk_plan(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from _walk_plan(child)
+
+
+def _explain_postgresql(connection, sql_query, params):
+    plan = connection.execute(text(f'EXPLAIN (FORMAT JSON) {sql_query}'), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]['Plan']
+
+    full_scans = []
+    cartesian = False
+    for node in _walk_plan(root):
+        if node['Node Type'] == 'Seq Scan':
+            full_scans.append(node.get('Relation Name'))
+        elif node['Node Type'] == 'Nested Loop' and 'Join Filter' not in node:
+            inner = node.get('Plans', [{}, {}])[-1]
+            if not any(child['Node Type'] in _INDEX_SCANS for child in _walk_plan(inner)):
+                cartesian = True
+    return QueryPlan(root['Total Cost'], full_scans, cartesian)
+
+
+def explain_query(connection, sql_query, params=None):
+    """Return the planner's QueryPlan estimate, or None on unsupported databases."""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        return _explain_sqlite(connection, sql_query, params or {})
+    if dialect == 'postgresql':
+        return _explain_postgresql(connection, sql_query, params or {})
+    return None
+
+
+def preflight(connection, sql_query, params=None, max_cost=None):
+    """EXPLAIN a query and raise QueryRejected if it is too expensive to run."""
+    max_cost = max_cost or QUERY_MAX_COST
+    plan = explain_query(connection, sql_query, params)
+    if plan is None:
+        return None
+
+    if plan.full_scans:
+        logging.info(f"Query plan: cost {plan.cost:,.0f}, full scans of {', '.join(plan.full_scans)}")
+    if plan.cost > max_cost:
+        reason = 'joins tables without a join condition' if plan.cartesian else 'would scan too many rows'
+        logging.warning(f"Rejected query with plan cost {plan.cost:,.0f}: {sql_query}")
+        raise QueryRejected(f"This query {reason} (estimated cost {plan.cost:,.0f}). Try narrowing it down.")
+    return plan
+
+
+def timeout_statement(dialect, seconds):
+    """SQL that sets a per-statement timeout for the current transaction, if the dialect has one."""
+    if dialect == 'postgresql':
+        return f"SET LOCAL statement_timeout = {int(seconds * 1000)}"
+    return None
+
+
+@contextmanager
+def statement_timeout(connection, seconds=None):
+    """Abort statements run on connection inside this block after seconds."""
+    seconds = seconds or QUERY_TIMEOUT_SECONDS
+    dialect = connection.dialect.name
+    statement = timeout_statement(dialect, seconds)
+    if statement is not None:
+        connection.execute(text(statement))
+        try:
+            yield
+        finally:
+            try:
+                connection.execute(text('RESET statement_timeout'))
+            except DBAPIError:
+                # The failed statement aborted the transaction; rolling it back undoes SET LOCAL too
+                pass
+        return
+
+    driver_connection = connection.connection.driver_connection if dialect == 'sqlite' else None
+    if not isinstance(driver_connection, sqlite3.Connection):
+        yield
+        return
+
+    # SQLite has no statement timeout; a progress handler returning True interrupts the query
+    deadline = time.monotonic() + seconds
+    driver_connection.set_progress_handler(lambda: time.monotonic() > deadline, _SQLITE_PROGRESS_STEPS)
+    try:
+        yield
+    finally:
+        driver_connection.set_progress_handler(None, 0)
@@ -0,0 +1,120 @@
+"""Local, template-based answers for small query results.
+
+Used instead of a second Gemini call when the result is a scalar or a small
+table, where an LLM narrative adds latency and tokens but little insight.
+Larger results are reduced by ``summarize_for_llm`` before they are put in
+the narrative prompt.
+"""
+import os
+from numbers import Number
+
+RESPONSE_MODES = ('auto', 'raw', 'template', 'llm')
+
+# Results up to this many rows (and columns) count as small enough to template
+TEMPLATE_MAX_ROWS = int(os.environ.get('TEMPLATE_MAX_ROWS', '10'))
+TEMPLATE_MAX_COLUMNS = int(os.environ.get('TEMPLATE_MAX_COLUMNS', '4'))
+
+# Rows of a larger result sent verbatim to the LLM; the rest is only aggregated
+LLM_SAMPLE_ROWS = int(os.environ.get('LLM_SAMPLE_ROWS', '20'))
+
+_CURRENCY_HINTS = ('sales', 'spend', 'revenue', 'cpc', 'cost', 'price', 'value')
+_PERCENT_HINTS = ('rate', 'ctr', 'percent', 'share')
+_RATIO_HINTS = ('roas', 'ratio', 'avg', 'average')
+
+
+def is_small_result(rows):
+    """Return True if a result is small enough to format locally."""
+    if not rows or len(rows) > TEMPLATE_MAX_ROWS:
+        return False
+    return len(rows[0]) <= TEMPLATE_MAX_COLUMNS
+
+
+def resolve_response_mode(response_mode, rows):
+    """Turn 'auto' into 'template' or 'llm' depending on the result size."""
+    if response_mode == 'auto':
+        return 'template' if is_small_result(rows) else 'llm'
+    return response_mode
+
+
+def format_column_value(column, value):
+    """Render a value, guessing currency/percent/ratio formatting from the column name."""
+    if value is None:
+        return 'n/a'
+    if isinstance(value, bool) or not isinstance(value, Number):
+        return str(value)
+
+    name = column.lower()
+    if any(hint in name for hint in _PERCENT_HINTS):
+        return f"{value * 100:.2f}%" if value <= 1 else f"{value:.2f}%"
+    if any(hint in name for hint in _RATIO_HINTS):
+        return f"{value:,.2f}"
+    if any(hint in name for hint in _CURRENCY_HINTS):
+        return f"${value:,.2f}"
+    if isinstance(value, float) and not value.is_integer():
+        return f"{value:,.2f}"
+    return f"{int(value):,}"
+
+
+def _describe(column):
+    return column.replace('_', ' ')
+
+
+def format_result_locally(rows):
+    """Build a plain-text answer from a small result set."""
+    if not rows:
+        return "The query returned no results."
+
+    columns = list(rows[0].keys())
+    if len(rows) == 1 and len(columns) == 1:
+        column = columns[0]
+        return f"The {_describe(column)} is {format_column_value(column, rows[0][column])}."
+
+    if len(rows) == 1:
+        parts = [f"{_describe(column)}: {format_column_value(column, rows[0][column])}" for column in columns]
+        return "Result: " + ', '.join(parts) + "."
+
+    lines = [
+        "- " + ', '.join(f"{_describe(column)}: {format_column_value(column, row[column])}" for column in columns)
+        for row in rows
+    ]
+    return f"The query returned {len(rows)} rows:\n" + '\n'.join(lines)
+
+
+def _is_number(value):
+    return isinstance(value, Number) and not isinstance(value, bool)
+
+
+def summarize_for_llm(rows, truncated=False, sample_rows=LLM_SAMPLE_ROWS):
+    """Bound a result for the narrative prompt.
+
+    Small, complete results are returned unchanged. Otherwise the first
+    ``sample_rows`` rows are kept, plus the row count and per-column
+    aggregates (count/sum/min/max/avg for numbers, distinct count otherwise).
+    """
+    if len(rows) <= sample_rows and not truncated:
+        return rows
+
+    columns = list(rows[0].keys()) if rows else []
+    column_stats = {}
+    for column in columns:
+        values = [row[column] for row in rows if row[column] is not None]
+        if values and all(_is_number(value) for value in values):
+            total = sum(values)
+            column_stats[column] = {
+                'count': len(values),
+                'sum': round(total, 4),
+                'min': min(values),
+                'max': max(values),
+                'avg': round(total / len(values), 4),
+            }
+        else:
+            column_stats[column] = {'count': len(values), 'distinct': len({str(value) for value in values})}
+
+    return {
+        'row_count': len(rows),
+        'truncated': truncated,
+        'note': ('Only the first rows are shown; aggregates cover all returned rows'
+                 + (', and the query returned more rows than the server row cap' if truncated else '')),
+        'sample_rows': rows[:sample_rows],
+        'column_stats': column_stats,
+    }
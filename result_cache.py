@@ -0,0 +1,178 @@
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+
+_TOKEN = re.compile(
+    r"'(?:[^']|'')*'"          # string literal
+    r'|"(?:[^"]|"")*"'         # double-quoted identifier
+    r"|`[^`]*`"                # backtick-quoted identifier
+    r"|\w+"                    # keyword, identifier or number
+    r"|[^\w\s]"                # punctuation / operator
+)
+# Keywords that end a FROM list
+_FROM_LIST_END = {'where', 'group', 'order', 'having', 'limit', 'offset', 'union', 'intersect', 'except',
+                  'window', 'select', 'values', 'returning'}
+
+# Clause keywords only: function names and expression operators are left
+# alone because SQLite echoes them into the names of unaliased columns.
+SQL_KEYWORDS = {
+    'select', 'distinct', 'from', 'where', 'as', 'on', 'join', 'inner', 'left',
+    'right', 'outer', 'full', 'cross', 'group', 'by', 'order', 'asc', 'desc',
+    'having', 'limit', 'offset', 'union', 'all', 'with',
+}
+
+_data_versions = {}
+_data_versions_lock = threading.Lock()
+
+
+def bump_data_version(table_name):
+    """Mark a table as changed so cached results that read it become stale."""
+    with _data_versions_lock:
+        _data_versions[table_name] = _data_versions.get(table_name, 0) + 1
+
+
+def get_data_version(table_name):
+    """Return the current data version of a table."""
+    with _data_versions_lock:
+        return _data_versions.get(table_name, 0)
+
+
+def canonicalize_sql(sql_query):
+    """Canonical form of a query used as the cache key.
+
+    Whitespace is collapsed, trailing semicolons dropped, keywords lowercased
+    and quotes around identifiers removed. Identifier case is kept because it
+    determines the column names in the result.
+    """
+    tokens = []
+    for token in _TOKEN.findall(sql_query.strip().rstrip(';')):
+        if token[0] in '"`':
+            token = token[1:-1]
+        elif token.lower() in SQL_KEYWORDS:
+            token = token.lower()
+        tokens.append(token)
+    return ' '.join(tokens)
+
+
+def referenced_tables(sql_query):
+    """Return the sorted table names a query reads from.
+
+    Follows FROM lists, including comma-separated ones (``FROM a x, b y``),
+    JOINs and subqueries at any depth.
+    """
+    tokens = [token[1:-1].lower() if token[0] in '"`' else token.lower()
+              for token in _TOKEN.findall(sql_query) if token[0] != "'"]
+    tables = set()
+    # Parenthesis depths at which a FROM list is open
+    from_depths = set()
+    depth = 0
+    expect_table = False
+    for index, token in enumerate(tokens):
+        if expect_table:
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            # In schema.table, the table name comes after the dot
+            expect_table = following == '.' or token == '.'
+            if expect_table:
+                continue
+            if re.fullmatch(r'[a-z_]\w*', token) and following != '(':
+                tables.add(token)
+                continue
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            from_depths.discard(depth)
+            depth -= 1
+        elif token in ('from', 'join'):
+            from_depths.add(depth)
+            expect_table = True
+        elif token == ',' and depth in from_depths:
+            expect_table = True
+        elif token in _FROM_LIST_END:
+            from_depths.discard(depth)
+    return sorted(tables)
+
+
+class ResultCache:
+    """Memory-bounded LRU cache of query results.
+
+    Results are keyed on the canonical SQL plus the data version of every table
+    the query reads, so a load into any of those tables makes the entry
+    unreachable. Callers also pass the data_stats version read from the
+    database, which loads in other processes bump; ``ttl_seconds`` bounds
+    staleness from changes made outside the loaders.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl_seconds=300):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, sql_query, params=None, stored_version=0):
+        """Build the cache key for a query and its bound parameters at the current data versions.
+
+        stored_version is the data_stats version, shared by every process.
+        """
+        canonical = canonicalize_sql(sql_query)
+        versions = tuple((table, get_data_version(table)) for table in referenced_tables(canonical))
+        bound = tuple(sorted((params or {}).items()))
+        return canonical, bound, versions, stored_version
+
+    def get(self, key):
+        """Return cached rows for a key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds and time.monotonic() - entry[2] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, rows):
+        """Store rows unless they alone exceed the memory bound."""
+        size = len(json.dumps(rows, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (rows, size, time.monotonic())
+            self._size_bytes += size
+            while self._size_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def stats(self):
+        """Return hit/miss counters and memory usage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._size_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._size_bytes -= size
@@ -0,0 +1,137 @@
+"""Pre-aggregated KPI rollups over the ad and total sales fact tables.
+
+The rollup tables hold summed metrics per day, per week (Monday start), per
+item and for all time. Loaders call ``refresh_rollups`` in the same
+transaction as their inserts, passing the dates and item ids they touched;
+only those rollup rows are recomputed from the fact tables, which keeps the
+rollups correct even when loads replace existing rows.
+"""
+import logging
+from datetime import timedelta
+from sqlalchemy import select, delete, func, literal, union_all
+from result_cache import bump_data_version
+from models import (AdSalesMetrics, TotalSalesMetrics, DailyMetricsRollup, WeeklyMetricsRollup,
+                    ItemMetricsRollup, AllTimeMetricsRollup)
+
+# Fact tables whose loads must refresh the rollups.
+SOURCE_TABLES = {'ad_sales_metrics', 'total_sales_metrics'}
+
+METRICS = ['ad_sales', 'ad_spend', 'clicks', 'impressions', 'ad_units_sold',
+           'total_sales', 'total_units_ordered']
+
+ROLLUP_TABLES = ['rollup_daily_metrics', 'rollup_weekly_metrics', 'rollup_item_metrics',
+                 'rollup_all_time_metrics']
+
+# Keeps IN (...) lists well under the bound-parameter limits of SQLite.
+_KEY_BATCH_SIZE = 500
+
+
+def week_start(day):
+    """Return the Monday of the week containing ``day``."""
+    return day - timedelta(days=day.weekday())
+
+
+def _fact_union(key_column, keys=None):
+    """Union both fact tables into one metric row set keyed by date or item_id."""
+    ad = AdSalesMetrics.__table__
+    total = TotalSalesMetrics.__table__
+    zero = literal(0)
+
+    ad_rows = select(
+        ad.c[key_column].label('key'),
+        ad.c.ad_sales, ad.c.ad_spend, ad.c.clicks, ad.c.impressions,
+        ad.c.units_sold.label('ad_units_sold'),
+        zero.label('total_sales'), zero.label('total_units_ordered'),
+    )
+    total_rows = select(
+        total.c[key_column].label('key'),
+        zero.label('ad_sales'), zero.label('ad_spend'), zero.label('clicks'),
+        zero.label('impressions'), zero.label('ad_units_sold'),
+        total.c.total_sales, total.c.total_units_ordered,
+    )
+    if keys is not None:
+        ad_rows = ad_rows.where(ad.c[key_column].in_(keys))
+        total_rows = total_rows.where(total.c[key_column].in_(keys))
+    return union_all(ad_rows, total_rows).subquery()
+
+
+def _aggregate(connection, key_column, keys=None):
+    facts = _fact_union(key_column, keys)
+    query = select(facts.c.key, *[func.sum(facts.c[name]).label(name) for name in METRICS]).group_by(facts.c.key)
+    return connection.execute(query).all()
+
+
+def _batches(keys):
+    keys = sorted(keys)
+    for start in range(0, len(keys), _KEY_BATCH_SIZE):
+        yield keys[start:start + _KEY_BATCH_SIZE]
+
+
+def _replace_rows(connection, model, key_column, keys, rows):
+    table = model.__table__
+    connection.execute(delete(table).where(table.c[key_column].in_(keys)))
+    if rows:
+        connection.execute(table.insert(), [
+            {key_column: row.key, **{name: row._mapping[name] or 0 for name in METRICS}}
+            for row in rows
+        ])
+
+
+def _refresh_weeks(connection, weeks):
+    daily = DailyMetricsRollup.__table__
+    weekly = WeeklyMetricsRollup.__table__
+    for batch in _batches(weeks):
+        totals = {week: dict.fromkeys(METRICS, 0) for week in batch}
+        query = select(daily).where(daily.c.date >= batch[0], daily.c.date < batch[-1] + timedelta(days=7))
+        for row in connection.execute(query):
+            week = week_start(row.date)
+            if week in totals:
+                for name in METRICS:
+                    totals[week][name] += row._mapping[name]
+        connection.execute(delete(weekly).where(weekly.c.week_start.in_(batch)))
+        connection.execute(weekly.insert(), [
+            {'week_start': week, **values} for week, values in totals.items()
+        ])
+
+
+def _refresh_all_time(connection):
+    daily = DailyMetricsRollup.__table__
+    all_time = AllTimeMetricsRollup.__table__
+    sums = connection.execute(select(*[func.sum(daily.c[name]).label(name) for name in METRICS])).one()
+    connection.execute(delete(all_time))
+    connection.execute(all_time.insert(), [{'id': 1, **{name: sums._mapping[name] or 0 for name in METRICS}}])
+
+
+def refresh_rollups(connection, dates, item_ids):
+    """Recompute the rollup rows for the given dates and item ids."""
+    dates = set(dates)
+    item_ids = set(item_ids)
+    if not dates and not item_ids:
+        return
+
+    for batch in _batches(dates):
+        _replace_rows(connection, DailyMetricsRollup, 'date', batch, _aggregate(connection, 'date', batch))
+    for batch in _batches(item_ids):
+        _replace_rows(connection, ItemMetricsRollup, 'item_id', batch, _aggregate(connection, 'item_id', batch))
+    _refresh_weeks(connection, {week_start(day) for day in dates})
+    _refresh_all_time(connection)
+    logging.info(f"Refreshed rollups for {len(dates)} dates and {len(item_ids)} items")
+
+
+def rebuild_rollups(connection):
+    """Rebuild every rollup table from the fact tables."""
+    for model in (DailyMetricsRollup, WeeklyMetricsRollup, ItemMetricsRollup, AllTimeMetricsRollup):
+        connection.execute(delete(model.__table__))
+
+    daily_rows = _aggregate(connection, 'date')
+    item_rows = _aggregate(connection, 'item_id')
+    _replace_rows(connection, DailyMetricsRollup, 'date', [], daily_rows)
+    _replace_rows(connection, ItemMetricsRollup, 'item_id', [], item_rows)
+    _refresh_weeks(connection, {week_start(row.key) for row in daily_rows})
+    _refresh_all_time(connection)
+
+
+def bump_rollup_versions():
+    """Invalidate cached results over the rollups; call after the load commits."""
+    for table_name in ROLLUP_TABLES:
+        bump_data_version(table_name)
@@ -1,13 +1,62 @@
+import os
+import time
 import logging
 import json
-from flask import Blueprint, render_template, request, jsonify, flash
+import contextvars
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from flask import Blueprint, Response, render_template, request, jsonify, flash, stream_with_context
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
 from sqlalchemy import text
-from main import db
-from models import ProductEligibility, AdSalesMetrics, TotalSalesMetrics
+from database import db, read_engine, pool_stats
+from models import COMPAT_VIEWS, get_schema_info
 from gemini_service import GeminiService
+from result_cache import ResultCache, referenced_tables
+from fast_path import FastPathMatcher
+from narratives import NarrativeStore
+from columnar_engine import create_columnar_engine
+from single_flight import create_single_flight
+from translation_cache import normalize_question
+import query_guard
+import query_batcher
+import telemetry
+import data_stats
+from query_guard import QueryRejected
+from response_formatter import RESPONSE_MODES, resolve_response_mode, format_result_locally
 
 main_bp = Blueprint('main', __name__)
+QueryResult = namedtuple('QueryResult', ['rows', 'truncated'])
+# An I/O call requested by question_steps from the driver running it
+PipelineCall = namedtuple('PipelineCall', ['operation', 'args'])
 gemini_service = GeminiService()
+result_cache = ResultCache(
+    max_bytes=int(os.environ.get('RESULT_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+    ttl_seconds=float(os.environ.get('RESULT_CACHE_TTL_SECONDS', '300')),
+)
+# Rows sent in the streaming endpoint's 'rows' event before the answer arrives
+STREAM_PREVIEW_ROWS = int(os.environ.get('STREAM_PREVIEW_ROWS', '50'))
+fast_path = FastPathMatcher() if os.environ.get('FAST_PATH_ENABLED', '1') == '1' else None
+DEFAULT_RESPONSE_MODE = os.environ.get('DEFAULT_RESPONSE_MODE', 'auto')
+MAX_NARRATIVE_WAIT_SECONDS = 30
+# Rows read from the database per query before the result is marked truncated
+MAX_RESULT_ROWS = int(os.environ.get('MAX_RESULT_ROWS', '5000'))
+FETCH_BATCH_SIZE = int(os.environ.get('FETCH_BATCH_SIZE', '1000'))
+NDJSON_ROWS_PER_CHUNK = 200
+# Corrected queries requested from Gemini after a failure, and the time allowed for them
+SQL_REPAIR_ATTEMPTS = int(os.environ.get('SQL_REPAIR_ATTEMPTS', '2'))
+SQL_REPAIR_BUDGET_SECONDS = float(os.environ.get('SQL_REPAIR_BUDGET_SECONDS', '20'))
+columnar_engine = create_columnar_engine()
+narrative_store = NarrativeStore(max_workers=int(os.environ.get('NARRATIVE_WORKERS', '4')))
+# Concurrent identical questions, and identical queries, share one run
+question_flight = create_single_flight('question')
+query_flight = create_single_flight('query')
+BATCH_MAX_QUESTIONS = int(os.environ.get('BATCH_MAX_QUESTIONS', '200'))
+# Threads translating (and narrating) the questions of /api/ask/batch requests
+batch_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('BATCH_WORKERS', '8')),
+                                    thread_name_prefix='batch')
+# How long a browser may reuse an /api/stats response without revalidating
+STATS_MAX_AGE_SECONDS = int(os.environ.get('STATS_MAX_AGE_SECONDS', '10'))
 
 @main_bp.route('/')
 def index():
@@ -26,20 +75,174 @@ def api_ask():
     """API endpoint for asking questions about the data."""
     try:
         data = request.get_json()
-        if not data or 'question' not in data:
-            return jsonify({'error': 'Question is required'}), 400
+        error, question, response_mode = parse_ask_request(data)
+        if error:
+            return jsonify({'error': error}), 400
         
-        question = data['question'].strip()
-        if not question:
-            return jsonify({'error': 'Question cannot be empty'}), 400
+        defer_narrative = bool(data.get('defer_narrative'))
+        if wants_ndjson(data, request.headers.get('Accept')):
+            return _ndjson_response(question, response_mode, defer_narrative)
         
-        result = process_question(question)
-        return jsonify(result)
+        with telemetry.trace_request('api_ask') as trace:
+            result = process_question(question, response_mode, defer_narrative=defer_narrative)
+            with telemetry.span('serialize'):
+                response = jsonify(result)
+        response.headers['Server-Timing'] = trace.server_timing()
+        return response
     
     except Exception as e:
         logging.error(f"API error: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@main_bp.route('/api/ask/batch', methods=['POST'])
+def api_ask_batch():
+    """API endpoint for answering a list of questions; results come back in the same order."""
+    try:
+        data = request.get_json()
+        questions = data.get('questions') if isinstance(data, dict) else None
+        if not isinstance(questions, list) or not questions:
+            return jsonify({'error': 'questions must be a non-empty list'}), 400
+        if len(questions) > BATCH_MAX_QUESTIONS:
+            return jsonify({'error': f'At most {BATCH_MAX_QUESTIONS} questions are allowed per batch'}), 400
+        
+        response_mode = data.get('response_mode', DEFAULT_RESPONSE_MODE)
+        if response_mode not in RESPONSE_MODES:
+            return jsonify({'error': f"response_mode must be one of: {', '.join(RESPONSE_MODES)}"}), 400
+        
+        with telemetry.trace_request('api_ask_batch') as trace:
+            results = process_batch([str(question) for question in questions], response_mode)
+            with telemetry.span('serialize'):
+                response = jsonify({'results': results})
+        response.headers['Server-Timing'] = trace.server_timing()
+        return response
+    
+    except Exception as e:
+        logging.error(f"Batch API error: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@main_bp.route('/api/ask/stream', methods=['GET', 'POST'])
+def api_ask_stream():
+    """Server-Sent Events variant of /api/ask that reports each stage as it completes."""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+    else:
+        data = request.args
+    error, question, response_mode = parse_ask_request(data, streaming=True)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    def generate():
+        answer_parts = []
+        try:
+            logging.info(f"Streaming question: {question}")
+            with telemetry.trace_request('api_ask_stream'):
+                for stage, payload in run_question_pipeline(question, response_mode, stream_answer=True):
+                    if stage == 'answer':
+                        answer_parts.append(payload['text'])
+                    yield sse_stage(stage, payload)
+                    if stage == 'error':
+                        return
+            yield _sse_event('done', done_payload(answer_parts))
+        except Exception as e:
+            logging.error(f"Streaming error: {str(e)}")
+            yield _sse_event('error', {'error': f'Error processing question: {str(e)}'})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def _ndjson_response(question, response_mode, defer_narrative):
+    """Stream /api/ask as newline-delimited JSON: stage records, one record per row, then 'done'."""
+    def generate():
+        answer_parts = []
+        try:
+            logging.info(f"Processing question (ndjson): {question}")
+            with telemetry.trace_request('api_ask_ndjson'):
+                for stage, payload in run_question_pipeline(question, response_mode, defer_narrative=defer_narrative):
+                    if stage == 'answer':
+                        answer_parts.append(payload['text'])
+                    yield from ndjson_stage(stage, payload)
+                    if stage == 'error':
+                        return
+            yield _ndjson_line('done', done_payload(answer_parts))
+        except Exception as e:
+            logging.error(f"NDJSON streaming error: {str(e)}")
+            yield _ndjson_line('error', {'error': f'Error processing question: {str(e)}'})
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def parse_ask_request(data, streaming=False):
+    """Validate an /api/ask request body; returns (error, question, response_mode)."""
+    # Any JSON value may arrive, e.g. an array; only an object can hold a question
+    if not isinstance(data, dict):
+        return 'Question is required', None, None
+    if streaming:
+        question = str(data.get('question') or '').strip()
+        if not question:
+            return 'Question is required', None, None
+    else:
+        if 'question' not in data:
+            return 'Question is required', None, None
+        question = str(data['question']).strip()
+        if not question:
+            return 'Question cannot be empty', None, None
+    response_mode = data.get('response_mode', DEFAULT_RESPONSE_MODE)
+    if response_mode not in RESPONSE_MODES:
+        return f"response_mode must be one of: {', '.join(RESPONSE_MODES)}", None, None
+    return None, question, response_mode
+
+def wants_ndjson(data, accept_header):
+    """True if an /api/ask request asks for newline-delimited JSON."""
+    return data.get('format') == 'ndjson' or parse_accept_header(accept_header, MIMEAccept).best == 'application/x-ndjson'
+
+def done_payload(answer_parts):
+    """Payload of the final 'done' record of a streamed answer."""
+    return {'formatted_response': ''.join(answer_parts) or None, 'success': True}
+
+def sse_stage(stage, payload):
+    """The Server-Sent Event for a pipeline stage; 'rows' carries only the first STREAM_PREVIEW_ROWS rows."""
+    if stage == 'rows':
+        rows = payload['raw_result']
+        payload = dict(
+            payload,
+            raw_result=rows[:STREAM_PREVIEW_ROWS],
+            truncated=payload['truncated'] or len(rows) > STREAM_PREVIEW_ROWS
+        )
+    return _sse_event(stage, payload)
+
+def ndjson_stage(stage, payload):
+    """NDJSON chunks for a pipeline stage: 'rows' becomes a header and one 'row' record per row.
+    
+    Answer text is sent in the final 'done' record only.
+    """
+    if stage == 'answer':
+        return
+    if stage == 'rows':
+        rows = payload['raw_result']
+        yield _ndjson_line('rows', {key: value for key, value in payload.items() if key != 'raw_result'})
+        for start in range(0, len(rows), NDJSON_ROWS_PER_CHUNK):
+            yield ''.join(_ndjson_line('row', {'row': row}) for row in rows[start:start + NDJSON_ROWS_PER_CHUNK])
+        return
+    yield _ndjson_line(stage, payload)
+
+def _ndjson_line(record_type, payload):
+    """Serialize one NDJSON record."""
+    return json.dumps({'type': record_type, **payload}, default=str) + '\n'
+
+def _sse_event(event, payload):
+    """Serialize one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+@main_bp.route('/api/narrative/<narrative_id>')
+def api_narrative(narrative_id):
+    """Fetch a deferred LLM narrative, optionally waiting up to ?wait= seconds for it."""
+    wait_seconds = min(request.args.get('wait', 0, type=float), MAX_NARRATIVE_WAIT_SECONDS)
+    narrative = narrative_store.get(narrative_id, wait_seconds)
+    if narrative is None:
+        return jsonify({'error': 'Unknown or expired narrative id'}), 404
+    return jsonify(narrative)
+
 def handle_query():
     """Handle form-based query submission."""
     question = request.form.get('question', '').strip()
@@ -60,124 +263,549 @@ def handle_query():
         flash('An error occurred while processing your question.', 'error')
         return render_template('query.html')
 
-def process_question(question):
-    """Process a natural language question and return the answer."""
+def process_question(question, response_mode=DEFAULT_RESPONSE_MODE, defer_narrative=False):
+    """Process a natural language question and return the answer.
+    
+    response_mode is 'raw' (no narrative), 'template' (formatted locally),
+    'llm' (narrated by Gemini) or 'auto' (template for small results, llm
+    otherwise). With defer_narrative an llm narrative is computed in the
+    background and fetched later from /api/narrative/<narrative_id>.
+    Concurrent calls for the same normalized question and options share
+    one pipeline run and its result.
+    """
+    key = (normalize_question(question), response_mode, defer_narrative)
+    # Deferred narrative ids are only known to this process's narrative store
+    result = question_flight.do(key, _process_question, question, response_mode, defer_narrative,
+                                shared=not defer_narrative)
+    return dict(result, question=question) if 'question' in result else result
+
+def _process_question(question, response_mode, defer_narrative):
     try:
         logging.info(f"Processing question: {question}")
-        
-        # Get database schema information
-        schema_info = get_schema_info()
-        
-        # Generate SQL query using Gemini
-        sql_query = gemini_service.generate_sql_query(question, schema_info)
-        
-        if not sql_query:
-            return {'error': 'Could not generate SQL query from your question. Please try rephrasing.'}
-        
-        logging.info(f"Generated SQL: {sql_query}")
-        
-        # Execute the query
-        query_result = execute_query(sql_query)
-        
-        if query_result is None:
-            return {'error': 'Query execution failed. Please check your question.'}
-        
-        # Generate human-readable response
-        response = gemini_service.format_response(question, sql_query, query_result)
-        
-        return {
-            'question': question,
-            'sql_query': sql_query,
-            'raw_result': query_result,
-            'formatted_response': response,
-            'success': True
-        }
-        
+        return collect_result(question, run_question_pipeline(question, response_mode, defer_narrative=defer_narrative))
     except Exception as e:
         logging.error(f"Error processing question: {str(e)}")
         return {'error': f'Error processing question: {str(e)}'}
 
-def get_schema_info():
-    """Get database schema information for the LLM."""
-    schema_info = {
-        'product_eligibility': {
-            'description': 'Product eligibility for advertising with reasons',
-            'columns': {
-                'eligibility_datetime_utc': 'Date and time when eligibility was checked',
-                'item_id': 'Product item identifier',
-                'eligibility': 'Boolean indicating if product is eligible for ads (TRUE/FALSE)',
-                'message': 'Message explaining why product is not eligible (if applicable)'
-            }
-        },
-        'ad_sales_metrics': {
-            'description': 'Daily advertising performance metrics by product',
-            'columns': {
-                'date': 'Date of the metrics',
-                'item_id': 'Product item identifier',
-                'ad_sales': 'Revenue generated from advertising',
-                'impressions': 'Number of ad impressions shown',
-                'ad_spend': 'Amount spent on advertising',
-                'clicks': 'Number of clicks on ads',
-                'units_sold': 'Number of units sold through ads'
-            }
-        },
-        'total_sales_metrics': {
-            'description': 'Daily total sales performance by product',
-            'columns': {
-                'date': 'Date of the metrics',
-                'item_id': 'Product item identifier',
-                'total_sales': 'Total sales revenue for the product',
-                'total_units_ordered': 'Total number of units ordered'
-            }
-        }
+def collect_result(question, stages):
+    """Fold pipeline stages into the /api/ask result, or the error payload of an 'error' stage."""
+    result = {'question': question}
+    answer_parts = []
+    for stage, payload in stages:
+        if stage == 'error':
+            return payload
+        if stage == 'answer':
+            answer_parts.append(payload['text'])
+        else:
+            result.update(payload)
+    result.update(done_payload(answer_parts))
+    return result
+
+def process_batch(questions, response_mode=DEFAULT_RESPONSE_MODE):
+    """Answer several questions with concurrent SQL generation and one database pass.
+    
+    Distinct questions are translated concurrently on batch_executor, and
+    the resulting queries run once each over one pooled connection with
+    execute_batch. Questions whose query is rejected or fails go through
+    process_question, which repairs the SQL. Returns one result per
+    question, in order; unanswerable questions get an 'error'.
+    """
+    plans = {}
+    order = []
+    for question in questions:
+        question = question.strip()
+        order.append(normalize_question(question) if question else None)
+        if question:
+            plans.setdefault(order[-1], {'question': question})
+    
+    # Canned KPI questions take the fast path; the rest are translated concurrently
+    schema_info = get_schema_info()
+    translations = {}
+    for key, plan in plans.items():
+        match = fast_path.match(plan['question']) if fast_path is not None else None
+        if match is not None:
+            plan.update(match=match, sql_query=match.sql_query, params=match.params, guarded=False)
+        else:
+            translations[key] = _submit(gemini_service.generate_sql_query, plan['question'], schema_info)
+    for key, future in translations.items():
+        plan = plans[key]
+        sql_query = future.result()
+        if not sql_query:
+            plan['error'] = 'Could not generate SQL query from your question. Please try rephrasing.'
+            continue
+        try:
+            plan.update(sql_query=query_guard.prepare_query(sql_query, MAX_RESULT_ROWS + 1), params=None, guarded=True)
+        except QueryRejected:
+            # Left to process_question, which asks Gemini for an allowed query
+            pass
+    
+    # Identical SQL from different questions runs once
+    for plan in plans.values():
+        if 'sql_query' in plan:
+            plan['query_key'] = _query_flight_key(plan['sql_query'], plan['params'], MAX_RESULT_ROWS, plan['guarded'])
+    query_results = execute_batch({
+        plan['query_key']: (plan['sql_query'], plan['params'], plan['guarded'])
+        for plan in plans.values() if 'query_key' in plan
+    })
+    
+    answers = {}
+    for key, plan in plans.items():
+        query_result = query_results.get(plan.get('query_key'))
+        if 'error' in plan:
+            answers[key] = {'error': plan['error']}
+        elif query_result is None:
+            answers[key] = _submit(process_question, plan['question'], response_mode)
+        else:
+            answers[key] = _batch_answer(plan, query_result, response_mode)
+    
+    results = []
+    for question, key in zip(questions, order):
+        if key is None:
+            results.append({'error': 'Question cannot be empty'})
+            continue
+        result = answers[key].result() if isinstance(answers[key], Future) else answers[key]
+        if isinstance(result.get('formatted_response'), Future):
+            result['formatted_response'] = result['formatted_response'].result()
+        results.append(dict(result, question=question.strip()) if 'question' in result else result)
+    return results
+
+def _submit(function, *args):
+    """Run function on batch_executor within a copy of the current trace context."""
+    return batch_executor.submit(contextvars.copy_context().run, function, *args)
+
+def _batch_answer(plan, query_result, response_mode):
+    """The process_question-shaped result of a batched question.
+    
+    An llm narrative is returned as a future for process_batch to collect.
+    """
+    question = plan['question']
+    rows = query_result.rows
+    match = plan.get('match')
+    if match is not None:
+        mode = 'raw' if response_mode == 'raw' else 'template'
+        result = {'question': question, 'sql_query': plan['sql_query'], 'sql_params': plan['params'],
+                  'answered_by': 'fast_path', **_rows_payload(query_result, mode)}
+        formatted_response = match.format_answer(rows) if mode == 'template' else None
+    else:
+        mode = resolve_response_mode(response_mode, rows)
+        result = {'question': question, 'sql_query': plan['sql_query'], 'answered_by': 'gemini',
+                  'repair_attempts': 0, **_rows_payload(query_result, mode)}
+        if mode == 'template':
+            formatted_response = format_result_locally(rows)
+        elif mode == 'llm':
+            formatted_response = _submit(gemini_service.format_response, question, plan['sql_query'],
+                                         rows, query_result.truncated)
+        else:
+            formatted_response = None
+    result['formatted_response'] = formatted_response
+    result['success'] = True
+    return result
+
+def run_question_pipeline(question, response_mode=DEFAULT_RESPONSE_MODE, stream_answer=False, defer_narrative=False):
+    """Run the question pipeline, yielding (stage, payload) as each stage completes.
+    
+    Stages are 'sql', 'rows', then zero or more 'answer' text chunks (or a
+    'narrative' id when deferred), or a single 'error'. With stream_answer
+    the Gemini answer is yielded as it is generated instead of in one piece.
+    The stages come from question_steps; this drives it with the
+    synchronous Gemini client and database engine.
+    """
+    steps = question_steps(question, response_mode, stream_answer, defer_narrative)
+    reply, error = None, None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(reply)
+        except StopIteration:
+            return
+        reply, error = None, None
+        if not isinstance(step, PipelineCall):
+            yield step
+        elif step.operation == 'format_response_stream':
+            for text_chunk in gemini_service.format_response_stream(*step.args):
+                yield 'answer', {'text': text_chunk}
+        else:
+            try:
+                reply = _pipeline_call(step)
+            except Exception as e:
+                error = e
+
+def _pipeline_call(step):
+    operations = {
+        'execute_query': execute_query,
+        'generate_sql': gemini_service.generate_sql_query,
+        'repair_sql': gemini_service.repair_sql_query,
+        'format_response': gemini_service.format_response,
+    }
+    return operations[step.operation](*step.args)
+
+def question_steps(question, response_mode, stream_answer, defer_narrative):
+    """The stage logic of the question pipeline, shared by the WSGI and ASGI apps.
+    
+    Yields (stage, payload) tuples for the caller, and PipelineCall requests
+    for the Gemini and database calls, which the driver performs (blocking or
+    awaited) and sends back the result of, or throws the exception of.
+    'format_response_stream' is answered by the driver yielding the 'answer'
+    chunks itself.
+    """
+    # Answer canned KPI questions directly, without calling Gemini
+    if fast_path is not None:
+        with telemetry.span('fast_path'):
+            match = fast_path.match(question)
+        telemetry.record_cache_lookup('fast_path', match is not None)
+        if match is not None:
+            query_result = yield PipelineCall('execute_query', (match.sql_query, match.params))
+            if query_result is not None:
+                telemetry.annotate(answered_by='fast_path')
+                mode = 'raw' if response_mode == 'raw' else 'template'
+                yield 'sql', {'sql_query': match.sql_query, 'sql_params': match.params, 'answered_by': 'fast_path'}
+                yield 'rows', _rows_payload(query_result, mode)
+                if mode == 'template':
+                    with telemetry.span('format_template'):
+                        answer = match.format_answer(query_result.rows)
+                    yield 'answer', {'text': answer}
+                return
+            logging.warning("Fast path query failed, falling back to Gemini")
+    
+    # Get database schema information
+    schema_info = get_schema_info()
+    
+    # Generate SQL query using Gemini
+    sql_query = yield PipelineCall('generate_sql', (question, schema_info))
+    
+    if not sql_query:
+        yield 'error', {'error': 'Could not generate SQL query from your question. Please try rephrasing.'}
+        return
+    
+    logging.info(f"Generated SQL: {sql_query}")
+    telemetry.annotate(answered_by='gemini')
+    
+    # Execute the query, refusing writes and runaway plans; when it fails,
+    # feed the error back to Gemini for a corrected query
+    deadline = time.monotonic() + SQL_REPAIR_BUDGET_SECONDS
+    repair_attempts = 0
+    while True:
+        try:
+            sql_query = query_guard.prepare_query(sql_query, MAX_RESULT_ROWS + 1)
+            yield 'sql', {'sql_query': sql_query, 'answered_by': 'gemini', 'repair_attempts': repair_attempts}
+            query_result = yield PipelineCall('execute_query', (sql_query, None, None, True, True))
+            break
+        except QueryRejected as e:
+            error = f'Query rejected: {e}'
+            feedback = str(e)
+        except Exception as e:
+            error = 'Query execution failed. Please check your question.'
+            feedback = query_error_message(e)
+        
+        if repair_attempts >= SQL_REPAIR_ATTEMPTS or time.monotonic() >= deadline:
+            gemini_service.forget_sql_query(question)
+            yield 'error', {'error': error}
+            return
+        repair_attempts += 1
+        logging.info(f"Repairing SQL (attempt {repair_attempts}): {feedback}")
+        sql_query = yield PipelineCall('repair_sql', (question, schema_info, sql_query, feedback))
+        if not sql_query:
+            gemini_service.forget_sql_query(question)
+            yield 'error', {'error': error}
+            return
+    
+    if repair_attempts:
+        # Later askers of this question get the working query straight away
+        gemini_service.remember_sql_query(question, schema_info, sql_query)
+    
+    rows, truncated = query_result
+    mode = resolve_response_mode(response_mode, rows)
+    yield 'rows', _rows_payload(query_result, mode)
+    
+    # Generate human-readable response
+    if mode == 'template':
+        with telemetry.span('format_template'):
+            answer = format_result_locally(rows)
+        yield 'answer', {'text': answer}
+    elif mode == 'llm':
+        if defer_narrative:
+            narrative_id = narrative_store.submit(gemini_service.format_response, question, sql_query, rows, truncated)
+            yield 'narrative', {'narrative_id': narrative_id, 'narrative_status': 'pending'}
+        elif stream_answer:
+            yield PipelineCall('format_response_stream', (question, sql_query, rows, truncated))
+        else:
+            answer = yield PipelineCall('format_response', (question, sql_query, rows, truncated))
+            yield 'answer', {'text': answer}
+
+def _rows_payload(query_result, mode):
+    """Payload of the 'rows' stage, including the row cap metadata."""
+    return {
+        'raw_result': query_result.rows,
+        'response_mode': mode,
+        'row_count': len(query_result.rows),
+        'truncated': query_result.truncated
     }
-    return schema_info
 
-def execute_query(sql_query):
-    """Execute SQL query and return results."""
+def read_data_version():
+    """The data_stats version in the database, which loads in every process bump."""
+    with read_engine().connect() as connection:
+        return data_stats.read_version(connection)
+
+def result_cache_key(sql_query, params=None, data_version=0):
+    """Result cache key for a read-only query, or None if it must not be cached."""
+    # Loads bump the data versions of tables, not of the views over them
+    if COMPAT_VIEWS.keys() & set(referenced_tables(sql_query)):
+        return None
+    if sql_query.lower().startswith(('select', 'with')):
+        return result_cache.make_key(sql_query, params, data_version)
+    return None
+
+def fetch_rows(result, max_rows):
+    """Read at most max_rows rows from a result; returns (rows, truncated)."""
+    columns = list(result.keys())
+    rows = []
+    for row in result:
+        if len(rows) == max_rows:
+            return rows, True
+        rows.append(dict(zip(columns, row)))
+    return rows, False
+
+def query_error_message(error):
+    """The database's own message for a failed query, without SQLAlchemy's wrapping."""
+    return str(getattr(error, 'orig', None) or error)
+
+def clean_sql(sql_query):
+    """The query without surrounding whitespace or a trailing semicolon."""
+    sql_query = sql_query.strip()
+    return sql_query[:-1] if sql_query.endswith(';') else sql_query
+
+def cached_query_result(sql_query, params, max_rows, data_version):
+    """(result cache key, cached QueryResult or None) for a query.
+    
+    Repeated read-only queries are served from memory while the data is
+    unchanged; data_version is the data_stats version read for this lookup,
+    so a load by any process misses. The key is None for queries that must
+    not be cached.
+    """
+    cache_key = result_cache_key(sql_query, params, data_version)
+    if cache_key is None:
+        return None, None
+    cached = result_cache.get(cache_key)
+    cache_hit = cached is not None and (not cached.truncated or len(cached.rows) >= max_rows)
+    telemetry.record_cache_lookup('result', cache_hit)
+    if not cache_hit:
+        return cache_key, None
+    logging.info("Result cache hit")
+    return cache_key, QueryResult(cached.rows[:max_rows], cached.truncated or len(cached.rows) > max_rows)
+
+def store_query_result(cache_key, query_result, max_rows):
+    """Cache a freshly run query's result under the key from cached_query_result."""
+    if query_result.truncated:
+        logging.warning(f"Query result truncated at {max_rows} rows")
+    if cache_key is not None:
+        result_cache.put(cache_key, query_result)
+
+def execute_query(sql_query, params=None, max_rows=None, guarded=False, raise_errors=False):
+    """Execute SQL query with optional bound parameters and return a QueryResult.
+    
+    Rows are streamed from a server-side cursor in FETCH_BATCH_SIZE batches
+    and reading stops after max_rows (MAX_RESULT_ROWS by default), with
+    QueryResult.truncated set. Every query runs on a read-only connection
+    under the statement timeout;
+    guarded (LLM-generated) queries are also EXPLAINed first and raise
+    QueryRejected if too expensive. Unparameterized queries over the metric
+    tables run on the columnar engine when one is configured, and
+    concurrent identical queries share one run. Returns None if the query
+    fails, or re-raises the error with raise_errors.
+    """
+    max_rows = max_rows or MAX_RESULT_ROWS
     try:
-        # Clean up the SQL query
-        sql_query = sql_query.strip()
-        if sql_query.endswith(';'):
-            sql_query = sql_query[:-1]
+        sql_query = clean_sql(sql_query)
+        cache_key, cached = cached_query_result(sql_query, params, max_rows, read_data_version())
+        if cached is not None:
+            return cached
         
-        result = db.session.execute(text(sql_query))
+        query_result = query_flight.do(_query_flight_key(sql_query, params, max_rows, guarded),
+                                       _run_query, sql_query, params, max_rows, guarded)
+        store_query_result(cache_key, query_result, max_rows)
+        return query_result
         
-        # Convert result to list of dictionaries
-        rows = []
-        if hasattr(result, 'returns_rows') and result.returns_rows:
-            columns = result.keys()
-            for row in result:
-                row_dict = dict(zip(columns, row))
-                rows.append(row_dict)
+    except QueryRejected:
+        raise
+    except Exception as e:
+        logging.error(f"Query execution error: {str(e)}")
+        if raise_errors:
+            raise
+        return None
+
+def execute_batch(queries, max_rows=None):
+    """Run several queries over one pooled read-only connection.
+    
+    queries maps a key to (sql_query, params, guarded). Results are served
+    from the result cache where possible, guarded queries are EXPLAINed
+    first, and unparameterized single-row aggregates over the same table and
+    filter run as one merged scan (see query_batcher). Returns a dict of
+    key -> QueryResult, or None for queries that were rejected or failed.
+    """
+    max_rows = max_rows or MAX_RESULT_ROWS
+    results = {}
+    pending = {}
+    data_version = read_data_version()
+    for key, (sql_query, params, guarded) in queries.items():
+        cache_key, cached = cached_query_result(sql_query, params, max_rows, data_version)
+        if cached is not None:
+            results[key] = cached
         else:
-            # For non-SELECT queries or when returns_rows is not available
+            pending[key] = (sql_query, params, guarded, cache_key)
+    if not pending:
+        return results
+    
+    with telemetry.span('execute_batch') as span, read_engine().connect() as connection:
+        for key, (sql_query, params, guarded, _) in list(pending.items()):
+            if not guarded:
+                continue
+            try:
+                with telemetry.span('preflight'):
+                    query_guard.preflight(connection, sql_query, params)
+            except Exception as e:
+                logging.warning(f"Batched query not run: {str(e)}")
+                # PostgreSQL refuses further statements in a failed transaction
+                connection.rollback()
+                results[key] = None
+                del pending[key]
+        
+        groups, unmerged = query_batcher.merge_aggregates(
+            {key: sql_query for key, (sql_query, params, _, _) in pending.items() if not params})
+        unmerged += [key for key, (_, params, _, _) in pending.items() if params]
+        for group in groups:
             try:
-                columns = result.keys()
-                for row in result:
-                    row_dict = dict(zip(columns, row))
-                    rows.append(row_dict)
-            except:
-                rows = [{'message': 'Query executed successfully'}]
+                row = _execute_on_database(connection, group.sql_query, None, 1).rows[0]
+                for key, columns in group.members:
+                    results[key] = QueryResult([query_batcher.split_row(row, columns)], False)
+            except Exception as e:
+                logging.warning(f"Merged aggregate query failed, running its queries separately: {str(e)}")
+                connection.rollback()
+                unmerged += [key for key, _ in group.members]
         
-        return rows
+        for key in unmerged:
+            sql_query, params, _, _ = pending[key]
+            try:
+                results[key] = _execute_on_database(connection, sql_query, params, max_rows)
+            except Exception as e:
+                logging.error(f"Query execution error: {str(e)}")
+                connection.rollback()
+                results[key] = None
+        span['queries'] = len(pending)
+        span['merged_scans'] = len(groups)
+    
+    for key, (_, _, _, cache_key) in pending.items():
+        if results[key] is not None:
+            telemetry.QUERY_ROWS.observe(len(results[key].rows), engine='database')
+            store_query_result(cache_key, results[key], max_rows)
+    return results
+
+def _query_flight_key(sql_query, params, max_rows, guarded):
+    return sql_query, json.dumps(params or {}, sort_keys=True, default=str), max_rows, guarded
+
+def _run_query(sql_query, params, max_rows, guarded):
+    # A pooled read-only connection, returned as soon as the rows are read
+    with telemetry.span('execute_query') as span, read_engine().connect() as connection:
+        if guarded:
+            with telemetry.span('preflight'):
+                query_guard.preflight(connection, sql_query, params)
         
+        query_result = None
+        if columnar_engine is not None and columnar_engine.can_execute(sql_query, params):
+            query_result = execute_columnar(connection, sql_query, max_rows)
+        span['engine'] = 'database' if query_result is None else 'columnar'
+        
+        if query_result is None:
+            query_result = _execute_on_database(connection, sql_query, params, max_rows)
+        span['rows'] = len(query_result.rows)
+    telemetry.QUERY_ROWS.observe(len(query_result.rows), engine=span['engine'])
+    return query_result
+
+def _execute_on_database(connection, sql_query, params, max_rows):
+    with query_guard.statement_timeout(connection):
+        result = connection.execute(
+            text(sql_query), params or {},
+            execution_options={'yield_per': FETCH_BATCH_SIZE}
+        )
+        try:
+            if result.returns_rows:
+                return QueryResult(*fetch_rows(result, max_rows))
+            return QueryResult([{'message': 'Query executed successfully'}], False)
+        finally:
+            result.close()
+
+def execute_columnar(connection, sql_query, max_rows):
+    """Run a query on the columnar engine; None if it cannot, so the database is used instead."""
+    try:
+        columnar_engine.refresh(connection, sql_query)
+        return QueryResult(*columnar_engine.execute(sql_query, max_rows, query_guard.QUERY_TIMEOUT_SECONDS))
+    except TimeoutError:
+        raise
     except Exception as e:
-        logging.error(f"Query execution error: {str(e)}")
+        columnar_engine.fallbacks += 1
+        logging.warning(f"Columnar engine could not run the query, using the database: {str(e)}")
         return None
 
 @main_bp.route('/api/stats')
 def api_stats():
-    """Get basic statistics about the data."""
+    """Get basic statistics about the data.
+
+    The counts and totals come from the data_stats row kept by the loaders,
+    whose version changes with every load, so it doubles as the ETag: repeat
+    fetches between loads get a 304 or are served by the browser.
+    """
     try:
+        with db.engine.connect() as connection:
+            data = data_stats.read_stats(connection)
+        if data is None:
+            with db.engine.begin() as connection:
+                data_stats.rebuild_stats(connection)
+                data = data_stats.read_stats(connection)
         stats = {
-            'total_eligibility_records': ProductEligibility.query.count(),
-            'total_ad_records': AdSalesMetrics.query.count(),
-            'total_sales_records': TotalSalesMetrics.query.count(),
-            'total_revenue': db.session.query(db.func.sum(TotalSalesMetrics.total_sales)).scalar() or 0,
-            'total_ad_spend': db.session.query(db.func.sum(AdSalesMetrics.ad_spend)).scalar() or 0,
+            'total_eligibility_records': data['eligibility_records'],
+            'total_ad_records': data['ad_records'],
+            'total_sales_records': data['sales_records'],
+            'total_revenue': data['total_revenue'],
+            'total_ad_spend': data['total_ad_spend'],
+            'data_version': data['version'],
         }
-        return jsonify(stats)
+        response = jsonify(stats)
+        response.headers['Cache-Control'] = f'private, max-age={STATS_MAX_AGE_SECONDS}'
+        response.set_etag(f"data-{data['version']}")
+        return response.make_conditional(request)
     except Exception as e:
         logging.error(f"Stats error: {str(e)}")
         return jsonify({'error': 'Could not retrieve stats'}), 500
+
+@main_bp.route('/api/stats/runtime')
+def api_runtime_stats():
+    """Cache, coalescing and Gemini usage counters of this process; never cached."""
+    stats = {
+        'result_cache': result_cache.stats(),
+        'translation_cache': gemini_service.translation_cache.stats(),
+        'llm_usage': telemetry.llm_usage(),
+        'fast_path': fast_path.stats() if fast_path is not None else None,
+        'columnar_engine': columnar_engine.stats() if columnar_engine is not None else None,
+        'single_flight': {'questions': question_flight.stats(), 'queries': query_flight.stats()},
+    }
+    response = jsonify(stats)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@main_bp.route('/api/pool')
+def api_pool():
+    """Connection pool utilization of the write, read and async engines."""
+    return jsonify(pool_stats())
+
+@main_bp.route('/metrics')
+def metrics():
+    """Stage timings, token, row and cache counters in the Prometheus text format."""
+    return Response(telemetry.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def _pool_readings(key):
+    return lambda: [({'engine': name}, stats.get(key)) for name, stats in pool_stats().items()]
+
+for _key, _documentation in [('size', 'Connections each pool keeps open'),
+                             ('checked_out', 'Connections currently checked out of each pool'),
+                             ('overflow', 'Connections open beyond each pool size')]:
+    telemetry.register(telemetry.Gauge(f'db_pool_{_key}', _documentation, ['engine'], _pool_readings(_key)))
+telemetry.register(telemetry.Gauge('result_cache_bytes', 'Estimated memory held by cached query results', [],
+                                   lambda: [({}, result_cache.stats()['size_bytes'])]))
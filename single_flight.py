@@ -0,0 +1,193 @@
+"""Coalescing of concurrent identical calls.
+
+When a dashboard refresh fires the same question from many tabs at once,
+``SingleFlight.do`` lets the first caller for a key run the pipeline while
+concurrent callers with the same key wait and receive its result (or its
+exception). Nothing is cached: once the call returns, the next caller runs
+it again.
+
+By default calls are coalesced across the threads of one process. With
+SINGLE_FLIGHT_DIR set, calls marked ``shared`` are also coalesced across
+processes (e.g. gunicorn workers) on the same host: the running process
+holds an flock on a per-key lock file in that directory and leaves its
+pickled result next to it, so processes that were waiting on the lock read
+the result instead of running the call again. The directory should only be
+writable by the app.
+"""
+import os
+import time
+import pickle
+import hashlib
+import asyncio
+import logging
+import tempfile
+import threading
+import telemetry
+
+SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', '1') == '1'
+SINGLE_FLIGHT_DIR = os.environ.get('SINGLE_FLIGHT_DIR')
+
+# Lock and result files older than this are removed, at most once per interval
+_PRUNE_AGE_SECONDS = 600
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Shares the result of one in-flight call among concurrent callers with the same key."""
+
+    def __init__(self, name, directory=None, enabled=True):
+        self.name = name
+        self.directory = directory
+        self.enabled = enabled
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, function, *args, shared=False):
+        """Run function(*args), or wait for an identical in-flight call and return its result."""
+        if not self.enabled:
+            return function(*args)
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+        telemetry.record_cache_lookup(self.name, not leader)
+
+        if not leader:
+            with telemetry.span('coalesced_wait'):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if shared and self.directory:
+                call.result = self._do_across_processes(key, function, args)
+            else:
+                call.result = function(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, function, *args):
+        """Async variant of do for coroutine functions; coalesces within the running event loop."""
+        if not self.enabled:
+            return await function(*args)
+
+        future = self._async_calls.get(key)
+        telemetry.record_cache_lookup(self.name, future is not None)
+        if future is not None:
+            self.followers += 1
+            with telemetry.span('coalesced_wait'):
+                # Shielded so a follower that disconnects does not cancel the leader's call
+                return await asyncio.shield(future)
+
+        self.leaders += 1
+        future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await function(*args)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Marks the exception as retrieved when no follower was waiting
+            future.exception()
+            raise
+        finally:
+            del self._async_calls[key]
+
+    def stats(self):
+        """Return how many calls ran and how many were served by another caller's run."""
+        with self._lock:
+            return {
+                'in_flight': len(self._calls) + len(self._async_calls),
+                'leaders': self.leaders,
+                'followers': self.followers,
+                'cross_process': bool(self.directory),
+            }
+
+    def _paths(self, key):
+        digest = hashlib.sha256(f'{self.name}:{key!r}'.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, f'{self.name}-{digest[:32]}')
+        return base + '.lock', base + '.result'
+
+    def _do_across_processes(self, key, function, args):
+        import fcntl
+
+        lock_path, result_path = self._paths(key)
+        waiting_since = time.time()
+        with open(lock_path, 'a+b') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Keeps lock files in use from being pruned
+                os.utime(lock_path)
+                # A result written while we waited for the lock came from another process's run
+                result = self._read_result(result_path, waiting_since)
+                if result is not None:
+                    with self._lock:
+                        self.followers += 1
+                    return result[0]
+                result = function(*args)
+                self._write_result(result_path, result)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                self._prune()
+
+    def _read_result(self, result_path, not_before):
+        try:
+            if os.path.getmtime(result_path) < not_before:
+                return None
+            with open(result_path, 'rb') as file:
+                return (pickle.load(file),)
+        except Exception:
+            return None
+
+    def _write_result(self, result_path, result):
+        try:
+            handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(handle, 'wb') as file:
+                pickle.dump(result, file)
+            os.replace(temp_path, result_path)
+        except Exception as e:
+            # Other processes then run the call themselves
+            logging.warning(f"Could not share {self.name} result across processes: {str(e)}")
+
+    def _prune(self):
+        now = time.time()
+        if now - self._last_prune < _PRUNE_AGE_SECONDS:
+            return
+        self._last_prune = now
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.startswith(f'{self.name}-') and now - entry.stat().st_mtime > _PRUNE_AGE_SECONDS:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def create_single_flight(name):
+    """Build a SingleFlight configured from SINGLE_FLIGHT_ENABLED and SINGLE_FLIGHT_DIR."""
+    directory = SINGLE_FLIGHT_DIR
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return SingleFlight(name, directory=directory, enabled=SINGLE_FLIGHT_ENABLED)
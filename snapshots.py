@@ -0,0 +1,228 @@
+"""Typed, compressed columnar snapshots of the attached_assets CSV files.
+
+A build step parses each CSV once and writes an Arrow IPC file (zstd
+compressed, one typed column per model column) next to the data. At startup
+``load_snapshots`` memory-maps the snapshots and bulk inserts them into
+empty tables, so a fresh database (e.g. a serverless cold start) gets its
+data without parsing any CSV text. The CSV's load watermark is recorded as
+well, so incremental_loader only reads rows appended after the snapshot.
+
+Requires the optional pyarrow package; without it snapshots are skipped
+and the CSV loaders are used as before.
+
+Usage (from the repository root):
+    python -m snapshots                      # rebuild attached_assets/snapshots/*.arrow
+    python -m snapshots --compression none   # uncompressed, zero-copy memory maps
+"""
+import os
+import logging
+import argparse
+from datetime import datetime
+from sqlalchemy import select, literal, Integer, BigInteger, Float, Numeric, Date, DateTime, Boolean
+from database import db
+from models import LoadWatermark
+from result_cache import bump_data_version
+from rollups import SOURCE_TABLES, refresh_rollups, bump_rollup_versions
+from data_stats import record_load
+import data_loader
+import incremental_loader
+
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', 'attached_assets/snapshots')
+
+SOURCES = {
+    'product_eligibility': data_loader.ELIGIBILITY_CSV,
+    'ad_sales_metrics': data_loader.AD_SALES_CSV,
+    'total_sales_metrics': data_loader.TOTAL_SALES_CSV,
+}
+
+
+def import_pyarrow():
+    """Import pyarrow on first use, or return None if it is not installed."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.compute
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def snapshot_path(table_name, directory=None):
+    """Path of the snapshot file for a table."""
+    return os.path.join(directory or SNAPSHOT_DIR, f'{table_name}.arrow')
+
+
+def _arrow_type(column):
+    pyarrow = import_pyarrow()
+    column_type = column.type
+    if isinstance(column_type, (Integer, BigInteger)):
+        return pyarrow.int64()
+    if isinstance(column_type, (Float, Numeric)):
+        return pyarrow.float64()
+    if isinstance(column_type, DateTime):
+        return pyarrow.timestamp('s')
+    if isinstance(column_type, Date):
+        return pyarrow.date32()
+    if isinstance(column_type, Boolean):
+        return pyarrow.bool_()
+    # Free text repeats a handful of messages; dictionary encoding stores each once
+    return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+
+
+def build_snapshot(table_name, csv_path=None, directory=None, compression='zstd'):
+    """Parse a CSV feed and write its snapshot. Returns the number of rows written."""
+    pyarrow = import_pyarrow()
+    csv_path = csv_path or SOURCES[table_name]
+    table, columns = incremental_loader.FEEDS[table_name]
+
+    with open(csv_path, 'r', encoding='utf-8', newline='') as file:
+        rows = list(data_loader.iter_csv_rows(file, columns))
+
+    fields = [pyarrow.field(name, _arrow_type(table.c[name]), nullable=table.c[name].nullable)
+              for name, _ in columns]
+    source_size = os.path.getsize(csv_path)
+    max_date = max((incremental_loader._row_date(row) for row in rows), default=None)
+    schema = pyarrow.schema(fields, metadata={
+        'source_file': os.path.basename(csv_path),
+        'source_size': str(source_size),
+        'source_head_hash': incremental_loader._head_hash(csv_path, source_size),
+        'max_date': max_date.isoformat() if max_date else '',
+    })
+    arrow_table = pyarrow.Table.from_pylist(rows, schema=schema)
+
+    path = snapshot_path(table_name, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    options = pyarrow.ipc.IpcWriteOptions(compression=None if compression == 'none' else compression)
+    with pyarrow.OSFile(path, 'wb') as sink, pyarrow.ipc.new_file(sink, schema, options=options) as writer:
+        writer.write_table(arrow_table)
+
+    logging.info(f"Wrote {len(rows)} {table_name} rows to {path} ({os.path.getsize(path)} bytes)")
+    return len(rows)
+
+
+def read_snapshot(table_name, directory=None):
+    """Memory-map a snapshot and return it as an Arrow table, or None if there is none."""
+    pyarrow = import_pyarrow()
+    path = snapshot_path(table_name, directory)
+    if pyarrow is None or not os.path.exists(path):
+        return None
+    with pyarrow.memory_map(path, 'r') as source:
+        return pyarrow.ipc.open_file(source).read_all()
+
+
+def _insert_batch(connection, table, batch):
+    """Insert a record batch with a driver-level executemany of plain tuples.
+
+    Skipping SQLAlchemy's per-row parameter processing is most of the win
+    over loading the CSV, so temporal columns are pre-formatted here the way
+    SQLAlchemy stores them in SQLite.
+    """
+    pyarrow = import_pyarrow()
+    columns = []
+    for field, column in zip(batch.schema, batch.columns):
+        if pyarrow.types.is_timestamp(field.type):
+            column = pyarrow.compute.strftime(column, format='%Y-%m-%d %H:%M:%S.000000')
+        elif pyarrow.types.is_date(field.type):
+            column = column.cast(pyarrow.string())
+        columns.append(column.to_pylist())
+    names = ', '.join(batch.schema.names)
+    placeholders = ', '.join('?' for _ in batch.schema.names)
+    connection.exec_driver_sql(f"INSERT INTO {table.name} ({names}) VALUES ({placeholders})", list(zip(*columns)))
+
+
+def _copy_batch(connection, table, batch):
+    columns = [(name, None) for name in batch.schema.names]
+    data_loader._copy_chunk(connection, table, columns, batch.to_pylist())
+
+
+def _matches_csv(metadata, csv_path):
+    """True if the CSV is missing, or still starts with exactly the bytes the snapshot was built from."""
+    if not os.path.exists(csv_path):
+        return True
+    source_size = int(metadata[b'source_size'])
+    return (os.path.getsize(csv_path) >= source_size
+            and incremental_loader._head_hash(csv_path, source_size) == metadata[b'source_head_hash'].decode())
+
+
+def load_snapshot(table_name, csv_path=None, chunk_size=None):
+    """Bulk insert a table's snapshot if the table is empty.
+
+    Returns the number of rows loaded, or 0 if the table already has data,
+    there is no usable snapshot, or the CSV has been rewritten since.
+    """
+    csv_path = os.path.abspath(csv_path or SOURCES[table_name])
+    table, _ = incremental_loader.FEEDS[table_name]
+    chunk_size = chunk_size or data_loader.DEFAULT_CHUNK_SIZE
+    track_rollups = table_name in SOURCE_TABLES
+    watermarks = LoadWatermark.__table__
+
+    with db.engine.begin() as connection:
+        # Checked first so started databases never touch pyarrow or the snapshot;
+        # reading one row rather than counting them keeps this cheap on full tables
+        if connection.execute(select(literal(1)).select_from(table).limit(1)).first() is not None:
+            return 0
+
+        arrow_table = read_snapshot(table_name)
+        if arrow_table is None:
+            return 0
+        metadata = arrow_table.schema.metadata
+        if not _matches_csv(metadata, csv_path):
+            logging.info(f"Snapshot of {table_name} is older than {csv_path}; loading the CSV instead")
+            return 0
+
+        insert_batch = _copy_batch if connection.dialect.name == 'postgresql' else _insert_batch
+        for batch in arrow_table.to_batches(max_chunksize=chunk_size):
+            insert_batch(connection, table, batch)
+
+        if track_rollups:
+            refresh_rollups(connection,
+                            set(arrow_table.column('date').to_pylist()),
+                            set(arrow_table.column('item_id').to_pylist()))
+        # The table was empty, so every row is new
+        record_load(connection, table_name, arrow_table.num_rows)
+
+        # Continue incremental loads of the CSV from where the snapshot ends
+        max_date = metadata[b'max_date'].decode()
+        values = {
+            'table_name': table_name,
+            'head_hash': metadata[b'source_head_hash'].decode(),
+            'byte_offset': int(metadata[b'source_size']),
+            'max_date': datetime.strptime(max_date, '%Y-%m-%d').date() if max_date else None,
+            'rows_loaded': arrow_table.num_rows,
+            'updated_at': datetime.utcnow(),
+        }
+        connection.execute(watermarks.delete().where(watermarks.c.file_path == csv_path))
+        connection.execute(watermarks.insert().values(file_path=csv_path, **values))
+
+    logging.info(f"Loaded {arrow_table.num_rows} {table_name} records from snapshot")
+    bump_data_version(table_name)
+    if track_rollups:
+        bump_rollup_versions()
+    return arrow_table.num_rows
+
+
+def load_snapshots():
+    """Load every available snapshot into its table if empty. Returns the rows loaded."""
+    loaded = 0
+    for table_name in SOURCES:
+        try:
+            loaded += load_snapshot(table_name)
+        except Exception as e:
+            logging.error(f"Error loading {table_name} snapshot: {str(e)}")
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build columnar snapshots of the CSV feeds.')
+    parser.add_argument('--output', default=SNAPSHOT_DIR, help='directory to write snapshots to')
+    parser.add_argument('--compression', choices=['zstd', 'lz4', 'none'], default='zstd')
+    args = parser.parse_args()
+
+    if import_pyarrow() is None:
+        parser.error('the pyarrow package is not installed')
+    for table_name, csv_path in SOURCES.items():
+        build_snapshot(table_name, csv_path, args.output, args.compression)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Construction of the SQL generation prompt.
+
+A ``SqlPrompt`` is built once per schema version (see
+translation_cache.schema_fingerprint) with the static parts pre-rendered:
+the instructions, one description block per table, and the examples with
+the tables they read. ``for_question`` then assembles a system instruction
+with only the tables, and the examples over them, that a cheap keyword match
+finds relevant to the question, falling back to the whole schema when
+nothing matches. ``full_instruction`` is the unpruned prompt, used as the
+shared prefix registered with Gemini context caching.
+
+The instructions come first and the question-specific tables after them, so
+consecutive prompts share as long a prefix as possible.
+"""
+import re
+from translation_cache import schema_fingerprint
+from result_cache import referenced_tables
+
+INSTRUCTIONS = """
+You are an expert SQL query generator for an e-commerce database. Given a natural language question, generate a precise SQL query.
+
+Important Guidelines:
+1. Only generate SELECT queries for data retrieval
+2. Use proper JOIN statements when querying multiple tables using item_id as the join key
+3. Use aggregate functions (SUM, AVG, COUNT, MAX, MIN) appropriately
+4. For RoAS (Return on Ad Spend) calculation: SUM(ad_sales) / SUM(ad_spend)
+5. For CPC (Cost Per Click) calculation: ad_spend / clicks (when clicks > 0)
+6. Always use proper WHERE clauses when filtering is needed
+7. Return only the SQL query without any explanation or formatting
+8. Do not include semicolons at the end
+9. Use proper column aliases for calculated fields
+10. Use item_id to identify products across tables
+11. Prefer the rollup_* tables for sums and ratios of sums (totals, RoAS, overall CPC) by day, week, product or all time; use the raw tables only for per-row conditions or metrics the rollups do not hold
+"""
+
+EXAMPLES = [
+    ('Total sales', "SELECT total_sales FROM rollup_all_time_metrics"),
+    ('RoAS calculation', "SELECT (ad_sales / NULLIF(ad_spend, 0)) as roas FROM rollup_all_time_metrics"),
+    ('Daily total sales', "SELECT date, total_sales FROM rollup_daily_metrics ORDER BY date"),
+    ('Highest CPC', "SELECT item_id, MAX(ad_spend / NULLIF(clicks, 0)) as highest_cpc FROM ad_sales_metrics "
+                    "WHERE clicks > 0 GROUP BY item_id ORDER BY highest_cpc DESC LIMIT 1"),
+    ('Products with most ad spend', "SELECT item_id, ad_spend as total_spend FROM rollup_item_metrics "
+                                    "ORDER BY total_spend DESC LIMIT 10"),
+]
+
+# Words that point at a table besides its column names
+TABLE_KEYWORDS = {
+    'product_eligibility': {'eligible', 'eligibility', 'ineligible', 'approved', 'approval', 'reason', 'reasons',
+                            'why', 'status', 'message'},
+    'ad_sales_metrics': {'ad', 'ads', 'advertising', 'advertised', 'roas', 'cpc', 'click', 'clicks', 'impression',
+                         'impressions', 'spend', 'spent', 'campaign', 'campaigns'},
+    'total_sales_metrics': {'sales', 'revenue', 'sold', 'units', 'ordered', 'orders', 'total'},
+}
+# Rollups are offered when the question asks for a metric at their grain
+ROLLUP_GRAINS = {
+    'rollup_daily_metrics': {'day', 'days', 'daily', 'date', 'dates', 'trend'},
+    'rollup_weekly_metrics': {'week', 'weeks', 'weekly'},
+    'rollup_item_metrics': {'product', 'products', 'item', 'items', 'each', 'top', 'best', 'worst', 'highest',
+                            'lowest', 'most', 'least'},
+    'rollup_all_time_metrics': {'total', 'totals', 'overall', 'all', 'entire'},
+}
+# Columns every fact table has, which say nothing about which one a question needs
+_SHARED_COLUMNS = {'date', 'item_id'}
+_WORD = re.compile(r'[a-z_]+')
+
+
+def render_table(table_name, table_info):
+    """The prompt's description block for one table."""
+    text = f"\nTable: {table_name}\n"
+    text += f"Description: {table_info['description']}\n"
+    text += "Columns:\n"
+    for col_name, col_desc in table_info['columns'].items():
+        text += f"  - {col_name}: {col_desc}\n"
+    return text
+
+
+class SqlPrompt:
+    """The SQL generation prompt for one schema version."""
+
+    def __init__(self, schema_info):
+        self.fingerprint = schema_fingerprint(schema_info)
+        self.table_blocks = {name: render_table(name, info) for name, info in schema_info.items()}
+        self.keywords = {
+            name: TABLE_KEYWORDS.get(name, set()) | (set(info['columns']) - _SHARED_COLUMNS)
+            for name, info in schema_info.items() if name not in ROLLUP_GRAINS
+        }
+        self.examples = [(f"- {description}: {sql}\n", set(referenced_tables(sql))) for description, sql in EXAMPLES]
+        self.full_instruction = self._instruction(self.table_blocks)
+
+    def relevant_tables(self, question):
+        """Tables whose keywords appear in the question, in schema order; all tables if none do."""
+        words = set(_WORD.findall(question.lower()))
+        tables = {name for name, keywords in self.keywords.items() if words & keywords}
+        if not tables:
+            return list(self.table_blocks)
+        # Rollups only hold the ad and total sales metrics
+        if tables & {'ad_sales_metrics', 'total_sales_metrics'}:
+            tables |= {name for name, grain in ROLLUP_GRAINS.items() if name in self.table_blocks and words & grain}
+        return [name for name in self.table_blocks if name in tables]
+
+    def for_question(self, question):
+        """System instruction with only the tables and examples relevant to the question."""
+        tables = self.relevant_tables(question)
+        if len(tables) == len(self.table_blocks):
+            return self.full_instruction
+        return self._instruction(tables)
+
+    def _instruction(self, tables):
+        tables = set(tables)
+        schema_description = ''.join(block for name, block in self.table_blocks.items() if name in tables)
+        examples = ''.join(text for text, used in self.examples if used <= tables)
+        instruction = f"{INSTRUCTIONS}\nDatabase Schema:\n{schema_description}"
+        if examples:
+            instruction += f"\nExample queries for reference:\n{examples}"
+        return instruction
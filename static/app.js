@@ -128,6 +128,47 @@ class ApiClient {
         }
     }
     
+    // Stream /api/ask/stream, calling onEvent(eventName, data) for each Server-Sent Event
+    static async askQuestionStream(question, onEvent) {
+        const response = await fetch('/api/ask/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
+            },
+            body: JSON.stringify({ question: question })
+        });
+        
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                let eventName = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(function(line) {
+                    if (line.startsWith('event: ')) eventName = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                onEvent(eventName, data ? JSON.parse(data) : {});
+            }
+        }
+    }
+    
     static async getStats() {
         try {
             const response = await fetch('/api/stats');
@@ -159,6 +200,14 @@ function enhanceForm() {
             return;
         }
         
+        // Render the answer progressively when the page supports it
+        const streamContainer = document.getElementById('streamResult');
+        if (form.dataset.stream === 'true' && streamContainer && window.ReadableStream) {
+            e.preventDefault();
+            streamQuestion(question, streamContainer, submitBtn);
+            return;
+        }
+        
         // Show loading state
         if (submitBtn) {
             const originalText = submitBtn.innerHTML;
@@ -174,6 +223,92 @@ function enhanceForm() {
     });
 }
 
+// Ask a question over the streaming endpoint and fill in each section as its event arrives
+async function streamQuestion(question, container, submitBtn) {
+    const originalText = submitBtn ? submitBtn.innerHTML : '';
+    if (submitBtn) {
+        submitBtn.innerHTML = '<span class="spinner-border spinner-border-sm me-2"></span>Processing...';
+        submitBtn.disabled = true;
+    }
+    
+    // Hide any server-rendered result from a previous form submission
+    const serverResult = document.getElementById('serverResult');
+    if (serverResult) serverResult.remove();
+    
+    const answerEl = container.querySelector('[data-stream-answer]');
+    const sqlEl = container.querySelector('[data-stream-sql]');
+    const rowsEl = container.querySelector('[data-stream-rows]');
+    container.querySelector('[data-stream-question]').textContent = question;
+    answerEl.textContent = 'Generating SQL...';
+    sqlEl.textContent = '';
+    rowsEl.textContent = '';
+    container.classList.remove('d-none');
+    
+    let answerStarted = false;
+    
+    try {
+        await ApiClient.askQuestionStream(question, function(eventName, data) {
+            if (eventName === 'sql') {
+                sqlEl.textContent = data.sql_query;
+                answerEl.textContent = 'Running query...';
+            } else if (eventName === 'rows') {
+                renderRows(rowsEl, data.raw_result, data.row_count);
+                answerEl.textContent = 'Writing answer...';
+            } else if (eventName === 'answer') {
+                if (!answerStarted) {
+                    answerEl.textContent = '';
+                    answerStarted = true;
+                }
+                answerEl.textContent += data.text;
+            } else if (eventName === 'done') {
+                answerEl.textContent = data.formatted_response;
+            } else if (eventName === 'error') {
+                answerEl.textContent = data.error;
+                showNotification(data.error, 'error');
+            }
+        });
+    } catch (error) {
+        console.error('Streaming error:', error);
+        answerEl.textContent = 'An error occurred while processing your question.';
+        showNotification('An error occurred while processing your question.', 'error');
+    } finally {
+        if (submitBtn) {
+            submitBtn.innerHTML = originalText;
+            submitBtn.disabled = false;
+        }
+    }
+}
+
+// Render result rows into a table
+function renderRows(container, rows, rowCount) {
+    container.textContent = '';
+    if (!rows || rows.length === 0) return;
+    
+    const table = document.createElement('table');
+    table.className = 'table table-striped table-sm';
+    const headerRow = table.createTHead().insertRow();
+    Object.keys(rows[0]).forEach(function(key) {
+        const th = document.createElement('th');
+        th.textContent = key;
+        headerRow.appendChild(th);
+    });
+    const body = table.createTBody();
+    rows.forEach(function(row) {
+        const tr = body.insertRow();
+        Object.values(row).forEach(function(value) {
+            tr.insertCell().textContent = value;
+        });
+    });
+    container.appendChild(table);
+    
+    if (rowCount > rows.length) {
+        const note = document.createElement('small');
+        note.className = 'text-muted';
+        note.textContent = `Showing ${rows.length} of ${rowCount} rows`;
+        container.appendChild(note);
+    }
+}
+
 // Initialize enhanced form handling
 document.addEventListener('DOMContentLoaded', enhanceForm);
 
@@ -183,7 +318,12 @@ document.addEventListener('keydown', function(e) {
     if ((e.ctrlKey || e.metaKey) && e.key === 'Enter') {
         const form = document.querySelector('form[method="POST"]');
         if (form) {
-            form.submit();
+            // requestSubmit fires the submit handler, so streaming still applies
+            if (form.requestSubmit) {
+                form.requestSubmit();
+            } else {
+                form.submit();
+            }
         }
     }
 });
@@ -0,0 +1,317 @@
+"""Request tracing, stage timing and Prometheus metrics for the question pipeline.
+
+Each stage of a question (fast path, SQL generation, query execution,
+repair, narrative, serialization) runs inside ``span(stage)``, which records
+its duration in the ``ask_stage_duration_seconds`` histogram and in the
+current request's trace. ``trace_request`` wraps a whole request, logs one
+line with the per-stage breakdown and provides a Server-Timing header.
+``render_metrics`` renders every metric in the Prometheus text format for
+the /metrics endpoint; metrics are per process.
+
+With OTEL_SPANS_ENABLED=1 and the opentelemetry-api package installed,
+every request and stage is also emitted as an OpenTelemetry span; exporting
+them is left to the OpenTelemetry SDK configuration (e.g. opentelemetry-instrument).
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+OTEL_SPANS_ENABLED = os.environ.get('OTEL_SPANS_ENABLED', '0') == '1'
+
+# Seconds; LLM calls dominate the upper buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 5000, 10000, 100000)
+
+
+def _label_text(label_names, label_values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, '') for name in self.label_names), 0)
+
+    def values(self):
+        """Current value of every label combination."""
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_label_text(self.label_names, key)} {_number(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_number(float(bound))}"'
+                yield f"{self.name}_bucket{_label_text(self.label_names, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_label_text(self.label_names, key)} {_number(total)}"
+            yield f"{self.name}_count{_label_text(self.label_names, key)} {count}"
+
+
+class Gauge:
+    """Gauge whose samples are read from a callback at scrape time.
+
+    The callback returns (labels dict, value) pairs.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, label_names, collect):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.collect = collect
+
+    def samples(self):
+        try:
+            readings = list(self.collect())
+        except Exception as e:
+            logging.warning(f"Could not collect {self.name}: {str(e)}")
+            return
+        for labels, value in readings:
+            if value is None:
+                continue
+            key = tuple(labels.get(name, '') for name in self.label_names)
+            yield f"{self.name}{_label_text(self.label_names, key)} {_number(value)}"
+
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def register(metric):
+    """Add a metric to the /metrics output and return it."""
+    with _registry_lock:
+        if all(existing.name != metric.name for existing in _registry):
+            _registry.append(metric)
+    return metric
+
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_SECONDS = register(Histogram(
+    'ask_request_duration_seconds', 'End-to-end latency of question requests', ['endpoint', 'answered_by']))
+STAGE_SECONDS = register(Histogram(
+    'ask_stage_duration_seconds', 'Time spent in each question pipeline stage', ['stage']))
+LLM_CALLS = register(Counter(
+    'llm_calls_total', 'LLM calls by operation', ['operation']))
+LLM_TOKENS = register(Counter(
+    'llm_tokens_total', 'LLM prompt (in), cached prompt (cached) and response (out) tokens',
+    ['operation', 'direction']))
+QUERY_ROWS = register(Histogram(
+    'query_rows_returned', 'Rows returned per executed query', ['engine'], buckets=ROW_BUCKETS))
+CACHE_LOOKUPS = register(Counter(
+    'cache_lookups_total', 'Cache lookups by cache and result', ['cache', 'result']))
+
+
+class Trace:
+    """The stage spans recorded for one request."""
+
+    def __init__(self, endpoint):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.endpoint = endpoint
+        self.attributes = {}
+        self.spans = []
+        self.started = time.perf_counter()
+        self.otel_span = None
+
+    def server_timing(self):
+        """Server-Timing header value with the duration of each stage in milliseconds."""
+        return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds, _ in self.spans)
+
+    def summary(self):
+        stages = ' '.join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds, _ in self.spans)
+        total = (time.perf_counter() - self.started) * 1000
+        return f"Trace {self.trace_id} {self.endpoint}: {stages} total={total:.1f}ms"
+
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_tracer = None
+
+
+def _get_tracer():
+    global _tracer, OTEL_SPANS_ENABLED
+    if _tracer is None and OTEL_SPANS_ENABLED:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            logging.warning("OTEL_SPANS_ENABLED=1 but opentelemetry-api is not installed")
+            OTEL_SPANS_ENABLED = False
+            return None
+        _tracer = trace.get_tracer('ecommerce-ai-agent')
+    return _tracer
+
+
+def _start_otel_span(name, parent=None):
+    tracer = _get_tracer()
+    if tracer is None:
+        return None
+    from opentelemetry import trace
+    # Started without making it current, so it is safe across generator yields and tasks
+    context = trace.set_span_in_context(parent) if parent is not None else None
+    return tracer.start_span(name, context=context)
+
+
+def _end_otel_span(otel_span, attributes):
+    if otel_span is None:
+        return
+    for key, value in attributes.items():
+        if isinstance(value, (str, bool, int, float)):
+            otel_span.set_attribute(key, value)
+    otel_span.end()
+
+
+def current_trace():
+    """The trace of the request being handled, or None."""
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_request(endpoint):
+    """Trace one request: yields its Trace and records its total latency on exit."""
+    trace = Trace(endpoint)
+    trace.otel_span = _start_otel_span(endpoint)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        elapsed = time.perf_counter() - trace.started
+        REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, answered_by=trace.attributes.get('answered_by', 'none'))
+        _end_otel_span(trace.otel_span, dict(trace.attributes, trace_id=trace.trace_id))
+        logging.info(trace.summary())
+
+
+@contextmanager
+def span(stage, **attributes):
+    """Time a pipeline stage; yields a dict the caller can add attributes to (rows, tokens, cache)."""
+    trace = _current_trace.get()
+    otel_span = _start_otel_span(stage, trace.otel_span if trace is not None else None)
+    started = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if trace is not None:
+            trace.spans.append((stage, elapsed, attributes))
+        _end_otel_span(otel_span, attributes)
+
+
+def annotate(**attributes):
+    """Set attributes on the current request's trace (e.g. answered_by)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def record_llm_usage(operation, usage_metadata, attributes=None):
+    """Count and log the prompt, cached and response tokens of a response's usage_metadata."""
+    LLM_CALLS.inc(operation=operation)
+    if usage_metadata is None:
+        return
+    tokens_in = getattr(usage_metadata, 'prompt_token_count', None) or 0
+    tokens_cached = getattr(usage_metadata, 'cached_content_token_count', None) or 0
+    tokens_out = getattr(usage_metadata, 'candidates_token_count', None) or 0
+    LLM_TOKENS.inc(tokens_in, operation=operation, direction='in')
+    LLM_TOKENS.inc(tokens_cached, operation=operation, direction='cached')
+    LLM_TOKENS.inc(tokens_out, operation=operation, direction='out')
+    logging.info(f"{operation}: {tokens_in} input tokens ({tokens_cached} cached), {tokens_out} output tokens")
+    if attributes is not None:
+        attributes['tokens_in'] = tokens_in
+        attributes['tokens_cached'] = tokens_cached
+        attributes['tokens_out'] = tokens_out
+
+
+def llm_usage():
+    """Calls and token totals per LLM operation, with the mean input tokens per call."""
+    usage = {}
+    for (operation,), calls in LLM_CALLS.values().items():
+        tokens = {direction: LLM_TOKENS.value(operation=operation, direction=direction)
+                  for direction in ('in', 'cached', 'out')}
+        usage[operation] = {
+            'calls': calls,
+            'input_tokens': tokens['in'],
+            'cached_input_tokens': tokens['cached'],
+            'output_tokens': tokens['out'],
+            'mean_input_tokens': round(tokens['in'] / calls, 1) if calls else 0.0,
+        }
+    return usage
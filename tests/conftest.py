@@ -0,0 +1,22 @@
+"""Point the app at a throwaway SQLite database before anything imports it."""
+import os
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_data_dir = tempfile.mkdtemp(prefix='ecommerce-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_data_dir, 'test.db')}"
+os.environ['SNAPSHOT_AUTOLOAD'] = '0'
+os.environ['LLM_BACKEND'] = 'stub'
+os.environ.setdefault('GEMINI_API_KEY', 'test')
+os.environ['JOB_STORE_PATH'] = os.path.join(_data_dir, 'jobs.db')
+
+
+@pytest.fixture
+def app():
+    from main import app
+
+    with app.app_context():
+        yield app
@@ -0,0 +1,66 @@
+"""The ASGI app answers /api/ask like the Flask app, including NDJSON."""
+import json
+import asyncio
+import pytest
+
+
+def _call_asgi(path, payload, headers=()):
+    import asgi
+
+    messages = [{'type': 'http.request', 'body': json.dumps(payload).encode('utf-8'), 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'query_string': b'', 'headers': list(headers)}
+    asyncio.run(asgi.app(scope, receive, send))
+    response_headers = dict(sent[0]['headers'])
+    return sent[0]['status'], response_headers, b''.join(message.get('body', b'') for message in sent[1:])
+
+
+def _records(body):
+    return [json.loads(line) for line in body.decode('utf-8').splitlines()]
+
+
+@pytest.mark.parametrize('payload, headers', [
+    ({'question': 'which products get the most clicks', 'format': 'ndjson'}, ()),
+    ({'question': 'which products get the most clicks'}, [(b'accept', b'application/x-ndjson')]),
+])
+def test_ask_streams_ndjson_like_flask(app, payload, headers):
+    status, response_headers, body = _call_asgi('/api/ask', payload, headers)
+    assert status == 200
+    assert response_headers[b'content-type'] == b'application/x-ndjson'
+
+    flask_response = app.test_client().post('/api/ask', json=payload, headers=[
+        (key.decode('latin-1'), value.decode('latin-1')) for key, value in headers])
+    assert flask_response.mimetype == 'application/x-ndjson'
+    assert _records(body) == _records(flask_response.data)
+    assert _records(body)[-1]['type'] == 'done'
+
+
+def test_ask_returns_json_without_ndjson(app):
+    status, response_headers, body = _call_asgi('/api/ask', {'question': 'which products get the most clicks'})
+    assert status == 200
+    assert response_headers[b'content-type'] == b'application/json'
+    assert json.loads(body)['success'] is True
+
+
+def test_ask_rejects_empty_question(app):
+    status, _, body = _call_asgi('/api/ask', {'question': '  '})
+    assert status == 400
+    assert json.loads(body) == {'error': 'Question cannot be empty'}
+
+
+@pytest.mark.parametrize('path', ['/api/ask', '/api/ask/stream'])
+def test_non_object_body_is_rejected(app, path):
+    status, _, body = _call_asgi(path, [1])
+    assert status == 400
+    assert json.loads(body) == {'error': 'Question is required'}
+
+    response = app.test_client().post(path, json=[1])
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Question is required'}
@@ -0,0 +1,38 @@
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter so modules imported by other tests don't count
+COLD_START = '''
+import sys, json
+import api.index as serverless
+
+client = serverless.app.test_client()
+client.get('/')
+client.get('/health')
+state = {
+    'gemini_service': serverless._gemini_service is not None,
+    'database_ready': serverless._database_ready,
+    'migrations_imported': 'migrations' in sys.modules,
+}
+serverless.get_gemini_service()
+state['genai_imported'] = 'google.genai' in sys.modules
+print(json.dumps(state))
+'''
+
+
+def test_page_and_health_skip_the_gemini_client_and_schema_setup():
+    env = dict(os.environ, LLM_BACKEND='gemini')
+    output = subprocess.run([sys.executable, '-c', COLD_START], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+
+    assert json.loads(output.splitlines()[-1]) == {
+        'gemini_service': False,
+        'database_ready': False,
+        'migrations_imported': False,
+        # Creating the service does not create the client either
+        'genai_imported': False,
+    }
@@ -0,0 +1,40 @@
+from datetime import date
+import pytest
+from sqlalchemy import create_engine
+from models import ProductEligibility, AdSalesMetrics, TotalSalesMetrics, AllTimeMetricsRollup, DataStats
+import data_stats
+
+pytest.importorskip('duckdb')
+from columnar_engine import ColumnarEngine
+
+SQL = 'SELECT SUM(clicks) AS clicks FROM ad_sales_metrics'
+
+
+def _insert(connection, item_id, clicks):
+    connection.execute(AdSalesMetrics.__table__.insert(), [{
+        'date': date(2030, 1, 1), 'item_id': item_id, 'ad_sales': 0, 'impressions': 0, 'ad_spend': 0,
+        'clicks': clicks, 'units_sold': 0,
+    }])
+
+
+def test_load_by_another_process_refreshes_the_copy():
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        for model in (ProductEligibility, AdSalesMetrics, TotalSalesMetrics, AllTimeMetricsRollup, DataStats):
+            model.__table__.create(bind=connection)
+        _insert(connection, 1, 5)
+        data_stats.rebuild_stats(connection)
+
+    columnar = ColumnarEngine([AdSalesMetrics])
+    with engine.connect() as connection:
+        columnar.refresh(connection, SQL)
+    assert columnar.execute(SQL, 10, 5) == ([{'clicks': 5}], False)
+
+    # As another worker's load would: rows and data_stats change, this process's versions do not
+    with engine.begin() as connection:
+        _insert(connection, 2, 7)
+        data_stats.record_load(connection, 'ad_sales_metrics', 1)
+
+    with engine.connect() as connection:
+        columnar.refresh(connection, SQL)
+    assert columnar.execute(SQL, 10, 5) == ([{'clicks': 12}], False)
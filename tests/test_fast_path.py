@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import create_engine, text
+from models import AdSalesMetrics
+import data_loader
+import sql_prompt
+from fast_path import FastPathMatcher
+
+
+@pytest.fixture(scope='module')
+def sample_ad_sales():
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        AdSalesMetrics.__table__.create(bind=connection)
+        with open(data_loader.AD_SALES_CSV, encoding='utf-8', newline='') as file:
+            connection.execute(AdSalesMetrics.__table__.insert(),
+                               list(data_loader.iter_csv_rows(file, data_loader.AD_SALES_COLUMNS)))
+    with engine.connect() as connection:
+        yield connection
+
+
+def test_highest_cpc_agrees_with_the_prompt_example(sample_ad_sales):
+    match = FastPathMatcher().match('Which product had the highest CPC?')
+    fast_row = sample_ad_sales.execute(text(match.sql_query), match.params).mappings().one()
+
+    example_sql = dict(sql_prompt.EXAMPLES)['Highest CPC']
+    example_row = sample_ad_sales.execute(text(example_sql)).mappings().one()
+
+    assert fast_row['item_id'] == example_row['item_id']
+    assert fast_row['cpc'] == pytest.approx(example_row['highest_cpc'])
+
+
+@pytest.mark.parametrize('question, intent, metric, params', [
+    ('What is my total sales?', 'scalar', 'total_sales', {}),
+    ('ad sales', 'scalar', 'ad_sales', {}),
+    ('RoAS for item 12', 'scalar', 'roas', {'item_id': 12}),
+    ('total sales between 2025-06-01 and 2025-06-05', 'scalar', 'total_sales',
+     {'start_date': '2025-06-01', 'end_date': '2025-06-05'}),
+    ('top 5 products by ad spend', 'top', 'ad_spend', {'limit': 5}),
+    ('clicks by week', 'by_week', 'clicks', {}),
+])
+def test_matches(question, intent, metric, params):
+    match = FastPathMatcher().match(question)
+    assert (match.intent, match.metric, match.params) == (intent, metric, params)
+
+
+@pytest.mark.parametrize('question', [
+    'what is the weather',
+    'total sales and clicks',
+    'highest and lowest clicks',
+    'top 0 products by clicks',
+    'sales by day on 2025-02-30',
+    # Weekly buckets exist only across all products
+    'clicks by week for item 3',
+])
+def test_leaves_other_questions_to_the_llm(question):
+    assert FastPathMatcher().match(question) is None
+
+
+def test_answer_templates():
+    matcher = FastPathMatcher()
+    assert (matcher.match('total sales').format_answer([{'total_sales': 1234.5}])
+            == 'Your total sales is $1,234.50.')
+    assert (matcher.match('product with the lowest ctr').format_answer([{'item_id': 7, 'ctr': 0.0125}])
+            == 'Item 7 has the lowest click-through rate at 1.25%.')
+    assert matcher.match('clicks by day').format_answer([]) == 'No data found for clicks.'
+
+
+def test_stats_count_hits_per_intent_and_misses():
+    matcher = FastPathMatcher()
+    for question in ('total sales', 'top 3 products by clicks', 'what is the weather'):
+        matcher.match(question)
+    assert matcher.stats() == {'hits': {'scalar': 1, 'top': 1}, 'misses': 1, 'hit_rate': 0.6667}
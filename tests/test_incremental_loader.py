@@ -0,0 +1,43 @@
+from sqlalchemy import select
+from database import db
+from models import TotalSalesMetrics
+from incremental_loader import load_file
+
+HEADER = 'date,item_id,total_sales,total_units_ordered\n'
+
+
+def _rows(item_ids):
+    table = TotalSalesMetrics.__table__
+    with db.engine.connect() as connection:
+        return connection.execute(
+            select(table.c.item_id, table.c.total_sales, table.c.total_units_ordered)
+            .where(table.c.item_id.in_(item_ids)).order_by(table.c.item_id)
+        ).all()
+
+
+def test_partial_trailing_row_waits_for_the_rest(app, tmp_path):
+    feed = tmp_path / 'total_sales.csv'
+    feed.write_text(HEADER + '2030-01-01,900001,10.5,2\n' + '2030-01-01,900002,20')
+
+    assert load_file(str(feed)) == 1
+    assert _rows([900001, 900002]) == [(900001, 10.5, 2)]
+
+    # Nothing new until the writer finishes the row
+    assert load_file(str(feed)) == 0
+
+    with open(feed, 'a') as file:
+        file.write('.25,3\n')
+    assert load_file(str(feed)) == 1
+    assert _rows([900001, 900002]) == [(900001, 10.5, 2), (900002, 20.25, 3)]
+    assert load_file(str(feed)) == 0
+
+
+def test_partial_header_is_not_loaded(app, tmp_path):
+    feed = tmp_path / 'total_sales.csv'
+    feed.write_text('date,item_id,total_')
+
+    assert load_file(str(feed)) == 0
+
+    feed.write_text(HEADER + '2030-01-02,900003,5,1\n')
+    assert load_file(str(feed)) == 1
+    assert _rows([900003]) == [(900003, 5.0, 1)]
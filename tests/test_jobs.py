@@ -0,0 +1,60 @@
+import threading
+import pytest
+import jobs
+from jobs import JobStore, JobQueueFull
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(path=str(tmp_path / 'jobs.db'), max_workers=1, max_pending=2, ttl_seconds=60)
+
+
+def test_job_result_is_kept_once_finished(store):
+    job_id = store.submit('total sales', lambda value: ({'answer': value}, 200), 42)
+
+    job = store.wait(job_id, timeout=5, last_status='queued')
+    while job['status'] not in jobs.FINISHED_STATUSES:
+        job = store.wait(job_id, timeout=5, last_status=job['status'])
+
+    assert job['status'] == 'succeeded'
+    assert job['status_code'] == 200
+    assert job['result'] == {'answer': 42}
+    assert job['question'] == 'total sales'
+
+
+@pytest.mark.parametrize('function, status_code, result', [
+    (lambda: ({'error': 'bad question'}, 400), 400, {'error': 'bad question'}),
+    (lambda: 1 / 0, 500, {'error': 'division by zero', 'success': False}),
+])
+def test_failed_jobs(store, function, status_code, result):
+    job_id = store.submit('question', function)
+    store._executor.shutdown(wait=True)
+
+    job = store.get(job_id)
+    assert (job['status'], job['status_code'], job['result']) == ('failed', status_code, result)
+
+
+def test_submissions_past_max_pending_are_refused(store):
+    release = threading.Event()
+    blocked = lambda: (release.wait(5), 200)
+    first = store.submit('first', blocked)
+    store.submit('second', blocked)
+
+    with pytest.raises(JobQueueFull):
+        store.submit('third', blocked)
+    assert store.stats()['pending_in_process'] == 2
+
+    release.set()
+    store._executor.shutdown(wait=True)
+    assert store.get(first)['status'] == 'succeeded'
+    assert store.stats() == {'pending_in_process': 0, 'max_pending': 2, 'by_status': {'succeeded': 2}}
+
+
+def test_unknown_and_expired_jobs(store, monkeypatch):
+    assert store.get('no-such-job') is None
+
+    job_id = store.submit('question', lambda: ({}, 200))
+    store._executor.shutdown(wait=True)
+    now = jobs.time.time()
+    monkeypatch.setattr(jobs.time, 'time', lambda: now + 61)
+    assert store.get(job_id) is None
@@ -0,0 +1,59 @@
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import create_engine, text
+from models import AdSalesMetrics
+from query_batcher import merge_aggregates, parse_aggregate, split_row
+
+
+@pytest.fixture(scope='module')
+def connection():
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        AdSalesMetrics.__table__.create(bind=connection)
+        connection.execute(AdSalesMetrics.__table__.insert(), [
+            {'date': date(2030, 1, 1) + timedelta(days=day), 'item_id': item, 'ad_sales': item * 10 + day,
+             'impressions': 100, 'ad_spend': item + day, 'clicks': day, 'units_sold': 1}
+            for item in range(1, 4) for day in range(5)
+        ])
+    with engine.connect() as connection:
+        yield connection
+
+
+def _row(connection, sql_query):
+    return dict(connection.execute(text(sql_query)).mappings().one())
+
+
+def test_merged_scan_returns_each_querys_own_row(connection):
+    queries = {
+        'spend': 'SELECT SUM(ad_spend) AS total_spend FROM ad_sales_metrics',
+        'cpc': 'SELECT SUM(ad_spend) / NULLIF(SUM(clicks), 0) AS cpc, COUNT(*) AS days FROM ad_sales_metrics LIMIT 1',
+        'item': 'SELECT SUM(clicks) AS clicks FROM ad_sales_metrics WHERE item_id = 2',
+        'item_sales': 'SELECT MAX(ad_sales) AS best FROM ad_sales_metrics WHERE item_id = 2',
+        'alone': 'SELECT SUM(clicks) AS clicks FROM ad_sales_metrics WHERE item_id = 3',
+    }
+    groups, unmerged = merge_aggregates(queries)
+
+    assert unmerged == ['alone']
+    assert sorted(sorted(key for key, _ in group.members) for group in groups) == [['cpc', 'spend'],
+                                                                                   ['item', 'item_sales']]
+    for group in groups:
+        merged_row = _row(connection, group.sql_query)
+        for key, columns in group.members:
+            assert split_row(merged_row, columns) == _row(connection, queries[key])
+
+
+@pytest.mark.parametrize('sql_query', [
+    # LIMIT 0 returns no row, while the merged scan would return one
+    'SELECT SUM(clicks) AS clicks FROM ad_sales_metrics LIMIT 0',
+    'SELECT SUM(clicks) AS clicks FROM ad_sales_metrics LIMIT 1 OFFSET 1',
+    'SELECT item_id, SUM(clicks) AS clicks FROM ad_sales_metrics GROUP BY item_id',
+    'SELECT SUM(clicks) FROM ad_sales_metrics',
+    'SELECT SUM(a.clicks) AS clicks FROM ad_sales_metrics a JOIN total_sales_metrics t ON a.item_id = t.item_id',
+    'SELECT SUM(clicks) AS clicks FROM (SELECT clicks FROM ad_sales_metrics)',
+    "SELECT SUM(clicks) AS clicks FROM ad_sales_metrics WHERE date > 'from where'",
+    'SELECT clicks + SUM(clicks) AS clicks FROM ad_sales_metrics',
+])
+def test_unmergeable_queries(sql_query):
+    assert parse_aggregate(sql_query) is None
+    queries = {'query': sql_query, 'other': 'SELECT SUM(ad_spend) AS spend FROM ad_sales_metrics'}
+    assert merge_aggregates(queries) == ([], ['query', 'other'])
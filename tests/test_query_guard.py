@@ -0,0 +1,63 @@
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import create_engine, event, text
+from models import AdSalesMetrics, TotalSalesMetrics
+import query_guard
+
+ITEMS = 10
+DAYS = 50
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        for model in (AdSalesMetrics, TotalSalesMetrics):
+            model.__table__.create(bind=connection)
+        days = [date(2030, 1, 1) + timedelta(days=offset) for offset in range(DAYS)]
+        connection.execute(AdSalesMetrics.__table__.insert(), [
+            {'date': day, 'item_id': item, 'ad_sales': 1, 'impressions': 1, 'ad_spend': 1, 'clicks': 1, 'units_sold': 1}
+            for item in range(ITEMS) for day in days
+        ])
+        connection.execute(TotalSalesMetrics.__table__.insert(), [
+            {'date': day, 'item_id': item, 'total_sales': 1, 'total_units_ordered': 1}
+            for item in range(ITEMS) for day in days
+        ])
+        yield connection
+
+
+def _rows(connection, sql_query):
+    return connection.execute(text(f'SELECT COUNT(*) FROM ({sql_query})')).scalar()
+
+
+def test_join_missing_date_key_is_costed_by_its_fanout(connection):
+    sql_query = 'SELECT * FROM ad_sales_metrics a JOIN total_sales_metrics t ON a.item_id = t.item_id'
+    plan = query_guard.explain_query(connection, sql_query)
+
+    assert _rows(connection, sql_query) == ITEMS * DAYS * DAYS
+    assert plan.cost >= ITEMS * DAYS * DAYS
+    with pytest.raises(query_guard.QueryRejected):
+        query_guard.preflight(connection, sql_query, max_cost=ITEMS * DAYS * DAYS)
+
+
+def test_join_on_the_full_natural_key_probes_one_row(connection):
+    sql_query = ('SELECT * FROM ad_sales_metrics a JOIN total_sales_metrics t '
+                 'ON a.item_id = t.item_id AND a.date = t.date')
+    plan = query_guard.explain_query(connection, sql_query)
+
+    assert plan.cost <= 2 * ITEMS * DAYS
+    assert not plan.cartesian
+
+
+def test_fanout_without_analyze_reads_a_bounded_sample(connection, monkeypatch):
+    monkeypatch.setattr(query_guard, '_DISTINCT_SAMPLE_ROWS', DAYS)
+    monkeypatch.setattr(query_guard, '_distinct_keys', {})
+    statements = []
+    event.listen(connection, 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    sql_query = 'SELECT * FROM ad_sales_metrics a JOIN total_sales_metrics t ON a.item_id = t.item_id'
+    plan = query_guard.explain_query(connection, sql_query)
+
+    assert plan.cost >= _rows(connection, sql_query)
+    assert all(f'LIMIT {DAYS}' in statement for statement in statements if 'DISTINCT' in statement)
@@ -0,0 +1,50 @@
+import threading
+import pytest
+from response_formatter import resolve_response_mode, format_result_locally, summarize_for_llm
+from narratives import NarrativeStore
+
+
+@pytest.mark.parametrize('rows, mode', [
+    ([{'total_sales': 10.0}], 'template'),
+    ([{'item_id': item, 'clicks': item} for item in range(10)], 'template'),
+    ([{'item_id': item, 'clicks': item} for item in range(11)], 'llm'),
+    ([{'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5}], 'llm'),
+    ([], 'llm'),
+])
+def test_auto_mode_templates_only_small_results(rows, mode):
+    assert resolve_response_mode('auto', rows) == mode
+    assert resolve_response_mode('raw', rows) == 'raw'
+
+
+def test_local_answers():
+    assert format_result_locally([]) == 'The query returned no results.'
+    assert format_result_locally([{'total_sales': 1234.5}]) == 'The total sales is $1,234.50.'
+    assert format_result_locally([{'item_id': 3, 'ctr': 0.05}]) == 'Result: item id: 3, ctr: 5.00%.'
+    assert format_result_locally([{'item_id': 1, 'roas': 2.5}, {'item_id': 2, 'roas': None}]) == (
+        'The query returned 2 rows:\n- item id: 1, roas: 2.50\n- item id: 2, roas: n/a')
+
+
+def test_large_results_are_summarized_for_the_llm():
+    rows = [{'item_id': item, 'clicks': item * 2} for item in range(50)]
+    assert summarize_for_llm(rows[:5]) == rows[:5]
+
+    summary = summarize_for_llm(rows, truncated=True, sample_rows=3)
+    assert summary['row_count'] == 50
+    assert summary['sample_rows'] == rows[:3]
+    assert summary['column_stats']['clicks'] == {'count': 50, 'sum': 2450, 'min': 0, 'max': 98, 'avg': 49.0}
+    assert 'row cap' in summary['note']
+
+
+def test_deferred_narratives():
+    store = NarrativeStore(max_workers=1)
+    release = threading.Event()
+    narrative_id = store.submit(lambda: release.wait(5) and 'Sales grew.')
+
+    assert store.get(narrative_id) == {'narrative_id': narrative_id, 'narrative_status': 'pending'}
+    release.set()
+    assert store.get(narrative_id, wait_seconds=5) == {
+        'narrative_id': narrative_id, 'narrative_status': 'ready', 'formatted_response': 'Sales grew.'}
+
+    failed_id = store.submit(lambda: 1 / 0)
+    assert store.get(failed_id, wait_seconds=5)['narrative_status'] == 'failed'
+    assert store.get('no-such-narrative') is None
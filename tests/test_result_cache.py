@@ -0,0 +1,40 @@
+import pytest
+from result_cache import ResultCache, referenced_tables, bump_data_version
+from database import db
+import data_stats
+import routes
+
+
+@pytest.mark.parametrize('sql_query, tables', [
+    ('SELECT * FROM ad_sales_metrics a, total_sales_metrics t WHERE a.item_id = t.item_id',
+     ['ad_sales_metrics', 'total_sales_metrics']),
+    ('SELECT * FROM ad_sales_metrics a JOIN total_sales_metrics t ON a.item_id = t.item_id, product_eligibility p',
+     ['ad_sales_metrics', 'product_eligibility', 'total_sales_metrics']),
+    ('SELECT * FROM (SELECT item_id, date FROM ad_sales_metrics) s, "total_sales_metrics" t',
+     ['ad_sales_metrics', 'total_sales_metrics']),
+    ("SELECT coalesce(a, b), 'from x, y' FROM main.total_sales_metrics WHERE item_id IN (1, 2)",
+     ['total_sales_metrics']),
+])
+def test_referenced_tables(sql_query, tables):
+    assert referenced_tables(sql_query) == tables
+
+
+def test_comma_join_is_invalidated_by_either_table():
+    cache = ResultCache()
+    sql_query = 'SELECT * FROM ad_sales_metrics a, total_sales_metrics t WHERE a.item_id = t.item_id'
+    cache.put(cache.make_key(sql_query), [{'item_id': 1}])
+    assert cache.get(cache.make_key(sql_query)) == [{'item_id': 1}]
+
+    bump_data_version('total_sales_metrics')
+    assert cache.get(cache.make_key(sql_query)) is None
+
+
+def test_load_by_another_process_invalidates_cached_results(app):
+    sql_query = 'SELECT COUNT(*) AS n FROM total_sales_metrics WHERE item_id = 424242'
+    routes.execute_query(sql_query)
+    assert routes.cached_query_result(sql_query, None, 10, routes.read_data_version())[1] is not None
+
+    # Another process's load bumps data_stats but not this process's table versions
+    with db.engine.begin() as connection:
+        data_stats.record_load(connection, 'total_sales_metrics', 1)
+    assert routes.cached_query_result(sql_query, None, 10, routes.read_data_version())[1] is None
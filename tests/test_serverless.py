@@ -0,0 +1,36 @@
+import importlib
+
+serverless = importlib.import_module('api.index')
+
+
+def test_failed_query_is_generated_again(monkeypatch):
+    service = serverless.get_gemini_service()
+    generated = []
+
+    def sql_for(question):
+        generated.append(question)
+        return 'SELECT no_such_column FROM ad_sales_metrics'
+
+    monkeypatch.setattr(service.backend, 'sql_for', sql_for)
+    for _ in range(2):
+        payload, status_code = serverless.answer_query('which products have no such column')
+        assert status_code == 500
+        assert payload['success'] is False
+
+    # Neither failure was replayed from the translation cache
+    assert len(generated) == 2
+
+
+def test_async_mode_needs_a_shared_job_store(monkeypatch):
+    client = serverless.app.test_client()
+    monkeypatch.setattr(serverless, 'ASYNC_JOBS_ENABLED', False)
+    response = client.post('/api/query', json={'question': 'total clicks', 'async': True})
+    assert response.status_code == 501
+
+    monkeypatch.setattr(serverless, 'ASYNC_JOBS_ENABLED', True)
+    response = client.post('/api/query', json={'question': 'total clicks', 'async': True})
+    assert response.status_code == 202
+    job = client.get(response.get_json()['status_url']).get_json()
+    while job['status'] not in ('succeeded', 'failed'):
+        job = client.get(f"/api/jobs/{job['job_id']}?wait=5&status={job['status']}").get_json()
+    assert job['status'] == 'succeeded'
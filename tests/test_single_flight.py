@@ -0,0 +1,116 @@
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+import pytest
+from single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_run():
+    flight = SingleFlight('test')
+    release = threading.Event()
+    runs = []
+
+    def slow_call(value):
+        runs.append(value)
+        release.wait(5)
+        return value * 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', slow_call, 21))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    # Every caller is waiting on the first one's run before it finishes
+    while flight.stats()['followers'] < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert runs == [21]
+    assert results == [42] * 5
+    assert flight.stats() == {'in_flight': 0, 'leaders': 1, 'followers': 4, 'cross_process': False}
+    # Nothing is cached once the call has returned
+    flight.do('key', slow_call, 21)
+    assert runs == [21, 21]
+
+
+def test_followers_receive_the_leaders_exception():
+    flight = SingleFlight('test')
+    release = threading.Event()
+
+    def failing_call():
+        release.wait(5)
+        raise KeyError('boom')
+
+    errors = []
+
+    def caller():
+        try:
+            flight.do('key', failing_call)
+        except KeyError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=caller) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()['followers'] < 2:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 3 and len({id(error) for error in errors}) == 1
+
+
+def test_async_callers_share_one_run():
+    flight = SingleFlight('test')
+    runs = []
+
+    async def slow_call():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return 'done'
+
+    async def main():
+        return await asyncio.gather(*[flight.do_async('key', slow_call) for _ in range(4)])
+
+    assert asyncio.run(main()) == ['done'] * 4
+    assert runs == [1]
+
+
+def test_disabled_runs_every_call():
+    flight = SingleFlight('test', enabled=False)
+    assert [flight.do('key', lambda: 1) for _ in range(2)] == [1, 1]
+    assert flight.stats()['leaders'] == 0
+
+
+def _shared_caller(directory, runs_path, started, results):
+    def counted_call():
+        with open(runs_path, 'a') as file:
+            file.write('run\n')
+        started.set()
+        time.sleep(0.5)
+        return {'rows': [1, 2, 3]}
+
+    results.put(SingleFlight('test', directory=directory).do('key', counted_call, shared=True))
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='flock coalescing needs a POSIX host')
+def test_processes_share_one_run_through_the_directory(tmp_path):
+    context = multiprocessing.get_context('fork')
+    runs_path = tmp_path / 'runs'
+    started, results = context.Event(), context.Queue()
+
+    first = context.Process(target=_shared_caller, args=(str(tmp_path), str(runs_path), started, results))
+    first.start()
+    assert started.wait(5)
+    # Started while the first process holds the lock, so it waits and reads the result file
+    second = context.Process(target=_shared_caller, args=(str(tmp_path), str(runs_path), context.Event(), results))
+    second.start()
+    first.join(5)
+    second.join(5)
+
+    assert [results.get(timeout=1) for _ in range(2)] == [{'rows': [1, 2, 3]}] * 2
+    assert runs_path.read_text() == 'run\n'
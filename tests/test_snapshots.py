@@ -0,0 +1,27 @@
+from datetime import date
+from sqlalchemy import event
+from database import db
+from models import AdSalesMetrics
+import snapshots
+
+
+def test_populated_table_is_detected_without_counting(app, monkeypatch):
+    with db.engine.begin() as connection:
+        connection.execute(AdSalesMetrics.__table__.insert(), [{
+            'date': date(2030, 2, 1), 'item_id': 910001, 'ad_sales': 0, 'impressions': 0, 'ad_spend': 0,
+            'clicks': 0, 'units_sold': 0,
+        }])
+
+    def read_snapshot(table_name):
+        raise AssertionError('a populated table must not read its snapshot')
+
+    monkeypatch.setattr(snapshots, 'read_snapshot', read_snapshot)
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        assert snapshots.load_snapshot('ad_sales_metrics') == 0
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert not any('count(' in statement.lower() for statement in statements)
@@ -0,0 +1,28 @@
+"""/api/stats is tagged by data version, not by the per-request counters."""
+from database import db
+import data_stats
+
+
+def test_stats_etag_follows_data_version(app):
+    client = app.test_client()
+    first = client.get('/api/stats')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'].startswith('private')
+    assert 'llm_usage' not in first.get_json()
+
+    # Answering a question moves the runtime counters but not the data
+    client.post('/api/ask', json={'question': 'which products get the most clicks'})
+    assert client.get('/api/stats', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    with db.engine.begin() as connection:
+        data_stats.record_load(connection, 'ad_sales_metrics', 1)
+    second = client.get('/api/stats', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+
+
+def test_runtime_stats_are_not_cached(app):
+    response = app.test_client().get('/api/stats/runtime')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert 'llm_usage' in response.get_json()
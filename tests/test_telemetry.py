@@ -0,0 +1,73 @@
+import telemetry
+
+
+def test_request_trace_times_each_stage():
+    with telemetry.trace_request('test_endpoint') as trace:
+        with telemetry.span('generate_sql') as attributes:
+            attributes['tokens_in'] = 120
+        with telemetry.span('execute_query'):
+            pass
+        telemetry.annotate(answered_by='llm')
+
+    assert [stage for stage, _, _ in trace.spans] == ['generate_sql', 'execute_query']
+    assert trace.spans[0][2] == {'tokens_in': 120}
+    assert trace.attributes == {'answered_by': 'llm'}
+    timings = trace.server_timing().split(', ')
+    assert [timing.split(';')[0] for timing in timings] == ['generate_sql', 'execute_query']
+    assert all(timing.split(';')[1].startswith('dur=') for timing in timings)
+    # Spans outside a request are still timed, but belong to no trace
+    assert telemetry.current_trace() is None
+    with telemetry.span('orphan'):
+        pass
+
+
+def test_histogram_and_counter_samples():
+    histogram = telemetry.Histogram('test_seconds', 'Test latency', ['stage'], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage='a')
+    histogram.observe(0.5, stage='a')
+    histogram.observe(5.0, stage='a')
+    assert list(histogram.samples()) == [
+        'test_seconds_bucket{stage="a",le="0.1"} 1',
+        'test_seconds_bucket{stage="a",le="1.0"} 2',
+        'test_seconds_bucket{stage="a",le="+Inf"} 3',
+        'test_seconds_sum{stage="a"} 5.55',
+        'test_seconds_count{stage="a"} 3',
+    ]
+
+    counter = telemetry.Counter('test_total', 'Test counter', ['cache'])
+    counter.inc(cache='sql')
+    counter.inc(2, cache='sql')
+    counter.inc(cache='say "hi"')
+    assert list(counter.samples()) == ['test_total{cache="say \\"hi\\""} 1', 'test_total{cache="sql"} 3']
+
+
+def test_llm_usage_is_counted_per_operation():
+    class Usage:
+        prompt_token_count = 100
+        cached_content_token_count = 60
+        candidates_token_count = 20
+
+    before = telemetry.llm_usage().get('test_operation', {}).get('calls', 0)
+    attributes = {}
+    telemetry.record_llm_usage('test_operation', Usage(), attributes)
+    telemetry.record_llm_usage('test_operation', None)
+
+    usage = telemetry.llm_usage()['test_operation']
+    assert usage['calls'] == before + 2
+    assert (usage['input_tokens'], usage['cached_input_tokens'], usage['output_tokens']) == (100, 60, 20)
+    assert attributes == {'tokens_in': 100, 'tokens_cached': 60, 'tokens_out': 20}
+    assert 'llm_tokens_total{operation="test_operation",direction="cached"} 60' in telemetry.render_metrics()
+
+
+def test_metrics_endpoint(app):
+    with telemetry.trace_request('test_endpoint'):
+        with telemetry.span('test_stage'):
+            pass
+
+    response = app.test_client().get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert '# TYPE ask_stage_duration_seconds histogram' in body
+    assert 'ask_stage_duration_seconds_count{stage="test_stage"} 1' in body
+    assert 'ask_request_duration_seconds_count{endpoint="test_endpoint",answered_by="none"} 1' in body
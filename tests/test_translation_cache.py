@@ -0,0 +1,82 @@
+import pytest
+import translation_cache
+from translation_cache import TranslationCache, normalize_question, token_similarity
+
+SQL = 'SELECT item_id, SUM(clicks) AS clicks FROM ad_sales_metrics GROUP BY item_id ORDER BY clicks DESC LIMIT 5'
+
+
+def test_normalized_phrasings_share_an_entry():
+    cache = TranslationCache()
+    cache.put('Top 5 products by clicks?', 'schema', SQL)
+
+    assert normalize_question('  top 5 products, by CLICKS ') == 'top 5 products by clicks'
+    assert cache.get('top 5 products by clicks', 'schema') == SQL
+    assert cache.stats() == {'entries': 1, 'hits': 1, 'near_hits': 0, 'misses': 0}
+
+
+def test_near_hit_serves_the_most_similar_question():
+    cache = TranslationCache(similarity_threshold=0.6)
+    cache.put('top 5 products by clicks', 'schema', SQL)
+    cache.put('top 5 products by ad spend', 'schema', 'SELECT 2')
+
+    assert cache.get('show the top 5 products by clicks', 'schema') == SQL
+    assert cache.stats()['near_hits'] == 1
+
+
+@pytest.mark.parametrize('question', [
+    # A different number changes the SQL, however similar the words
+    'top 10 products by clicks',
+    # Too few words in common
+    'clicks per day for last month',
+])
+def test_near_hit_needs_the_same_numbers_and_enough_overlap(question):
+    cache = TranslationCache(similarity_threshold=0.6)
+    cache.put('top 5 products by clicks', 'schema', SQL)
+
+    assert cache.get(question, 'schema') is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_near_hits_are_off_without_a_threshold():
+    cache = TranslationCache()
+    cache.put('top 5 products by clicks', 'schema', SQL)
+    assert cache.get('show the top 5 products by clicks', 'schema') is None
+
+
+def test_token_similarity():
+    assert token_similarity('top 5 products by clicks', 'top 5 products by clicks') == 1.0
+    assert token_similarity('top 5 products by clicks', 'top 3 products by clicks') == 0.0
+    assert token_similarity('a b', 'a c') == pytest.approx(1 / 3)
+    assert token_similarity('', 'a') == 0.0
+
+
+def test_schema_change_drops_every_entry():
+    cache = TranslationCache()
+    cache.put('total sales', 'old schema', 'SELECT 1')
+    assert cache.get('total sales', 'new schema') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_entries_expire_and_are_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(translation_cache.time, 'monotonic', lambda: now[0])
+    cache = TranslationCache(max_entries=2, ttl_seconds=60)
+    for question in ('first', 'second', 'third'):
+        cache.put(question, 'schema', f'SELECT {question!r}')
+
+    # The least recently used entry made room for the third
+    assert cache.get('first', 'schema') is None
+    assert cache.get('second', 'schema') == "SELECT 'second'"
+
+    now[0] += 61
+    assert cache.get('third', 'schema') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_invalidate_drops_one_question():
+    cache = TranslationCache()
+    cache.put('total sales', 'schema', 'SELECT 1')
+    cache.put('total clicks', 'schema', 'SELECT 2')
+    cache.invalidate('Total sales?')
+    assert cache.get('total sales', 'schema') is None
+    assert cache.get('total clicks', 'schema') == 'SELECT 2'
@@ -0,0 +1,137 @@
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+_PUNCTUATION = re.compile(r"[^\w\s.]")
+_TRAILING_DOTS = re.compile(r"\.(?!\d)")
+_WHITESPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"^\d+(\.\d+)?$")
+
+
+def normalize_question(question):
+    """Normalize a question so trivially different phrasings share a cache key."""
+    normalized = question.lower()
+    normalized = _PUNCTUATION.sub(" ", normalized)
+    normalized = _TRAILING_DOTS.sub(" ", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+def schema_fingerprint(schema_info):
+    """Return a stable hash of the schema description given to the LLM."""
+    payload = json.dumps(schema_info, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def token_similarity(left, right):
+    """Jaccard similarity of two normalized questions.
+
+    Questions that mention different numbers (item ids, top-N, dates) never
+    match, since those change the generated SQL.
+    """
+    left_tokens = set(left.split())
+    right_tokens = set(right.split())
+    if not left_tokens or not right_tokens:
+        return 0.0
+    left_numbers = {t for t in left_tokens if _NUMBER.match(t)}
+    right_numbers = {t for t in right_tokens if _NUMBER.match(t)}
+    if left_numbers != right_numbers:
+        return 0.0
+    return len(left_tokens & right_tokens) / len(left_tokens | right_tokens)
+
+
+class TranslationCache:
+    """LRU/TTL cache of question -> SQL translations.
+
+    Entries are only valid for the schema they were generated against; a lookup
+    with a different schema hash drops everything cached so far. When
+    ``similarity_threshold`` is set, a miss on the exact key falls back to the
+    most similar cached question scoring at least that threshold. Any callable
+    taking two normalized questions and returning a score in [0, 1] can be
+    passed as ``similarity`` (e.g. an embedding cosine).
+    """
+
+    def __init__(self, max_entries=512, ttl_seconds=3600, similarity_threshold=0.0,
+                 similarity=token_similarity):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.similarity = similarity
+        self._entries = OrderedDict()
+        self._schema_hash = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def get(self, question, schema_hash):
+        """Return cached SQL for the question, or None on a miss."""
+        key = normalize_question(question)
+        with self._lock:
+            self._check_schema(schema_hash)
+            self._expire()
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if self.similarity_threshold > 0:
+                best_key, best_score = None, 0.0
+                for cached_key in self._entries:
+                    score = self.similarity(key, cached_key)
+                    if score > best_score:
+                        best_key, best_score = cached_key, score
+                if best_key is not None and best_score >= self.similarity_threshold:
+                    self._entries.move_to_end(best_key)
+                    self.near_hits += 1
+                    return self._entries[best_key][0]
+
+            self.misses += 1
+            return None
+
+    def put(self, question, schema_hash, sql_query):
+        """Store a translation, evicting the least recently used entry if full."""
+        if not sql_query:
+            return
+        key = normalize_question(question)
+        with self._lock:
+            self._check_schema(schema_hash)
+            self._entries[key] = (sql_query, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, question=None):
+        """Drop one question, or everything when no question is given."""
+        with self._lock:
+            if question is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(normalize_question(question), None)
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+            }
+
+    def _check_schema(self, schema_hash):
+        if schema_hash != self._schema_hash:
+            self._entries.clear()
+            self._schema_hash = schema_hash
+
+    def _expire(self):
+        if not self.ttl_seconds:
+            return
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [key for key, (_, stored_at) in self._entries.items() if stored_at < cutoff]
+        for key in expired:
+            del self._entries[key]